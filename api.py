@@ -0,0 +1,152 @@
+import datetime
+import json
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from autocomplete import get_autocomplete
+from cache import get_cache
+from conditional import conditional, page_version
+from models import db, Venue, Artist, Show
+from queries import (AREA_AGE_HEADER, venue_areas, shows_query, show_row, shows_page, artists_page, venue_details,
+                     artist_details, venue_page_stamps, artist_page_stamps, shows_page_stamps)
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+NDJSON = 'application/x-ndjson'
+COMPLETED = {'venues': Venue, 'artists': Artist}
+
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    return json.dumps(payload, default=_encode, separators=(',', ':'))
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def wants_stream():
+    return request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == NDJSON
+
+
+def per_page(default):
+    requested = request.args.get('per_page', default, type=int)
+    return min(max(requested, 1), current_app.config['API_MAX_PAGE_SIZE'])
+
+
+def page_response(page):
+    return json_response({"data": page.items, "next": page.next_cursor, "prev": page.prev_cursor})
+
+
+def stream(query, serialize=lambda row: row._asdict()):
+    """Respond with ``query`` as NDJSON, one line per row.
+
+    Rows come from a server-side cursor ``API_STREAM_BATCH_SIZE`` at a time
+    and each batch is written out before the next is fetched, so a full dump
+    holds a single batch in memory however large the table is.
+    """
+    batch_size = current_app.config['API_STREAM_BATCH_SIZE']
+
+    def generate():
+        lines = []
+        for row in query.yield_per(batch_size):
+            lines.append(dumps(serialize(row)))
+            if len(lines) == batch_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON)
+
+
+def table_rows(model):
+    return db.session.query(*model.__table__.columns).order_by(model.id)
+
+
+def listing_stamps():
+    if wants_stream():
+        return None
+    return shows_page_stamps(request.args.get('after'), request.args.get('before'),
+                             per_page(current_app.config['LISTING_PAGE_SIZE']))
+
+
+def detail_stamps(page_stamps, id):
+    return page_stamps(id, datetime.datetime.now())
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return json_response({"error": "not found"}, 404)
+
+
+@api.route('/shows')
+@conditional(lambda: listing_stamps())
+def shows():
+    if wants_stream():
+        return stream(shows_query().order_by(Show.id), show_row)
+    page = shows_page(request.args.get('after'), request.args.get('before'),
+                      per_page=per_page(current_app.config['LISTING_PAGE_SIZE']))
+    return page_response(page)
+
+
+@api.route('/venues')
+def venues():
+    if wants_stream():
+        return stream(table_rows(Venue))
+    areas, age = venue_areas()
+    response = json_response({"data": areas, "age": age})
+    response.headers[AREA_AGE_HEADER] = str(age)
+    return response
+
+
+@api.route('/artists')
+def artists():
+    if wants_stream():
+        return stream(table_rows(Artist))
+    page = artists_page(request.args.get('after'), request.args.get('before'),
+                        per_page=per_page(current_app.config['LISTING_PAGE_SIZE']))
+    return page_response(page)
+
+
+@api.route('/<kind>/autocomplete')
+def autocomplete(kind):
+    """Venues or artists with a word of their name starting with ``?q=``, for pickers."""
+    model = COMPLETED.get(kind)
+    if model is None:
+        abort(404)
+    limit = request.args.get('limit', current_app.config['AUTOCOMPLETE_LIMIT'], type=int)
+    limit = min(max(limit, 1), current_app.config['AUTOCOMPLETE_MAX_LIMIT'])
+    matches = get_autocomplete().complete(model, request.args.get('q', ''), limit)
+    return json_response({"data": [{"id": id, "name": name} for id, name in matches]})
+
+
+def detail_response(model, kind, id, details):
+    def build():
+        entity = db.session.get(model, id)
+        if entity is None:
+            return None
+        return details(entity, datetime.datetime.now(), request.args,
+                       per_page(current_app.config['DETAIL_SHOWS_PAGE_SIZE']))
+
+    # Cached under the same entity as the HTML page, so the writes that
+    # invalidate one invalidate the other.
+    data = get_cache().get_or_build(kind, id, f'api:{request.query_string.decode()}:{page_version()}', build)
+    if data is None:
+        return not_found(None)
+    return json_response(data)
+
+
+@api.route('/venues/<int:venue_id>')
+@conditional(lambda venue_id: detail_stamps(venue_page_stamps, venue_id))
+def show_venue(venue_id):
+    return detail_response(Venue, 'venue', venue_id, venue_details)
+
+
+@api.route('/artists/<int:artist_id>')
+@conditional(lambda artist_id: detail_stamps(artist_page_stamps, artist_id))
+def show_artist(artist_id):
+    return detail_response(Artist, 'artist', artist_id, artist_details)
@@ -3,9 +3,7 @@
 #----------------------------------------------------------------------------#
 
 import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, abort, jsonify
 from flask_moment import Moment
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
@@ -16,7 +14,28 @@ from forms import *
 import sys
 import datetime
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from models import db, Venue, Artist, Show
+from cache import init_cache, get_cache, invalidate, venue_dependents, artist_dependents
+from conditional import init_conditional, conditional, page_version
+from formatting import DateTimeFormatter
+from api import api
+from pool import init_pool, pool_stats
+from routing import init_replicas
+from instrumentation import init_instrumentation
+from metrics import init_metrics
+from areas import cli as areas_cli, area_of, refresh_areas
+from assets import cli as assets_cli, init_assets
+from autocomplete import init_autocomplete
+from search import init_search
+from bookings import booking_lock, find_conflicts, is_booking_conflict
+from counters import cli as counters_cli, count_new_show, release_venue_shows
+from importer import cli as import_cli
+from partitions import cli as partitions_cli
+from exporter import cli as export_cli, exports
+from seed import cli as seed_cli
+from queries import (AREA_AGE_HEADER, venue_areas, search_by_name, shows_page, artists_page, venue_details,
+                     artist_details, venue_page_stamps, artist_page_stamps, shows_page_stamps)
 
 #----------------------------------------------------------------------------#
 # App Config.
@@ -26,41 +45,42 @@ app = Flask(__name__)
 moment = Moment(app)
 
 app.config.from_object('config')
-db = SQLAlchemy()
 migrate = Migrate()
 
+init_pool(app)
+init_replicas(app)
 db.init_app(app)
 migrate.init_app(app, db)
+app.cli.add_command(counters_cli)
+app.cli.add_command(import_cli)
+app.cli.add_command(export_cli)
+app.cli.add_command(seed_cli)
+app.cli.add_command(assets_cli)
+app.cli.add_command(partitions_cli)
+app.cli.add_command(areas_cli)
+init_cache(app)
+init_assets(app)
+init_conditional(app)
+init_instrumentation(app)
+init_metrics(app)
+init_autocomplete(app)
+init_search(app)
+app.register_blueprint(api)
+app.register_blueprint(exports)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
+datetime_formatter = DateTimeFormatter(locale='en')
+
 def format_datetime(value, format='medium'):
-  date = None
-  if isinstance(value, datetime.datetime):
-      date = value
-  elif isinstance(value, str):
-      try:
-          date = dateutil.parser.parse(value)
-      except (ValueError, TypeError):
-          return ''
-  else:
-      return ''
+  return datetime_formatter.format(value, format)
 
-  if date:
-      try:
-          if format == 'full':
-              format_string ="EEEE MMMM, d, y 'at' h:mma"
-          elif format == 'medium':
-              format_string ="EE MM, dd, y h:mma"
-          else:
-              format_string = format 
-          return babel.dates.format_datetime(date, format_string, locale='en')
-      except Exception as e:
-          return str(date)
-  else:
-      return '' 
+def format_start_times(shows, format='medium'):
+  start_times = datetime_formatter.format_many([show['start_time'] for show in shows], format)
+  for show, start_time in zip(shows, start_times):
+    show['start_time'] = start_time
 
 app.jinja_env.filters['datetime'] = format_datetime
 
@@ -79,29 +99,10 @@ def index():
 @app.route('/venues')
 def venues():
   data = []
-  current_time = datetime.datetime.now()
+  age = 0
   error = False
   try: 
-    distinct_venues = db.session.query(Venue.city, Venue.state).distinct().order_by(Venue.state, Venue.city).all()
-
-    for venue in distinct_venues:
-      city, state = venue
-      venues_in_city = Venue.query.filter_by(city=city, state=state).order_by(Venue.name).all()
-
-      venue_list = []
-      for venue in venues_in_city:
-        upcoming_shows = Show.query.filter(Show.venue_id == venue.id, Show.start_time > current_time).count()
-        venue_list.append({
-          "id": venue.id,
-          "name": venue.name,
-          "num_upcoming_shows": upcoming_shows
-        })
-
-      data.append({
-        "city": city,
-        "state": state,
-        "venues": venue_list
-      })
+    data, age = venue_areas()
 
   except Exception as e:
     error = True
@@ -110,81 +111,42 @@ def venues():
   if error:
     return render_template('pages/venues.html', venues=[])
   else:
-    return render_template('pages/venues.html', areas=data)
+    return render_template('pages/venues.html', areas=data), {AREA_AGE_HEADER: str(age)}
   
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
   search_term = request.form.get('search_term', '').strip()
-  current_time = datetime.datetime.now()
-  response = {"count": 0, "data": []}
+  page = max(request.form.get('page', 1, type=int), 1)
+  response = {"count": 0, "page": page, "pages": 1, "data": []}
   error = False
   
   try:
-    results = Venue.query.filter(Venue.name.ilike(f'%{search_term}%')).order_by(Venue.name).all()
-    response["count"] = len(results)
-
-    for venue in results:
-      num_upcoming_shows = Show.query.filter(Show.venue_id == venue.id, Show.start_time > current_time).count()
-
-      response["data"].append({
-        "id": venue.id,
-        "name": venue.name,
-        "num_upcoming_shows": num_upcoming_shows
-      })
-
+    response = search_by_name(Venue, search_term, page=page, per_page=app.config['SEARCH_PAGE_SIZE'])
   except Exception as e:
     error = True
     print(f"Error occurred while searching venues: {e}")
 
   return render_template('pages/search_venues.html', results=response, search_term=search_term)
 
+def venue_page_data(venue_id, current_time, cursors):
+  venue = db.session.get(Venue, venue_id)
+  if venue is None:
+    return None
+  data = venue_details(venue, current_time, cursors, per_page=app.config['DETAIL_SHOWS_PAGE_SIZE'])
+  format_start_times(data['upcoming_shows'] + data['past_shows'])
+  return data
+
 @app.route('/venues/<int:venue_id>')
+@conditional(lambda venue_id: venue_page_stamps(venue_id, datetime.datetime.now()))
 def show_venue(venue_id):
-  venue = Venue.query.get_or_404(venue_id)
   current_time = datetime.datetime.now()
-  past_shows_data = []
-  upcoming_shows_data = []
   data = {} 
   error = False
 
   try:
-    shows_query = db.session.query(Show, Artist).join(Artist, Show.artist_id == Artist.id).filter(Show.venue_id == venue_id).order_by(Show.start_time).all()
-
-    for show in shows_query:
-        if show.artist:
-            artist_details = {
-                "artist_id": show.artist.id,
-                "artist_name": show.artist.name,
-                "artist_image_link": show.artist.image_link,
-                "start_time": format_datetime(show.start_time) 
-            }
-            if show.start_time <= current_time:
-                past_shows_data.append(artist_details)
-            else:
-                upcoming_shows_data.append(artist_details)
-        else:
-            print(f"Warning: Show ID {show.id} for Venue {venue_id} is missing related Artist.")
-
-    
-    data = {
-        "id": venue.id,
-        "name": venue.name,
-        "genres": venue.genres.split(',') if venue.genres else [],
-        "address": venue.address,
-        "city": venue.city,
-        "state": venue.state,
-        "phone": venue.phone,
-        "website": venue.website_link,
-        "facebook_link": venue.facebook_link,
-        "seeking_talent": venue.seeking_talent,
-        "seeking_description": venue.seeking_description,
-        "image_link": venue.image_link,
-        "past_shows": past_shows_data,
-        "upcoming_shows": upcoming_shows_data,
-        "past_shows_count": len(past_shows_data),
-        "upcoming_shows_count": len(upcoming_shows_data),
-    }
+    data = get_cache().get_or_build('venue', venue_id, f'{request.query_string.decode()}:{page_version()}',
+                                    lambda: venue_page_data(venue_id, current_time, request.args))
 
   except Exception as e:
     error = True
@@ -196,6 +158,8 @@ def show_venue(venue_id):
 
   if error:
      return redirect(url_for('index'))
+  elif data is None:
+     abort(404)
   else:
      return render_template('pages/show_venue.html', venue=data)
 
@@ -228,6 +192,7 @@ def create_venue_submission():
               seeking_description=form.seeking_description.data
           )
           db.session.add(new_venue)
+          refresh_areas([area_of(new_venue)])
           db.session.commit()
           flash('Venue ' + new_venue.name + ' was successfully listed!', 'success')
       except Exception as e:
@@ -253,8 +218,12 @@ def delete_venue(venue_id):
       venue = db.session.get(Venue, venue_id)
       if venue:
           venue_name = venue.name
+          dependents = venue_dependents(venue.id)
+          release_venue_shows(venue.id)
           db.session.delete(venue)
+          refresh_areas([area_of(venue)])
           db.session.commit()
+          invalidate(dependents)
           flash('Venue ' + venue_name + ' was successfully deleted!', 'success')
       else:
           error = True
@@ -273,15 +242,10 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-  data = []
+  page = None
   error = False
   try:
-    artists = Artist.query.order_by(Artist.name).all()
-    for artist in artists:
-      data.append({
-        "id": artist.id,
-        "name": artist.name,
-      })
+    page = artists_page(request.args.get('after'), request.args.get('before'), per_page=app.config['LISTING_PAGE_SIZE'])
   except Exception as e:
     error = True
     print(f"Error occurred while fetching artists: {e}")
@@ -289,79 +253,41 @@ def artists():
   if error:
     return render_template('pages/artists.html', artists=[])
   else:
-    return render_template('pages/artists.html', artists=data)
+    return render_template('pages/artists.html', artists=page.items, page=page)
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
   search_term = request.form.get('search_term', '').strip()
-  current_time = datetime.datetime.now()
-  response = {"count": 0, "data": []}
+  page = max(request.form.get('page', 1, type=int), 1)
+  response = {"count": 0, "page": page, "pages": 1, "data": []}
   error = False
 
   try:
-    results = Artist.query.filter(Artist.name.ilike(f'%{search_term}%')).order_by(Artist.name).all()
-    response["count"] = len(results)
-
-    for artist in results:
-      num_upcoming_shows = Show.query.filter(Show.artist_id == artist.id, Show.start_time > current_time).count()
-
-      response["data"].append({
-        "id": artist.id,
-        "name": artist.name,
-        "num_upcoming_shows": num_upcoming_shows
-      })
+    response = search_by_name(Artist, search_term, page=page, per_page=app.config['SEARCH_PAGE_SIZE'])
   except Exception as e:
     error = True
     print(f"Error occurred while searching artists: {e}")
 
   return render_template('pages/search_artists.html', results=response, search_term=search_term)
 
+def artist_page_data(artist_id, current_time, cursors):
+  artist = db.session.get(Artist, artist_id)
+  if artist is None:
+    return None
+  data = artist_details(artist, current_time, cursors, per_page=app.config['DETAIL_SHOWS_PAGE_SIZE'])
+  format_start_times(data['upcoming_shows'] + data['past_shows'])
+  return data
+
 @app.route('/artists/<int:artist_id>')
+@conditional(lambda artist_id: artist_page_stamps(artist_id, datetime.datetime.now()))
 def show_artist(artist_id):
-  artist = Artist.query.get_or_404(artist_id)
   current_time = datetime.datetime.now()
-  past_shows_data = []
-  upcoming_shows_data = []
   data = {}
   error = False
 
   try:
-      shows_query = db.session.query(Show, Venue).join(Venue, Show.venue_id == Venue.id).filter(Show.artist_id == artist_id).order_by(Show.start_time).all()
-
-      for show in shows_query:
-          if show.venue: 
-              venue_details = {
-                  "venue_id": show.venue.id,
-                  "venue_name": show.venue.name,
-                  "venue_image_link": show.venue.image_link,
-                  "start_time": format_datetime(show.start_time) 
-              }
-              if show.start_time <= current_time:
-                  past_shows_data.append(venue_details)
-              else:
-                  upcoming_shows_data.append(venue_details)
-          else:
-              print(f"Warning: Show ID {show.id} for Artist {artist_id} is missing related Venue.")
-
-
-      
-      data = {
-          "id": artist.id,
-          "name": artist.name,
-          "genres": artist.genres.split(','),
-          "city": artist.city,
-          "state": artist.state,
-          "phone": artist.phone,
-          "website": artist.website_link,
-          "facebook_link": artist.facebook_link,
-          "seeking_venue": artist.seeking_venue,
-          "seeking_description": artist.seeking_description,
-          "image_link": artist.image_link,
-          "past_shows": past_shows_data,
-          "upcoming_shows": upcoming_shows_data,
-          "past_shows_count": len(past_shows_data),
-          "upcoming_shows_count": len(upcoming_shows_data),
-      }
+      data = get_cache().get_or_build('artist', artist_id, f'{request.query_string.decode()}:{page_version()}',
+                                      lambda: artist_page_data(artist_id, current_time, request.args))
 
   except Exception as e:
       error = True
@@ -372,6 +298,8 @@ def show_artist(artist_id):
 
   if error:
       return redirect(('index'))
+  elif data is None:
+      abort(404)
   else:
       return render_template('pages/show_artist.html', artist=data)
 
@@ -404,6 +332,7 @@ def edit_artist_submission(artist_id):
       artist.seeking_description = form.seeking_description.data
 
       db.session.commit()
+      invalidate(artist_dependents(artist_id))
       flash('Artist ' + form.name.data + ' was successfully updated!', 'success')
       return redirect(url_for('show_artist', artist_id=artist_id))
     except Exception as e:
@@ -432,6 +361,7 @@ def edit_venue_submission(venue_id):
 
   if form.validate_on_submit():
     try:
+      areas = [area_of(venue)]
       venue.name = form.name.data.strip()
       venue.city = form.city.data.strip()
       venue.state = form.state.data
@@ -443,8 +373,11 @@ def edit_venue_submission(venue_id):
       venue.website_link = form.website_link.data
       venue.seeking_talent = form.seeking_talent.data
       venue.seeking_description = form.seeking_description.data
+      areas.append(area_of(venue))
+      refresh_areas(areas)
 
       db.session.commit()
+      invalidate(venue_dependents(venue_id))
       flash('Venue ' + form.name.data + ' was successfully updated!', 'success')
       return redirect(url_for('show_venue', venue_id=venue_id))
 
@@ -507,24 +440,13 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@conditional(lambda: shows_page_stamps(request.args.get('after'), request.args.get('before'), app.config['LISTING_PAGE_SIZE']))
 def shows():
-  data = []
+  page = None
   error = False
   try:
-      shows_list = db.session.query(Show.start_time, Venue.id.label('venue_id'), Venue.name.label('venue_name'), Artist.id.label('artist_id'), Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')).select_from(Show).join(Venue, Show.venue_id == Venue.id).join(Artist, Show.artist_id == Artist.id).order_by(Show.start_time.desc()).all()
-
-      for show in shows_list:
-          if show.venue and show.artist:
-              data.append({
-                  "venue_id": show.venue.id,
-                  "venue_name": show.venue.name,
-                  "artist_id": show.artist.id,
-                  "artist_name": show.artist.name,
-                  "artist_image_link": show.artist.image_link,
-                  "start_time": format_datetime(show.start_time) 
-              })
-          else:
-              print(f"Warning: Show ID {show.id} is missing related Venue or Artist.")
+      page = shows_page(request.args.get('after'), request.args.get('before'), per_page=app.config['LISTING_PAGE_SIZE'])
+      format_start_times(page.items)
 
   except Exception as e:
       error = True
@@ -536,13 +458,18 @@ def shows():
   if error:
       return render_template('pages/shows.html', shows=[])
   else:
-      return render_template('pages/shows.html', shows=data)
+      return render_template('pages/shows.html', shows=page.items, page=page)
 
 @app.route('/shows/create')
 def create_shows():
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
+def flash_conflicts(conflicts, venue, artist):
+  for show in conflicts:
+    booked = venue.name if show.venue_id == venue.id else artist.name
+    flash(f'{booked} is already booked from {show.start_time:%Y-%m-%d %H:%M} to {show.end_time:%H:%M}.', 'error')
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
   form = ShowForm(request.form)
@@ -556,15 +483,36 @@ def create_show_submission():
           if not artist or not venue:
               error = True
           else:
-              new_show = Show(
-                  artist_id=form.artist_id.data,
-                  venue_id=form.venue_id.data,
-                  start_time=form.start_time.data
-              )
-              db.session.add(new_show)
-              db.session.commit()
-              flash('Show was successfully listed!', 'success')
-
+              start_time = form.start_time.data
+              end_time = start_time + datetime.timedelta(minutes=form.duration.data)
+              with booking_lock([venue.id], [artist.id]):
+                  conflicts = find_conflicts(venue.id, artist.id, start_time, end_time)
+                  if conflicts:
+                      error = True
+                      flash_conflicts(conflicts, venue, artist)
+                  else:
+                      new_show = Show(
+                          artist_id=form.artist_id.data,
+                          venue_id=form.venue_id.data,
+                          start_time=start_time,
+                          end_time=end_time
+                      )
+                      db.session.add(new_show)
+                      count_new_show(new_show, datetime.datetime.now())
+                      refresh_areas([area_of(venue)])
+                      dependents = {'venue': [venue.id], 'artist': [artist.id]}
+                      db.session.commit()
+                      invalidate(dependents)
+                      flash('Show was successfully listed!', 'success')
+
+      except IntegrityError as e:
+          # Lost a race with an overlapping booking the check did not see yet.
+          error = True
+          db.session.rollback()
+          if is_booking_conflict(e):
+              flash('That time overlaps another show at this venue or by this artist.', 'error')
+          else:
+              print(e)
       except Exception as e:
           error = True
           db.session.rollback()
@@ -579,6 +527,14 @@ def create_show_submission():
   else:
       return redirect(url_for('index'))
 
+@app.route('/_stats/cache')
+def cache_stats():
+  return jsonify(get_cache().stats())
+
+@app.route('/_stats/pool')
+def pool_stats_view():
+  return jsonify(pool_stats(db.engine))
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
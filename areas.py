@@ -0,0 +1,91 @@
+"""The VenueArea summary behind /venues: one row per city with its venues.
+
+Views that change an area's venues or their upcoming show counts call
+``refresh_areas`` before committing, so the summary changes in the same
+transaction as the venues. Counters rolled from upcoming to past, and rows
+written around the app, reach it with the next ``flask areas refresh``,
+which rebuilds every row; /venues reports the age of the oldest row.
+
+This is a table rather than a PostgreSQL materialized view because a view
+can only be refreshed whole, and each write should recompute one city.
+A rebuild runs in a single transaction, so readers keep seeing the
+previous rows until it commits.
+"""
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, utcnow, Venue, VenueArea
+from queries import group_areas, venue_areas_query
+
+cli = AppGroup('areas', help='Maintain the venues-by-area summary behind /venues.')
+
+UPSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+
+def area_of(venue):
+    return (venue.state, venue.city)
+
+
+def venue_areas_of(venue_ids):
+    return set(db.session.query(Venue.state, Venue.city).filter(Venue.id.in_(venue_ids)).distinct().all())
+
+
+def summarize(rows, refreshed_at):
+    """VenueArea rows from ``venue_areas_query`` rows."""
+    for area in group_areas(rows):
+        area['upcoming_shows_count'] = sum(venue['num_upcoming_shows'] for venue in area['venues'])
+        for venue in area['venues']:
+            venue['updated_at'] = venue['updated_at'].isoformat()
+        area['refreshed_at'] = refreshed_at
+        yield area
+
+
+def rebuild_areas():
+    """Recompute every VenueArea row in the current transaction."""
+    if db.engine.dialect.name == 'postgresql':
+        # Waits for area refreshes in progress, whose venues the read below
+        # then sees, and holds off new ones; readers are not blocked.
+        db.session.execute(text('LOCK TABLE "VenueArea" IN SHARE ROW EXCLUSIVE MODE'))
+    db.session.execute(delete(VenueArea))
+    rows = list(summarize(venue_areas_query(), utcnow()))
+    if rows:
+        db.session.execute(insert(VenueArea), rows)
+    return len(rows)
+
+
+def refresh_areas(areas):
+    """Recompute the VenueArea rows of ``(state, city)`` areas in the current transaction."""
+    if db.session.query(VenueArea.state).first() is None:
+        # Rows of other areas would be missing from /venues.
+        rebuild_areas()
+        return
+    upsert = UPSERTS[db.engine.dialect.name]
+    now = utcnow()
+    # Sorted, so two transactions claim shared areas in the same order.
+    for state, city in sorted(set(map(tuple, areas))):
+        # Claim the row first: a concurrent refresh of the area waits for this
+        # transaction and then reads its venues, instead of overwriting them.
+        claim = upsert(VenueArea).values(state=state, city=city, venues=[], refreshed_at=now)
+        db.session.execute(claim.on_conflict_do_update(index_elements=['state', 'city'], set_={'refreshed_at': now}))
+        rows = venue_areas_query().filter(Venue.state == state, Venue.city == city)
+        summary = next(summarize(rows, now), None)
+        where = (VenueArea.state == state, VenueArea.city == city)
+        if summary is None:
+            db.session.execute(delete(VenueArea).where(*where), execution_options={'synchronize_session': False})
+        else:
+            db.session.execute(update(VenueArea).where(*where).values(summary), execution_options={'synchronize_session': False})
+
+
+@cli.command('refresh')
+@click.option('--every', type=int, default=None, help='Keep running, refreshing every N seconds.')
+def refresh_command(every):
+    """Rebuild the VenueArea summary from Venue."""
+    while True:
+        count = rebuild_areas()
+        db.session.commit()
+        click.echo(f'Refreshed {count} area(s).')
+        if not every:
+            break
+        time.sleep(every)
@@ -0,0 +1,391 @@
+"""ASGI entry point that serves the read-heavy pages on SQLAlchemy's asyncio engine.
+
+    uvicorn asgi:application --workers 4
+
+The venue, artist and show listings, both searches and both detail pages
+run as coroutines, and queries that do not depend on each other (a detail
+page's entity row and its two show lists, a search's count and page) run
+concurrently on separate pooled connections. Every other route (forms and
+writes, the JSON API, exports, static files) is handed to the Flask app
+on a worker thread, so one server still fronts the whole site.
+
+PostgreSQL is reached through asyncpg and SQLite through aiosqlite; an
+in-memory SQLite database cannot be shared with the async engine. Async
+pages go through Flask's before/after request hooks and error handlers,
+but are not answered with 304s like the sync detail pages.
+"""
+import asyncio
+import datetime
+import io
+import random
+import sys
+import threading
+from flask import abort, render_template, request
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from werkzeug.exceptions import HTTPException
+from app import app, format_start_times
+from cache import MISSING, get_cache
+from instrumentation import instrument_engine
+from models import Venue, Artist
+from pagination import keyset_page, keyset_window
+from queries import (SHOW_KEYS, ARTIST_KEYS, AREA_AGE_HEADER, area_summary_query, summarized_areas, summary_age,
+                     venue_areas_query, group_areas, search_page_number, search_upcoming_query,
+                     search_response, shows_query, show_row, artists_query, artist_row, show_list_windows,
+                     venue_shows_query, artist_shows_query, venue_data, artist_data)
+from routing import pinned_to_primary
+from autocomplete import COMPLETED_MODELS, get_autocomplete
+from search import SEARCHABLE_MODELS, QueryResults, get_search_backend
+from sync import ModelIndexes
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+# Chunks a streamed sync response may run ahead of a slow client.
+WSGI_BUFFERED_CHUNKS = 16
+
+
+def async_engine(config, url):
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if config['DB_POOL'] == 'null':
+        options['poolclass'] = NullPool
+    elif url.get_backend_name() != 'sqlite':
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_POOL_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+        )
+    engine = create_async_engine(url, **options)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+class Reads:
+    """Runs a request's queries, each on its own session so they can overlap."""
+
+    def __init__(self, sessions):
+        self.sessions = sessions
+
+    async def all(self, query):
+        """Rows of a ``db.session`` query, executed on the async engine."""
+        async with self.sessions() as session:
+            return (await session.execute(query.statement)).all()
+
+    async def scalar(self, statement):
+        async with self.sessions() as session:
+            return await session.scalar(statement)
+
+    async def get(self, model, id):
+        async with self.sessions() as session:
+            return await session.get(model, id)
+
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+async def venues(reads):
+    areas, refreshed_at = summarized_areas(await reads.all(area_summary_query()))
+    if refreshed_at is None:
+        areas = list(group_areas(await reads.all(venue_areas_query())))
+    return render_template('pages/venues.html', areas=areas), {AREA_AGE_HEADER: str(summary_age(refreshed_at))}
+
+
+async def search(reads, model, template):
+    search_term = request.form.get('search_term', '').strip()
+    requested = max(request.form.get('page', 1, type=int), 1)
+    per_page = app.config['SEARCH_PAGE_SIZE']
+    results = get_search_backend().search(model, search_term)
+
+    if isinstance(results, QueryResults):
+        # Fetch the requested page while counting; only a page past the end is fetched again.
+        count, rows = await asyncio.gather(
+            reads.scalar(select(func.count()).select_from(results.query.order_by(None).subquery())),
+            reads.all(results.slice_query((requested - 1) * per_page, per_page)),
+        )
+        page, pages = search_page_number(count, requested, per_page)
+        if page != requested:
+            rows = await reads.all(results.slice_query((page - 1) * per_page, per_page))
+        matches = [(row.id, row.name) for row in rows]
+    else:
+        count = results.count
+        page, pages = search_page_number(count, requested, per_page)
+        matches = results.slice((page - 1) * per_page, per_page)
+
+    ids = [id for id, name in matches]
+    upcoming = dict(await reads.all(search_upcoming_query(model, ids))) if ids else {}
+    return render_template(template, results=search_response(count, page, pages, matches, upcoming), search_term=search_term)
+
+
+async def search_venues(reads):
+    return await search(reads, Venue, 'pages/search_venues.html')
+
+
+async def search_artists(reads):
+    return await search(reads, Artist, 'pages/search_artists.html')
+
+
+async def artists(reads):
+    per_page = app.config['LISTING_PAGE_SIZE']
+    query, window = keyset_window(artists_query(), ARTIST_KEYS, request.args.get('after'), request.args.get('before'), per_page)
+    page = keyset_page(await reads.all(query), ARTIST_KEYS, per_page, window)
+    page.items = [artist_row(artist) for artist in page.items]
+    return render_template('pages/artists.html', artists=page.items, page=page)
+
+
+async def shows(reads):
+    per_page = app.config['LISTING_PAGE_SIZE']
+    query, window = keyset_window(shows_query(), SHOW_KEYS, request.args.get('after'), request.args.get('before'),
+                                  per_page, descending=True)
+    page = keyset_page(await reads.all(query), SHOW_KEYS, per_page, window)
+    page.items = [show_row(show) for show in page.items]
+    format_start_times(page.items)
+    return render_template('pages/shows.html', shows=page.items, page=page)
+
+
+async def detail_data(reads, kind, model, id, query_for, build):
+    cache = get_cache()
+    key, data, invalidated_at = cache.lookup(kind, id, request.query_string.decode())
+    if data is not MISSING:
+        return data
+
+    per_page = app.config['DETAIL_SHOWS_PAGE_SIZE']
+    windows = show_list_windows(lambda shows: query_for(id, shows), datetime.datetime.now(), request.args, per_page)
+    entity, *show_rows = await asyncio.gather(reads.get(model, id), *(reads.all(query) for query, window in windows))
+    data = None
+    if entity is not None:
+        upcoming, past = (keyset_page(rows, SHOW_KEYS, per_page, window) for rows, (query, window) in zip(show_rows, windows))
+        data = build(entity, upcoming, past)
+        format_start_times(data['upcoming_shows'] + data['past_shows'])
+    cache.store(key, data, invalidated_at)
+    return data
+
+
+async def show_venue(reads, venue_id):
+    data = await detail_data(reads, 'venue', Venue, venue_id, venue_shows_query, venue_data)
+    if data is None:
+        abort(404)
+    return render_template('pages/show_venue.html', venue=data)
+
+
+async def show_artist(reads, artist_id):
+    data = await detail_data(reads, 'artist', Artist, artist_id, artist_shows_query, artist_data)
+    if data is None:
+        abort(404)
+    return render_template('pages/show_artist.html', artist=data)
+
+
+ASYNC_VIEWS = {
+    'venues': venues,
+    'search_venues': search_venues,
+    'show_venue': show_venue,
+    'artists': artists,
+    'search_artists': search_artists,
+    'show_artist': show_artist,
+    'shows': shows,
+}
+
+
+#----------------------------------------------------------------------------#
+# ASGI application.
+#----------------------------------------------------------------------------#
+
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def start_message(status, headers):
+    return {
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+def _run_wsgi(wsgi_app, environ, loop, queue, slots, cancelled):
+    """Worker-thread half of ``call_wsgi``: run the app and feed its output to ``queue``."""
+    def put(item):
+        slots.acquire()
+        if cancelled.is_set():
+            raise ConnectionAbortedError
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def start_response(status, headers, exc_info=None):
+        put(('start', status, headers))
+        return lambda data: put(('body', data))
+
+    try:
+        body = wsgi_app(environ, start_response)
+        try:
+            for chunk in body:
+                if chunk:
+                    put(('body', chunk))
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+    except ConnectionAbortedError:
+        pass
+    except BaseException as error:
+        loop.call_soon_threadsafe(queue.put_nowait, ('error', error))
+    else:
+        loop.call_soon_threadsafe(queue.put_nowait, ('end',))
+
+
+async def call_wsgi(wsgi_app, environ, send):
+    """Serve a request with the sync app on a thread, streaming its body back."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.Semaphore(WSGI_BUFFERED_CHUNKS)
+    cancelled = threading.Event()
+    loop.run_in_executor(None, _run_wsgi, wsgi_app, environ, loop, queue, slots, cancelled)
+    try:
+        while True:
+            item = await queue.get()
+            if item[0] == 'start':
+                await send(start_message(item[1], item[2]))
+            elif item[0] == 'body':
+                await send({'type': 'http.response.body', 'body': bytes(item[1]), 'more_body': True})
+            elif item[0] == 'end':
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+                return
+            else:
+                raise item[1]
+            slots.release()
+    finally:
+        # Stops a response the client went away from at its next chunk.
+        cancelled.set()
+        slots.release(WSGI_BUFFERED_CHUNKS)
+
+
+class Application:
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self.engines = []
+        self.primary = None
+        self.replicas = []
+
+    def connect(self):
+        config = self.app.config
+        urls = [config['SQLALCHEMY_DATABASE_URI'], *(config.get('REPLICA_DATABASE_URLS') or [])]
+        self.engines = [async_engine(config, url) for url in urls]
+        self.primary, *self.replicas = [async_sessionmaker(engine, expire_on_commit=False) for engine in self.engines]
+
+    async def disconnect(self):
+        for engine in self.engines:
+            await engine.dispose()
+        self.engines = []
+        self.primary = None
+        self.replicas = []
+
+    def warm_indexes(self):
+        with self.app.app_context():
+            for indexes, models in ((get_search_backend(), SEARCHABLE_MODELS), (get_autocomplete(), COMPLETED_MODELS)):
+                if isinstance(indexes, ModelIndexes):
+                    for model in models:
+                        indexes.index_for(model)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.connect()
+                # Builds the in-process search and autocomplete indexes now rather than on the event loop;
+                # the first request starts refreshing them.
+                await asyncio.to_thread(self.warm_indexes)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.disconnect()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise NotImplementedError(f"Unsupported ASGI scope {scope['type']!r}")
+
+        environ = wsgi_environ(scope, await read_body(receive))
+        try:
+            endpoint, view_args = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = None
+        view = ASYNC_VIEWS.get(endpoint)
+        if view is None:
+            return await call_wsgi(self.app.wsgi_app, environ, send)
+        if self.primary is None:
+            self.connect()
+        status, headers, body = await self.dispatch(view, view_args, environ)
+        await send(start_message(status, headers))
+        await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+    async def dispatch(self, view, view_args, environ):
+        """Flask's request handling with an awaited view."""
+        app = self.app
+        metrics = app.extensions['metrics']
+        started = metrics.request_started()
+        ctx = app.request_context(environ)
+        error = None
+        ctx.push()
+        try:
+            try:
+                response = app.preprocess_request()
+                if response is None:
+                    sessions = self.primary
+                    if self.replicas and not pinned_to_primary():
+                        sessions = random.choice(self.replicas)
+                    response = await view(Reads(sessions), **view_args)
+            except Exception as e:
+                response = app.handle_user_exception(e)
+            response = app.finalize_request(response)
+        except Exception as e:
+            error = e
+            response = app.handle_exception(e)
+        try:
+            body, status, headers = response.get_wsgi_response(environ)
+            return status, headers, b''.join(body)
+        finally:
+            ctx.pop(error)
+            metrics.request_finished(environ, started, str(response.status_code))
+
+
+application = Application(app)
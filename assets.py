@@ -0,0 +1,221 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+cli = AppGroup('assets', help='Build fingerprinted, precompressed static assets.')
+
+# Build output, relative to the static folder; the manifest maps source
+# paths and bundle names to the fingerprinted files in it.
+BUILD_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Bundles in the order their parts must load. Without a build, templates
+# get the parts themselves.
+BUNDLES = {
+    'css/fyyur.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'js/head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'js/fyyur.js': [
+        'js/script.js',
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+    ],
+}
+
+COMPRESSIBLE = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.ttf', '.otf', '.eot'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_STRING = r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+CSS_COMMENT = re.compile(rf'({_STRING})|/\*(?!!).*?\*/', re.S)
+CSS_SPACE = re.compile(rf'({_STRING})|\s+')
+CSS_PUNCTUATION = re.compile(rf'({_STRING})|\s*([{{}};,>])\s*|(:)\s+')
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+SOURCE_MAP = re.compile(r'^//[#@] sourceMappingURL=.*$', re.M)
+
+
+def minify_css(css):
+    """Drop comments (except /*! ... */) and the whitespace CSS does not need."""
+    keep = lambda replacement: lambda match: match.group(1) or replacement(match)
+    css = CSS_COMMENT.sub(keep(lambda match: ''), css)
+    css = CSS_SPACE.sub(keep(lambda match: ' '), css)
+    css = CSS_PUNCTUATION.sub(keep(lambda match: match.group(2) or match.group(3)), css)
+    return css.replace(';}', '}').strip()
+
+
+def rewrite_css_urls(css, source, target, manifest):
+    """Point the relative ``url()``s of ``source`` at their built files, from ``target``'s directory."""
+    def rewrite(match):
+        url = match.group(2).strip()
+        if url.startswith(('data:', '#', '/')) or '://' in url or url.startswith('//'):
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        resolved = posixpath.normpath(posixpath.join(posixpath.dirname(source), path))
+        resolved = manifest.get(resolved, resolved)
+        return f'url("{posixpath.relpath(resolved, posixpath.dirname(target))}{suffix}")'
+    return CSS_URL.sub(rewrite, css)
+
+
+def fingerprinted(path, data):
+    stem, ext = posixpath.splitext(path)
+    return f'{BUILD_DIR}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def write_asset(static_folder, path, data):
+    """Write ``data`` and, for text formats, its .gz and .br variants when they are smaller."""
+    filename = os.path.join(static_folder, path)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(data)
+    if posixpath.splitext(path)[1] not in COMPRESSIBLE:
+        return
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(data):
+            with open(filename + suffix, 'wb') as f:
+                f.write(compressed)
+
+
+def source_files(static_folder):
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and os.path.join(root, d) != os.path.join(static_folder, BUILD_DIR))
+        for name in sorted(files):
+            if not name.startswith('.'):
+                yield posixpath.relpath(os.path.join(root, name), static_folder).replace(os.sep, '/')
+
+
+def build_assets(static_folder):
+    """Fingerprint every static file, build the bundles and write the manifest.
+
+    Files are content-addressed, so earlier builds stay valid for pages that
+    still reference them and unchanged files keep their names.
+    """
+    manifest = {}
+    sources = list(source_files(static_folder))
+    # Stylesheets last, so their url()s can point at fingerprinted images and fonts.
+    for path in sorted(sources, key=lambda path: path.endswith('.css')):
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        if path.endswith('.css'):
+            css = rewrite_css_urls(data.decode('utf-8'), path, path, manifest)
+            data = minify_css(css).encode('utf-8')
+        built = manifest[path] = fingerprinted(path, data)
+        if path.endswith('.css'):
+            # Re-point the url()s at the built file's own directory.
+            css = rewrite_css_urls(css, path, built, {})
+            data = minify_css(css).encode('utf-8')
+        write_asset(static_folder, built, data)
+
+    for name, parts in BUNDLES.items():
+        texts = []
+        for part in parts:
+            with open(os.path.join(static_folder, part), encoding='utf-8') as f:
+                texts.append(f.read())
+        if name.endswith('.css'):
+            css = '\n'.join(rewrite_css_urls(text, part, name, manifest) for part, text in zip(parts, texts))
+            built = fingerprinted(name, minify_css(css).encode('utf-8'))
+            data = minify_css(rewrite_css_urls(css, name, built, {})).encode('utf-8')
+        else:
+            data = ';\n'.join(SOURCE_MAP.sub('', text).strip() for text in texts).encode('utf-8') + b'\n'
+            built = fingerprinted(name, data)
+        manifest[name] = built
+        write_asset(static_folder, built, data)
+
+    with open(os.path.join(static_folder, BUILD_DIR, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, BUILD_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(path):
+    """``url_for('static', ...)`` of the fingerprinted build of ``path`` when there is one."""
+    manifest = current_app.extensions['asset_manifest']
+    return url_for('static', filename=manifest.get(path, path))
+
+
+def asset_urls(name):
+    """URLs to load a bundle: the built file, or its parts when assets are not built."""
+    manifest = current_app.extensions['asset_manifest']
+    if name in manifest:
+        return [url_for('static', filename=manifest[name])]
+    return [asset_url(part) for part in BUNDLES.get(name, [name])]
+
+
+def serve_static(filename):
+    """Flask's static view, plus immutable caching and precompressed variants for built files."""
+    app = current_app
+    if not filename.startswith(BUILD_DIR + '/') or filename == f'{BUILD_DIR}/{MANIFEST}':
+        return app.send_static_file(filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(os.path.join(app.static_folder, filename + suffix)):
+            response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+            response.content_encoding = encoding
+            break
+    if response is None:
+        response = send_from_directory(app.static_folder, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if posixpath.splitext(filename)[1] in COMPRESSIBLE:
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.jinja_env.globals.update(asset_url=asset_url, asset_urls=asset_urls)
+    app.view_functions['static'] = serve_static
+
+
+def _size(filename):
+    return os.path.getsize(filename) if os.path.exists(filename) else None
+
+
+@cli.command('build')
+@click.option('--clean', is_flag=True, help='Delete earlier builds first; only safe once no cached page references them.')
+def build_command(clean):
+    """Bundle, minify, fingerprint and precompress the static files."""
+    static_folder = current_app.static_folder
+    if clean:
+        shutil.rmtree(os.path.join(static_folder, BUILD_DIR), ignore_errors=True)
+    if brotli is None:
+        click.echo('brotli is not installed; writing gzip variants only.', err=True)
+    manifest = build_assets(static_folder)
+    current_app.extensions['asset_manifest'] = manifest
+    click.echo(f'Built {len(manifest)} assets into {os.path.join(static_folder, BUILD_DIR)}.')
+    for name, parts in BUNDLES.items():
+        filename = os.path.join(static_folder, manifest[name])
+        sources = sum(os.path.getsize(os.path.join(static_folder, part)) for part in parts)
+        sizes = ', '.join(f'{suffix} {size}' for suffix, size in (('gz', _size(filename + '.gz')), ('br', _size(filename + '.br'))) if size)
+        click.echo(f'  {name} -> {manifest[name]}: {sources} bytes in {len(parts)} files, {_size(filename)} built ({sizes})')
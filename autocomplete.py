@@ -0,0 +1,111 @@
+import bisect
+import threading
+import unicodedata
+from flask import current_app
+from models import Venue, Artist
+from sync import ModelIndexes, refresh_in_background, track_commits
+
+COMPLETED_MODELS = (Venue, Artist)
+
+
+def normalize(text):
+    """Case- and accent-insensitive form of ``text`` with single spaces."""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+
+def prefix_keys(name):
+    """The name from each word on, so any word of it can start a match."""
+    words = normalize(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    """Names as a sorted list of ``(key, id)`` pairs.
+
+    Completing a prefix is a bisection to its first key plus a walk over
+    the matches, so the cost depends on the limit, not on the table size.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.names = {}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self, rows):
+        with self.lock:
+            self.names = {id: (name, prefix_keys(name)) for id, name in rows}
+            self.keys = sorted((key, id) for id, (name, keys) in self.names.items() for key in keys)
+
+    def add(self, id, name):
+        with self.lock:
+            self.remove(id)
+            keys = prefix_keys(name)
+            self.names[id] = (name, keys)
+            for key in keys:
+                bisect.insort(self.keys, (key, id))
+
+    def remove(self, id):
+        with self.lock:
+            entry = self.names.pop(id, None)
+            if entry is None:
+                return
+            for key in entry[1]:
+                i = bisect.bisect_left(self.keys, (key, id))
+                if i < len(self.keys) and self.keys[i] == (key, id):
+                    del self.keys[i]
+
+    def complete(self, prefix, limit):
+        """Up to ``limit`` ``(id, name)`` pairs with a word starting with ``prefix``, by the matched text."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = []
+        seen = set()
+        with self.lock:
+            keys = self.keys
+            i = bisect.bisect_left(keys, (prefix,))
+            while i < len(keys) and len(matches) < limit:
+                key, id = keys[i]
+                if not key.startswith(prefix):
+                    break
+                if id not in seen:
+                    seen.add(id)
+                    matches.append((id, self.names[id][0]))
+                i += 1
+        return matches
+
+
+class Autocomplete(ModelIndexes):
+    """A ``PrefixIndex`` per model, kept in sync with committed writes."""
+
+    index_class = PrefixIndex
+
+    def complete(self, model, prefix, limit=10):
+        return self.index_for(model).complete(prefix, limit)
+
+
+def get_autocomplete(app=None):
+    app = app or current_app
+    return app.extensions.setdefault(
+        'autocomplete', Autocomplete(app.config['INDEX_CHECK_SECONDS'], app.config['INDEX_SETTLE_SECONDS']))
+
+
+def init_autocomplete(app):
+    refresh_in_background(app, get_autocomplete, COMPLETED_MODELS)
+
+
+def _describe(obj, deleted):
+    return type(obj), obj.id, None if deleted else obj.name
+
+
+def _apply_changes(changes):
+    completer = current_app.extensions.get('autocomplete')
+    if completer is not None:
+        completer.apply(changes)
+
+
+track_commits('autocomplete_changes', COMPLETED_MODELS, _describe, _apply_changes)
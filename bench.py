@@ -0,0 +1,679 @@
+"""Benchmarks for Fyyur's hot paths.
+
+Every benchmark drops and recreates the tables of the database it runs
+against, so by default it uses a throwaway SQLite file. Point it at a
+scratch PostgreSQL database with --database-url to measure production-like
+numbers.
+
+    python bench.py search --sizes 10000,100000,1000000
+    python bench.py explain --shows 1000000
+    python bench.py render --rows 10000
+    python bench.py datetime --count 100000
+    python bench.py routes --save-baseline bench_baseline.json
+    python bench.py routes --baseline bench_baseline.json
+    python bench.py async --concurrency 8,32
+
+Route latencies depend on the machine, so the routes baseline is not
+committed: `fab test` records bench_baseline.json on its first run and
+compares later runs against it. Delete the file to record a new one.
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import random
+import socket
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+SYLLABLES = ['ka', 'ro', 'mi', 'len', 'tor', 'sa', 'vi', 'dun', 'el', 'bra', 'zo', 'quin', 'har', 'ly', 'ne', 'os']
+SEARCH_TERMS = ['ka', 'tor', 'mile', 'brazo', 'quinhar', 'xyzzy']
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def fake_names(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        words = (''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(2))
+        yield f"{' '.join(words).title()} {i}"
+
+
+def reset_database(db):
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+
+
+def insert_rows(db, model, rows, chunk_size=10000):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            db.session.execute(db.insert(model), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(db.insert(model), chunk)
+    db.session.commit()
+
+
+def insert_artists(db, Artist, count):
+    insert_rows(db, Artist, (
+        {"name": name, "city": "San Francisco", "state": "CA", "genres": "Jazz", "seeking_venue": False}
+        for name in fake_names(count)
+    ))
+
+
+def insert_venues(db, Venue, count):
+    insert_rows(db, Venue, (
+        {"name": name, "city": "San Francisco", "state": "CA", "address": "1 Main St", "genres": "Jazz", "seeking_talent": False}
+        for name in fake_names(count, seed=1)
+    ))
+
+
+def insert_shows(db, Show, count, venues, artists, seed=0):
+    rng = random.Random(seed)
+    epoch = datetime.datetime.now() - datetime.timedelta(days=365 * 5)
+    insert_rows(db, Show, (
+        {
+            "venue_id": rng.randint(1, venues),
+            "artist_id": rng.randint(1, artists),
+            "start_time": epoch + datetime.timedelta(minutes=rng.randrange(60 * 24 * 365 * 6)),
+        }
+        for _ in range(count)
+    ))
+
+
+def bench_search(app, args):
+    from models import db, Artist
+    from search import IlikeSearch, get_search_backend
+    from autocomplete import get_autocomplete
+
+    baseline = IlikeSearch()
+    print(f"{'names':>9} {'term':>9} {'ilike ms':>10} {'indexed ms':>11} {'matches':>9} {'prefix ms':>10}")
+    for size in args.sizes:
+        with app.app_context():
+            reset_database(db)
+            insert_artists(db, Artist, size)
+            backend = get_search_backend()
+            if hasattr(backend, 'reset'):
+                backend.reset()
+            completer = get_autocomplete()
+            completer.reset()
+
+            start = time.perf_counter()
+            backend.search(Artist, '')
+            print(f"{size:>9} index warm-up ({backend.name}): {(time.perf_counter() - start) * 1000:.1f} ms")
+            start = time.perf_counter()
+            completer.index_for(Artist)
+            print(f"{size:>9} index warm-up (prefix): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+            for term in SEARCH_TERMS:
+                def run(search):
+                    results = search.search(Artist, term)
+                    results.slice(0, app.config['SEARCH_PAGE_SIZE'])
+                    return results.count
+
+                ilike_ms = timed(lambda: run(baseline), args.repeat)
+                indexed_ms = timed(lambda: run(backend), args.repeat)
+                # What the show form's pickers ask for on each keystroke.
+                prefix_ms = timed(lambda: completer.complete(Artist, term, app.config['AUTOCOMPLETE_LIMIT']), args.repeat)
+                print(f"{size:>9} {term:>9} {ilike_ms:>10.2f} {indexed_ms:>11.2f} {run(backend):>9} {prefix_ms:>10.4f}")
+
+
+def explain(db, query):
+    compiled = query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    if db.engine.dialect.name == 'sqlite':
+        rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+        return '\n'.join(row[-1] for row in rows)
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN {compiled}', params)
+    return '\n'.join(row[0] for row in rows)
+
+
+def uses_index(plan, index_name, table='Show'):
+    full_scans = (f'Seq Scan on "{table}"', f'SCAN {table}\n')
+    return index_name in plan and not any(scan in plan + '\n' for scan in full_scans)
+
+
+def primary_key_index(db, table):
+    """How EXPLAIN names ``table``'s primary key."""
+    return 'INTEGER PRIMARY KEY' if db.engine.dialect.name == 'sqlite' else f'{table}_pkey'
+
+
+def bench_explain(app, args):
+    from models import db, Venue, Artist, Show
+    from queries import search_upcoming_query, venue_shows_query, artist_shows_query
+
+    with app.app_context():
+        reset_database(db)
+        insert_venues(db, Venue, args.venues)
+        insert_artists(db, Artist, args.artists)
+        insert_shows(db, Show, args.shows, args.venues, args.artists)
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+
+        now = datetime.datetime.now()
+        checks = [
+            ('show_venue', 'Show', 'ix_Show_venue_id_start_time',
+             venue_shows_query(1).filter(Show.start_time > now).order_by(Show.start_time, Show.id).limit(13)),
+            ('show_artist', 'Show', 'ix_Show_artist_id_start_time',
+             artist_shows_query(1).filter(Show.start_time <= now).order_by(Show.start_time.desc(), Show.id.desc()).limit(13)),
+            # Search results read the upcoming counts from the counter columns.
+            ('upcoming counts of venues found', 'Venue', primary_key_index(db, 'Venue'),
+             search_upcoming_query(Venue, list(range(1, 21)))),
+            ('upcoming counts of artists found', 'Artist', primary_key_index(db, 'Artist'),
+             search_upcoming_query(Artist, list(range(1, 21)))),
+        ]
+
+        failed = False
+        for name, table, index_name, query in checks:
+            plan = explain(db, query)
+            ok = uses_index(plan, index_name, table)
+            failed = failed or not ok
+            print(f"{'ok' if ok else 'FAIL':>4}  {name} (expects {index_name})")
+            print('      ' + plan.replace('\n', '\n      '))
+        return 1 if failed else 0
+
+
+def bench_render(app, args):
+    from flask import render_template
+    from models import db, Venue, Artist, Show
+    from queries import shows_page
+
+    with app.app_context():
+        reset_database(db)
+        insert_venues(db, Venue, 100)
+        insert_artists(db, Artist, 1000)
+        insert_shows(db, Show, args.rows, 100, 1000)
+
+    app.config['LISTING_PAGE_SIZE'] = args.rows
+    fragments = app.jinja_env.fragment_cache
+    client = app.test_client()
+
+    with app.test_request_context('/shows'):
+        page = shows_page(per_page=args.rows)
+        for show in page.items:
+            show['start_time'] = app.jinja_env.filters['datetime'](show['start_time'])
+        render = lambda: render_template('pages/shows.html', shows=page.items, page=page)
+
+        def cold_render():
+            fragments.clear()
+            render()
+
+        cold_render_ms = timed(cold_render, args.repeat)
+        warm_render_ms = timed(render, args.repeat)
+
+    def cold_request():
+        fragments.clear()
+        client.get('/shows')
+
+    cold_request_ms = timed(cold_request, args.repeat)
+    warm_request_ms = timed(lambda: client.get('/shows'), args.repeat)
+
+    print(f"/shows with {args.rows} rows ({type(fragments).__name__} fragment cache), median of {args.repeat}:")
+    print(f"  template render  cold {cold_render_ms:8.1f} ms   warm {warm_render_ms:8.1f} ms")
+    print(f"  full request     cold {cold_request_ms:8.1f} ms   warm {warm_request_ms:8.1f} ms")
+
+
+def babel_format_datetime(value, format='medium'):
+    """The per-call filter the app used before ``formatting.DateTimeFormatter``."""
+    import babel.dates
+    import dateutil.parser
+
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(value, format, locale='en')
+
+
+def bench_datetime(app, args):
+    from formatting import DateTimeFormatter
+
+    rng = random.Random(0)
+    epoch = datetime.datetime(2020, 1, 1)
+    # Shows start on the hour or half hour, so a large list repeats timestamps.
+    values = [epoch + datetime.timedelta(minutes=30 * rng.randrange(args.distinct)) for _ in range(args.count)]
+    strings = [value.isoformat() for value in values]
+
+    formatter = DateTimeFormatter()
+    expected = [babel_format_datetime(value) for value in values[:1000]]
+    assert formatter.format_many(values[:1000]) == expected
+    assert [formatter.format(value) for value in strings[:1000]] == expected
+
+    def cold(run):
+        def bench():
+            nonlocal formatter
+            formatter = DateTimeFormatter()
+            run()
+        return bench
+
+    rows = [
+        ('babel per call (datetimes)', lambda: [babel_format_datetime(value) for value in values], None),
+        ('babel per call (strings)', lambda: [babel_format_datetime(value) for value in strings], None),
+        ('formatter per call', lambda: [formatter.format(value) for value in values], True),
+        ('formatter batch', lambda: formatter.format_many(values), True),
+        ('formatter batch (strings)', lambda: formatter.format_many(strings), True),
+    ]
+    print(f"{args.count} timestamps, {args.distinct} distinct slots, median of {args.repeat}:")
+    print(f"{'':>28} {'cold ms':>10} {'warm ms':>10}")
+    for name, run, cached in rows:
+        cold_ms = timed(cold(run) if cached else run, args.repeat)
+        warm_ms = timed(run, args.repeat) if cached else cold_ms
+        print(f"{name:>28} {cold_ms:>10.1f} {warm_ms:>10.1f}")
+
+
+def seed_catalog(app, venues, artists, shows):
+    from models import db, Venue, Artist, Show
+    from counters import recount, roll_shows
+    from search import get_search_backend
+    from autocomplete import get_autocomplete
+    from areas import rebuild_areas
+
+    with app.app_context():
+        reset_database(db)
+        insert_venues(db, Venue, venues)
+        insert_artists(db, Artist, artists)
+        insert_shows(db, Show, shows, venues, artists)
+        recount()
+        roll_shows(datetime.datetime.now())
+        rebuild_areas()
+        db.session.commit()
+        backend = get_search_backend()
+        if hasattr(backend, 'reset'):
+            backend.reset()
+        get_autocomplete().reset()
+    app.extensions['entity_cache'].backend.clear()
+    app.jinja_env.fragment_cache.clear()
+
+
+def route_scenarios(args):
+    """Request ``i`` of each route, keyed by "METHOD rule": (method, path, form data, headers)."""
+    pick = lambda i, count: i % count + 1
+    term = lambda i: SEARCH_TERMS[i % len(SEARCH_TERMS)]
+    venue_form = lambda name: {"name": name, "city": "Oakland", "state": "CA", "address": "2 Main St", "genres": ["Jazz", "Folk"]}
+    artist_form = lambda name: {"name": name, "city": "Oakland", "state": "CA", "genres": ["Jazz"]}
+    export_headers = {'Authorization': 'Bearer bench'}
+    # Deletes take venues from the top of the id range, away from the ones
+    # the other scenarios read.
+    return {
+        'GET /': lambda i: ('GET', '/', None, None),
+        'GET /venues': lambda i: ('GET', '/venues', None, None),
+        'POST /venues/search': lambda i: ('POST', '/venues/search', {"search_term": term(i)}, None),
+        'GET /venues/<int:venue_id>': lambda i: ('GET', f'/venues/{pick(i, args.venues // 2)}', None, None),
+        'GET /venues/create': lambda i: ('GET', '/venues/create', None, None),
+        'GET /venues/<int:venue_id>/edit': lambda i: ('GET', f'/venues/{pick(i, args.venues // 2)}/edit', None, None),
+        'GET /artists': lambda i: ('GET', '/artists', None, None),
+        'POST /artists/search': lambda i: ('POST', '/artists/search', {"search_term": term(i)}, None),
+        'GET /artists/<int:artist_id>': lambda i: ('GET', f'/artists/{pick(i, args.artists)}', None, None),
+        'GET /artists/create': lambda i: ('GET', '/artists/create', None, None),
+        'GET /artists/<int:artist_id>/edit': lambda i: ('GET', f'/artists/{pick(i, args.artists)}/edit', None, None),
+        'GET /shows': lambda i: ('GET', '/shows', None, None),
+        'GET /shows/create': lambda i: ('GET', '/shows/create', None, None),
+        'GET /_stats/cache': lambda i: ('GET', '/_stats/cache', None, None),
+        'GET /_stats/pool': lambda i: ('GET', '/_stats/pool', None, None),
+        'GET /metrics': lambda i: ('GET', '/metrics', None, None),
+        'GET /api/v1/shows': lambda i: ('GET', '/api/v1/shows', None, None),
+        'GET /api/v1/venues': lambda i: ('GET', '/api/v1/venues', None, None),
+        'GET /api/v1/artists': lambda i: ('GET', '/api/v1/artists', None, None),
+        'GET /api/v1/venues/<int:venue_id>': lambda i: ('GET', f'/api/v1/venues/{pick(i, args.venues // 2)}', None, None),
+        'GET /api/v1/artists/<int:artist_id>': lambda i: ('GET', f'/api/v1/artists/{pick(i, args.artists)}', None, None),
+        'GET /api/v1/<kind>/autocomplete': lambda i: (
+            'GET', f"/api/v1/{('venues', 'artists')[i % 2]}/autocomplete?q={term(i)[:3]}", None, None),
+        'GET /export/<kind>.csv.gz': lambda i: ('GET', '/export/venues.csv.gz', None, export_headers),
+        'POST /venues/create': lambda i: ('POST', '/venues/create', venue_form(f'Bench Venue {i}'), None),
+        'POST /artists/create': lambda i: ('POST', '/artists/create', artist_form(f'Bench Artist {i}'), None),
+        'POST /shows/create': lambda i: ('POST', '/shows/create', {
+            "venue_id": pick(i, args.venues // 2), "artist_id": pick(i, args.artists),
+            # A day apart, so no booking conflicts with an earlier one.
+            "start_time": f"{datetime.date(2031, 1, 1) + datetime.timedelta(days=i)} 20:00:00", "duration": 120,
+        }, None),
+        'POST /venues/<int:venue_id>/edit': lambda i: (
+            'POST', f'/venues/{pick(i, args.venues // 2)}/edit', venue_form(f'Edited Venue {i}'), None),
+        'POST /artists/<int:artist_id>/edit': lambda i: (
+            'POST', f'/artists/{pick(i, args.artists)}/edit', artist_form(f'Edited Artist {i}'), None),
+        'POST /venues/<int:venue_id>/delete': lambda i: ('POST', f'/venues/{args.venues - i}/delete', None, None),
+    }
+
+
+def unbenchmarked_routes(app, scenarios):
+    routes = {
+        f'{method} {rule.rule}'
+        for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+        for method in rule.methods - {'HEAD', 'OPTIONS'}
+    }
+    return sorted(routes - set(scenarios))
+
+
+def client_requester(app):
+    client = app.test_client()
+
+    def send(method, path, data, headers):
+        return client.open(path, method=method, data=data, headers=headers).status_code
+
+    return send
+
+
+def server_requester(app, threads=None):
+    """Serve ``app`` with a thread per request, or at most ``threads`` at once like gunicorn's gthread workers."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=threads is None, request_handler=QuietHandler)
+    if threads is not None:
+        pool = ThreadPoolExecutor(threads)
+        server.process_request = lambda request, client_address: pool.submit(
+            socketserver.ThreadingMixIn.process_request_thread, server, request, client_address)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return http_requester(server.server_port), server
+
+
+def http_requester(port):
+    def send(method, path, data, headers):
+        connection = http.client.HTTPConnection('127.0.0.1', port)
+        headers = dict(headers or {})
+        body = None
+        if data is not None:
+            body = urllib.parse.urlencode(data, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        response.read()
+        connection.close()
+        return response.status
+
+    return send
+
+
+def percentile(cuts, p):
+    return cuts[p - 1] if cuts else None
+
+
+def measure_route(send, scenario, requests, concurrency, statements):
+    def one(i):
+        start = time.perf_counter()
+        status = send(*scenario(i))
+        return (time.perf_counter() - start) * 1000, status
+
+    before = statements['n']
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(one, range(requests)))
+    else:
+        samples = [one(i) for i in range(requests)]
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, status in samples]
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": requests,
+        "p50_ms": round(percentile(cuts, 50), 3),
+        "p95_ms": round(percentile(cuts, 95), 3),
+        "p99_ms": round(percentile(cuts, 99), 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "sql_per_request": round((statements['n'] - before) / requests, 2),
+        "errors": sum(status >= 500 for latency, status in samples),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance, min_delta_ms):
+    """Return the regressions of ``results`` against ``baseline`` as printable lines."""
+    regressions = []
+    for mode, routes in results.items():
+        for route, now in routes.items():
+            before = baseline.get(mode, {}).get(route)
+            if before is None:
+                continue
+            limit = max(before['p95_ms'] * (1 + tolerance), before['p95_ms'] + min_delta_ms)
+            if now['p95_ms'] > limit:
+                regressions.append(f"{mode} {route}: p95 {now['p95_ms']:.1f} ms > {limit:.1f} ms (baseline {before['p95_ms']:.1f})")
+            if now['sql_per_request'] > before['sql_per_request']:
+                regressions.append(f"{mode} {route}: {now['sql_per_request']} SQL statements per request, baseline {before['sql_per_request']}")
+            if now['errors'] > before['errors']:
+                regressions.append(f"{mode} {route}: {now['errors']} server errors, baseline {before['errors']}")
+    return regressions
+
+
+def bench_routes(app, args):
+    from sqlalchemy import event
+    from cache import NullCache
+    from models import db
+
+    app.config.update(WTF_CSRF_ENABLED=False, EXPORT_TOKEN='bench')
+    if args.cold:
+        app.extensions['entity_cache'].backend = NullCache()
+        app.jinja_env.fragment_cache = NullCache()
+
+    scenarios = route_scenarios(args)
+    missing = unbenchmarked_routes(app, scenarios)
+    if missing:
+        print('No benchmark scenario for: ' + ', '.join(missing), file=sys.stderr)
+        return 1
+    routes = [route for route in scenarios if not args.routes or route in args.routes]
+
+    statements = {'n': 0}
+    lock = threading.Lock()
+
+    def count(*_):
+        with lock:
+            statements['n'] += 1
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', count)
+
+    results = {}
+    for mode in args.modes:
+        seed_catalog(app, args.venues, args.artists, args.shows)
+        server = None
+        if mode == 'server':
+            send, server = server_requester(app)
+            concurrency = args.concurrency
+        else:
+            send, concurrency = client_requester(app), 1
+
+        results[mode] = {}
+        print(f"\n{mode}: {args.venues} venues, {args.artists} artists, {args.shows} shows, "
+              f"{args.requests} requests per route, concurrency {concurrency}")
+        print(f"{'route':<40} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'sql/req':>8} {'5xx':>5}")
+        for route in routes:
+            requests = min(args.requests, args.venues // 2) if route.endswith('/delete') else args.requests
+            row = results[mode][route] = measure_route(send, scenarios[route], requests, concurrency, statements)
+            print(f"{route:<40} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                  f"{row['throughput_rps']:>8.1f} {row['sql_per_request']:>8.2f} {row['errors']:>5}")
+        if server is not None:
+            server.shutdown()
+
+    report = {
+        "scale": {"venues": args.venues, "artists": args.artists, "shows": args.shows, "cold": args.cold},
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'\nSaved baseline to {args.save_baseline}.')
+
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f'\nBaseline {args.baseline} does not exist; create it with --save-baseline.', file=sys.stderr)
+            return 2
+        if baseline['scale'] != report['scale']:
+            print(f"\nwarning: baseline was measured at {baseline['scale']}", file=sys.stderr)
+        regressions = compare_to_baseline(results, baseline['results'], args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f'\n{len(regressions)} REGRESSION(S) against {args.baseline}:', file=sys.stderr)
+            for regression in regressions:
+                print(f'  {regression}', file=sys.stderr)
+            return 1
+        print(f'\nNo regressions against {args.baseline}.')
+    return 0
+
+
+ASYNC_ROUTES = [
+    'GET /venues',
+    'POST /venues/search',
+    'GET /venues/<int:venue_id>',
+    'GET /artists',
+    'POST /artists/search',
+    'GET /artists/<int:artist_id>',
+    'GET /shows',
+]
+
+
+def asgi_server(application):
+    import uvicorn
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(application, log_level='warning', lifespan='on'))
+    threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return http_requester(sock.getsockname()[1]), server
+
+
+def bench_async(app, args):
+    from sqlalchemy import event
+    from sqlalchemy.engine import make_url
+    from cache import NullCache
+    from models import db
+    from asgi import application
+
+    app.config.update(WTF_CSRF_ENABLED=False)
+    if args.cold:
+        app.extensions['entity_cache'].backend = NullCache()
+        app.jinja_env.fragment_cache = NullCache()
+    if make_url(app.config['SQLALCHEMY_DATABASE_URI']).database in (None, '', ':memory:'):
+        print('The async engine cannot share an in-memory database; use a file or PostgreSQL.', file=sys.stderr)
+        return 1
+    seed_catalog(app, args.venues, args.artists, args.shows)
+
+    scenarios = route_scenarios(args)
+    routes = [route for route in ASYNC_ROUTES if not args.routes or route in args.routes]
+    sync_send, sync_server = server_requester(app, args.threads)
+    async_send, async_server = asgi_server(application)
+
+    statements = {'n': 0}
+    lock = threading.Lock()
+
+    def count(*_):
+        with lock:
+            statements['n'] += 1
+
+    with app.app_context():
+        for engine in [*db.engines.values(), *(engine.sync_engine for engine in application.engines)]:
+            event.listen(engine, 'before_cursor_execute', count)
+
+    print(f"{args.venues} venues, {args.artists} artists, {args.shows} shows, {args.requests} requests per route; "
+          f"sync server runs {args.threads} requests at once, async server one event loop")
+    for concurrency in args.concurrency:
+        print(f"\nconcurrency {concurrency}")
+        print(f"{'route':<32} {'sync p50':>9} {'sync p95':>9} {'sync r/s':>9} {'async p50':>10} {'async p95':>10} {'async r/s':>10} {'speedup':>8}")
+        for route in routes:
+            sync = measure_route(sync_send, scenarios[route], args.requests, concurrency, statements)
+            asynchronous = measure_route(async_send, scenarios[route], args.requests, concurrency, statements)
+            print(f"{route:<32} {sync['p50_ms']:>9.2f} {sync['p95_ms']:>9.2f} {sync['throughput_rps']:>9.1f} "
+                  f"{asynchronous['p50_ms']:>10.2f} {asynchronous['p95_ms']:>10.2f} {asynchronous['throughput_rps']:>10.1f} "
+                  f"{asynchronous['throughput_rps'] / sync['throughput_rps']:>7.2f}x")
+            if sync['errors'] or asynchronous['errors']:
+                print(f"  server errors: sync {sync['errors']}, async {asynchronous['errors']}", file=sys.stderr)
+
+    sync_server.shutdown()
+    async_server.should_exit = True
+    return 0
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='scratch database to (re)create; defaults to a temporary SQLite file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    search_parser = commands.add_parser('search', help='name search latency: ILIKE scan vs the indexed backend, and picker autocomplete')
+    search_parser.add_argument('--sizes', type=parse_sizes, default=[10000, 100000, 1000000])
+    search_parser.add_argument('--repeat', type=int, default=10)
+    search_parser.set_defaults(run=bench_search)
+
+    explain_parser = commands.add_parser('explain', help='check that hot queries are served by indexes')
+    explain_parser.add_argument('--shows', type=int, default=1000000)
+    explain_parser.add_argument('--venues', type=int, default=5000)
+    explain_parser.add_argument('--artists', type=int, default=5000)
+    explain_parser.set_defaults(run=bench_explain)
+
+    render_parser = commands.add_parser('render', help='/shows template render time with a cold and a warm fragment cache')
+    render_parser.add_argument('--rows', type=int, default=10000)
+    render_parser.add_argument('--repeat', type=int, default=5)
+    render_parser.set_defaults(run=bench_render)
+
+    datetime_parser = commands.add_parser('datetime', help='show start time formatting: per-call Babel vs the memoized formatter')
+    datetime_parser.add_argument('--count', type=int, default=100000)
+    datetime_parser.add_argument('--distinct', type=int, default=20000, help='number of distinct half-hour slots')
+    datetime_parser.add_argument('--repeat', type=int, default=3)
+    datetime_parser.set_defaults(run=bench_datetime)
+
+    routes_parser = commands.add_parser('routes', help='latency, throughput and SQL count of every route, checked against a baseline')
+    routes_parser.add_argument('--venues', type=int, default=500)
+    routes_parser.add_argument('--artists', type=int, default=2000)
+    routes_parser.add_argument('--shows', type=int, default=50000)
+    routes_parser.add_argument('--requests', type=int, default=100, help='requests per route')
+    routes_parser.add_argument('--concurrency', type=int, default=4, help='parallel clients against the WSGI server')
+    routes_parser.add_argument('--modes', type=lambda value: value.split(','), default=['client', 'server'],
+                               help='comma-separated: client (Flask test client), server (threaded WSGI server)')
+    routes_parser.add_argument('--routes', type=lambda value: value.split(','), help='only these "METHOD rule" routes')
+    routes_parser.add_argument('--cold', action='store_true', help='disable the entity and fragment caches')
+    routes_parser.add_argument('--baseline', help='fail on regressions against this JSON report')
+    routes_parser.add_argument('--save-baseline', help='write this run as a JSON report')
+    routes_parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p95 increase')
+    routes_parser.add_argument('--min-delta-ms', type=float, default=2.0, help='p95 increases below this are noise')
+    routes_parser.set_defaults(run=bench_routes)
+
+    async_parser = commands.add_parser('async', help='throughput of the read pages: sync server vs the ASGI app at fixed client concurrency')
+    async_parser.add_argument('--venues', type=int, default=500)
+    async_parser.add_argument('--artists', type=int, default=2000)
+    async_parser.add_argument('--shows', type=int, default=50000)
+    async_parser.add_argument('--requests', type=int, default=200, help='requests per route and concurrency level')
+    async_parser.add_argument('--concurrency', type=parse_sizes, default=[1, 8, 32], help='parallel clients, comma separated')
+    async_parser.add_argument('--threads', type=int, default=4, help='requests the sync server handles at once')
+    async_parser.add_argument('--routes', type=lambda value: value.split(','), help='only these "METHOD rule" routes')
+    async_parser.add_argument('--cold', action='store_true', help='disable the entity and fragment caches')
+    async_parser.set_defaults(run=bench_async)
+
+    args = parser.parse_args(argv)
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    from app import app
+    return args.run(app, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
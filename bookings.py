@@ -0,0 +1,161 @@
+"""Double-booking checks: no venue or artist has two overlapping shows.
+
+Shows cover ``[start_time, end_time)``; shows without an end time were
+listed before durations were recorded and never conflict.
+
+``find_conflicts`` reads the overlapping shows from the database, so it
+sees every committed booking whichever process or statement wrote it. On
+PostgreSQL the GiST indexes of the ``*_booking`` exclusion constraints
+answer it; elsewhere no show lasts longer than a day, which bounds the
+scans of the (venue_id, start_time) and (artist_id, start_time) indexes.
+
+``booking_lock`` serialises the check and the insert of bookings that share
+a venue or an artist. On PostgreSQL it takes transaction-level advisory
+locks on them, which also covers bookings in different Show partitions
+(see partitions.py), where each partition's constraints see only its own
+rows. SQLite has a single writer, so the lock is its write lock, taken
+before the check instead of at the insert.
+"""
+import bisect
+import contextlib
+import datetime
+import threading
+from sqlalchemy import DateTime, Integer, bindparam, func, or_, text
+from forms import MAX_DURATION_MINUTES
+from models import db, Show
+
+# SQLSTATE of a violated exclusion constraint.
+EXCLUSION_VIOLATION = '23P01'
+MAX_DURATION = datetime.timedelta(minutes=MAX_DURATION_MINUTES)
+
+
+class IntervalIndex:
+    """Half-open intervals by start, for overlap queries in O(log n + k).
+
+    An interval overlapping ``[start, end)`` starts in
+    ``(start - max_length, end)``, so a query bisects the start-ordered list
+    to that window and checks only the k intervals in it. Bookings have a
+    bounded length (a day at most), which keeps the window narrow.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.intervals = {}
+        self.max_length = None
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def add(self, id, start, end):
+        self.remove(id)
+        bisect.insort(self.starts, (start, id))
+        self.intervals[id] = (start, end)
+        if self.max_length is None or end - start > self.max_length:
+            self.max_length = end - start
+
+    def remove(self, id):
+        interval = self.intervals.pop(id, None)
+        if interval is not None:
+            i = bisect.bisect_left(self.starts, (interval[0], id))
+            del self.starts[i]
+
+    def overlapping(self, start, end):
+        if not self.intervals:
+            return []
+        lo = bisect.bisect_right(self.starts, (start - self.max_length, float('inf')))
+        hi = bisect.bisect_left(self.starts, (end,))
+        return [id for interval_start, id in self.starts[lo:hi] if self.intervals[id][1] > start]
+
+
+_process_lock = threading.Lock()
+
+# First keys of the advisory locks on a venue's and on an artist's bookings.
+VENUE_LOCK, ARTIST_LOCK = 1, 2
+
+
+def uses_constraints():
+    return db.engine.dialect.name == 'postgresql'
+
+
+@contextlib.contextmanager
+def booking_lock(venue_ids, artist_ids):
+    """Hold while checking for conflicts and adding the shows, up to the commit."""
+    if uses_constraints():
+        # Released by the commit or rollback. Venues before artists, each in
+        # id order, so two transactions never wait on each other's locks.
+        for key, ids in ((VENUE_LOCK, venue_ids), (ARTIST_LOCK, artist_ids)):
+            db.session.execute(
+                text('SELECT pg_advisory_xact_lock(:key, id) FROM (SELECT unnest(CAST(:ids AS integer[])) AS id ORDER BY 1) ids'),
+                {"key": key, "ids": sorted(set(ids))},
+            )
+        yield
+        return
+    with _process_lock:
+        # Any write takes SQLite's database lock until the commit, so other
+        # processes' bookings wait; this one changes nothing.
+        db.session.execute(text('UPDATE "Show" SET id = id WHERE 0'))
+        yield
+
+
+def overlap_filter(venue_id, artist_id, start, end):
+    return (
+        Show.end_time.isnot(None),
+        Show.start_time > start - MAX_DURATION,
+        Show.start_time < end,
+        Show.end_time > start,
+        or_(Show.venue_id == venue_id, Show.artist_id == artist_id),
+    )
+
+
+def find_conflicts(venue_id, artist_id, start, end):
+    """Shows of the venue or the artist overlapping ``[start, end)``."""
+    query = db.session.query(Show).order_by(Show.start_time, Show.id)
+    if uses_constraints():
+        booked = func.tsrange(Show.start_time, Show.end_time)
+        return (query
+                # The start_time bound lets a partitioned Show skip later months.
+                .filter(Show.end_time.isnot(None), Show.start_time < end, booked.op('&&')(func.tsrange(start, end)),
+                        or_(Show.venue_id == venue_id, Show.artist_id == artist_id))
+                .all())
+    return query.filter(*overlap_filter(venue_id, artist_id, start, end)).all()
+
+
+# Rows per query in booked_rows; 6 parameters each stays under SQLite's limit.
+CHECK_CHUNK = 1000
+
+
+def booked_rows(rows):
+    """Positions in ``rows`` (dicts of Show columns) overlapping a committed show of their venue or artist.
+
+    One query per CHECK_CHUNK rows: they are joined to Show as a VALUES list,
+    each probing the same indexes as ``find_conflicts``.
+    """
+    booked = set()
+    for offset in range(0, len(rows), CHECK_CHUNK):
+        values, params = [], []
+        for i, row in enumerate(rows[offset:offset + CHECK_CHUNK], offset):
+            values.append(f'(:n{i}, :venue{i}, :artist{i}, :earliest{i}, :start{i}, :end{i})')
+            params += [
+                bindparam(f'n{i}', i, Integer),
+                bindparam(f'venue{i}', row['venue_id'], Integer),
+                bindparam(f'artist{i}', row['artist_id'], Integer),
+                bindparam(f'earliest{i}', row['start_time'] - MAX_DURATION, DateTime),
+                bindparam(f'start{i}', row['start_time'], DateTime),
+                bindparam(f'end{i}', row['end_time'], DateTime),
+            ]
+        overlapping = ' AND '.join((
+            's.end_time IS NOT NULL', 's.start_time > batch.earliest', 's.start_time < batch.end_time',
+            's.end_time > batch.start_time',
+        ))
+        booked.update(db.session.scalars(text(f"""
+            WITH batch (n, venue_id, artist_id, earliest, start_time, end_time) AS (VALUES {', '.join(values)})
+            SELECT n FROM batch
+            WHERE EXISTS (SELECT 1 FROM "Show" s WHERE s.venue_id = batch.venue_id AND {overlapping})
+               OR EXISTS (SELECT 1 FROM "Show" s WHERE s.artist_id = batch.artist_id AND {overlapping})
+        """).bindparams(*params)))
+    return booked
+
+
+def is_booking_conflict(exc):
+    """Whether an ``IntegrityError`` came from the exclusion constraints."""
+    return getattr(exc.orig, 'pgcode', None) == EXCLUSION_VIOLATION
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from models import db, Show
+
+MISSING = object()
+
+
+class NullCache:
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value, timeout=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+class LRUCache:
+    """In-process cache bounded by entry count, with per-entry expiry."""
+
+    def __init__(self, maxsize=1024, timeout=300):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.monotonic() + timeout if timeout else None
+        with self.lock:
+            self.entries[key] = (expires, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class FileSystemCache:
+    """Pickle-per-key cache in a directory shared by every worker process."""
+
+    def __init__(self, directory, timeout=300):
+        self.directory = directory
+        self.timeout = timeout
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return MISSING
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return MISSING
+        return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires = time.time() + timeout if timeout else None
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class EntityCache:
+    """Read-through cache for per-entity values.
+
+    Entries are keyed by entity kind, id, a caller-supplied variant (such as
+    the query string) and the entity's current version stamp. Invalidating
+    an entity replaces its stamp with a fresh random one, which makes every
+    variant cached under the old stamp unreachable at once; they then age
+    out of the backend. Random stamps need no cross-process locking.
+
+    For ``settle_time`` seconds after an invalidation values are built but
+    not stored, so a read replica that has not caught up with the write
+    cannot put the old data back into the cache.
+    """
+
+    def __init__(self, backend, settle_time=0):
+        self.backend = backend
+        self.settle_time = settle_time
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def version(self, kind, id):
+        key = f'{kind}:{id}:version'
+        version = self.backend.get(key)
+        if version is MISSING:
+            version = (uuid.uuid4().hex, 0)
+            self.backend.set(key, version, timeout=0)
+        return version
+
+    def get_or_build(self, kind, id, variant, build):
+        key, value, invalidated_at = self.lookup(kind, id, variant)
+        if value is MISSING:
+            value = build()
+            self.store(key, value, invalidated_at)
+        return value
+
+    def lookup(self, kind, id, variant):
+        """``(key, value or MISSING, invalidated_at)``; pass a built value to ``store``."""
+        stamp, invalidated_at = self.version(kind, id)
+        key = f'{kind}:{id}:{stamp}:{variant}'
+        value = self.backend.get(key)
+        with self.lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return key, value, invalidated_at
+
+    def store(self, key, value, invalidated_at):
+        if value is not None and time.time() - invalidated_at >= self.settle_time:
+            self.backend.set(key, value)
+
+    def invalidate(self, kind, *ids):
+        for id in ids:
+            self.backend.set(f'{kind}:{id}:version', (uuid.uuid4().hex, time.time()), timeout=0)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+
+def create_backend(config, prefix='CACHE_'):
+    name = config.get(f'{prefix}BACKEND', 'lru')
+    timeout = config.get(f'{prefix}DEFAULT_TIMEOUT', 300)
+    if name == 'lru':
+        return LRUCache(maxsize=config.get(f'{prefix}MAXSIZE', 1024), timeout=timeout)
+    if name == 'filesystem':
+        return FileSystemCache(config[f'{prefix}DIR'], timeout=timeout)
+    if name == 'null':
+        return NullCache()
+    raise ValueError(f'Unknown {prefix}BACKEND {name!r}')
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache kind, id, version %}...{% endcache %}`` caches rendered markup.
+
+    The key parts are joined into the cache key, so the version, e.g. the
+    row's ``updated_at``, must change whenever anything rendered inside the
+    block does. Keep the parts small: they are formatted on every render.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=NullCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        call = self.call_method('_render_cached', [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts, caller):
+        key = 'fragment:' + ':'.join(map(repr, key_parts))
+        cache = self.environment.fragment_cache
+        rendered = cache.get(key)
+        if rendered is MISSING:
+            rendered = caller()
+            cache.set(key, rendered)
+        return rendered
+
+
+def init_cache(app):
+    settle_time = app.config.get('REPLICA_LAG_SECONDS', 0) if app.config.get('REPLICA_DATABASE_URLS') else 0
+    app.extensions['entity_cache'] = EntityCache(create_backend(app.config), settle_time=settle_time)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = create_backend(app.config, prefix='FRAGMENT_CACHE_')
+
+
+def get_cache():
+    return current_app.extensions['entity_cache']
+
+
+def related_ids(column, *criteria):
+    return [id for (id,) in db.session.query(column).filter(*criteria).distinct()]
+
+
+def venue_dependents(venue_id):
+    """Cache entries that render this venue: its own page and its artists' pages."""
+    return {'venue': [venue_id], 'artist': related_ids(Show.artist_id, Show.venue_id == venue_id)}
+
+
+def artist_dependents(artist_id):
+    return {'artist': [artist_id], 'venue': related_ids(Show.venue_id, Show.artist_id == artist_id)}
+
+
+def invalidate(dependents):
+    cache = get_cache()
+    for kind, ids in dependents.items():
+        cache.invalidate(kind, *ids)
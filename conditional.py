@@ -0,0 +1,79 @@
+import datetime
+import functools
+import hashlib
+import json
+import os
+from flask import current_app, g, make_response, request, session
+
+
+def template_digest(app):
+    digest = hashlib.sha1()
+    for root, dirs, files in sorted(os.walk(os.path.join(app.root_path, app.template_folder))):
+        dirs.sort()
+        for name in sorted(files):
+            with open(os.path.join(root, name), 'rb') as f:
+                digest.update(f.read())
+    # Pages link fingerprinted assets, so a new asset build changes them too.
+    digest.update(json.dumps(app.extensions.get('asset_manifest', {}), sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def init_conditional(app):
+    app.extensions['template_digest'] = template_digest(app)
+
+
+def conditional(stamps):
+    """Answer GETs with 304 when the page's stamps are unchanged.
+
+    ``stamps`` takes the view's arguments and returns ``None`` (let the view
+    respond, e.g. with a 404) or a ``(values, last_modified)`` pair, where
+    ``values`` changes whenever anything the page renders does and
+    ``last_modified`` is a naive UTC datetime. The view can key cached data
+    on the values with ``page_version()``.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            result = stamps(*args, **kwargs)
+            g.page_stamps = None if result is None else result[0]
+            # Pending flash messages are rendered into the page itself.
+            if result is None or session.get('_flashes'):
+                return view(*args, **kwargs)
+            values, last_modified = result
+
+            digest = hashlib.sha1(repr((
+                current_app.extensions['template_digest'], request.full_path, values,
+            )).encode()).hexdigest()
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=datetime.timezone.utc, microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(digest)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(since and last_modified and last_modified <= since)
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(digest, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+def page_version():
+    """Digest of the stamps ``conditional`` read for this request.
+
+    Cache keys that include it follow writes made by any process, which
+    stamp the rows they change.
+    """
+    return hashlib.sha1(repr(g.get('page_stamps')).encode()).hexdigest()[:16]
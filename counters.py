@@ -0,0 +1,138 @@
+import datetime
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, literal, select, union_all, update
+from models import db, Venue, Artist, Show, ShowArchive
+
+cli = AppGroup('counters', help='Maintain the denormalized show counters.')
+
+COUNTED = ((Venue, Show.venue_id, ShowArchive.venue_id), (Artist, Show.artist_id, ShowArchive.artist_id))
+
+
+def _adjust(model, id, **deltas):
+    values = {column: getattr(model, column) + delta for column, delta in deltas.items()}
+    db.session.execute(update(model).where(model.id == id).values(values), execution_options={'synchronize_session': False})
+
+
+def count_new_show(show, current_time):
+    show.counted_past = show.start_time <= current_time
+    column = 'past_shows_count' if show.counted_past else 'upcoming_shows_count'
+    _adjust(Venue, show.venue_id, **{column: 1})
+    _adjust(Artist, show.artist_id, **{column: 1})
+
+
+def release_venue_shows(venue_id):
+    """Take a venue's shows out of its artists' counters, and drop its archived shows, before it is deleted."""
+    rows = (
+        db.session.query(
+            Show.artist_id,
+            func.count(case((Show.counted_past.is_(False), 1))),
+            func.count(case((Show.counted_past.is_(True), 1))),
+        )
+        .filter(Show.venue_id == venue_id)
+        .group_by(Show.artist_id)
+    )
+    for artist_id, upcoming, past in rows.all():
+        _adjust(Artist, artist_id, upcoming_shows_count=-upcoming, past_shows_count=-past)
+    # Archived shows have no ORM cascade, and SQLite skips ON DELETE CASCADE.
+    archived = (
+        db.session.query(ShowArchive.artist_id, func.count())
+        .filter(ShowArchive.venue_id == venue_id)
+        .group_by(ShowArchive.artist_id)
+    )
+    for artist_id, past in archived.all():
+        _adjust(Artist, artist_id, past_shows_count=-past)
+    db.session.execute(delete(ShowArchive).where(ShowArchive.venue_id == venue_id), execution_options={'synchronize_session': False})
+
+
+def roll_shows(current_time):
+    """Move shows that have started from the upcoming to the past counters."""
+    due = Show.query.filter(Show.counted_past.is_(False), Show.start_time <= current_time)
+    rolled = due.count()
+    if not rolled:
+        return 0
+    for model, key_column, archived_column in COUNTED:
+        for id, count in due.with_entities(key_column, func.count(Show.id)).group_by(key_column).all():
+            _adjust(model, id, upcoming_shows_count=-count, past_shows_count=count)
+    due.update({Show.counted_past: True}, synchronize_session=False)
+    db.session.commit()
+    return rolled
+
+
+def counter_drift(model, key_column, archived_column):
+    live = (
+        select(
+            key_column.label('id'),
+            func.count(case((Show.counted_past.is_(False), 1))).label('upcoming'),
+            func.count(case((Show.counted_past.is_(True), 1))).label('past'),
+        )
+        .group_by(key_column)
+    )
+    # Archived shows all count as past.
+    archived = select(archived_column.label('id'), literal(0).label('upcoming'), func.count().label('past')).group_by(archived_column)
+    counts = union_all(live, archived).subquery()
+    truth = (
+        select(counts.c.id, func.sum(counts.c.upcoming).label('upcoming'), func.sum(counts.c.past).label('past'))
+        .group_by(counts.c.id)
+        .subquery()
+    )
+    upcoming = func.coalesce(truth.c.upcoming, 0)
+    past = func.coalesce(truth.c.past, 0)
+    return (
+        db.session.query(model.id, model.upcoming_shows_count, upcoming, model.past_shows_count, past)
+        .outerjoin(truth, truth.c.id == model.id)
+        .filter((model.upcoming_shows_count != upcoming) | (model.past_shows_count != past))
+        .order_by(model.id)
+        .all()
+    )
+
+
+def set_counters(model, id, upcoming, past):
+    db.session.execute(
+        update(model).where(model.id == id).values(upcoming_shows_count=upcoming, past_shows_count=past),
+        execution_options={'synchronize_session': False},
+    )
+
+
+def recount():
+    """Rewrite drifted counters from Show and Show_archive, e.g. after rows were inserted around the app."""
+    fixed = 0
+    for model, key_column, archived_column in COUNTED:
+        for id, upcoming, true_upcoming, past, true_past in counter_drift(model, key_column, archived_column):
+            set_counters(model, id, true_upcoming, true_past)
+            fixed += 1
+    db.session.commit()
+    return fixed
+
+
+@cli.command('roll')
+@click.option('--every', type=int, default=None, help='Keep running, rolling every N seconds.')
+def roll_command(every):
+    """Roll shows whose start time has passed into the past counters."""
+    while True:
+        rolled = roll_shows(datetime.datetime.now())
+        click.echo(f'Rolled {rolled} show(s) from upcoming to past.')
+        if not every:
+            break
+        time.sleep(every)
+
+
+@cli.command('check')
+@click.option('--fix', is_flag=True, help='Rewrite drifted counters with the recomputed values.')
+def check_command(fix):
+    """Recompute the counters from Show and Show_archive and report any drift."""
+    drifted = 0
+    for model, key_column, archived_column in COUNTED:
+        for id, upcoming, true_upcoming, past, true_past in counter_drift(model, key_column, archived_column):
+            drifted += 1
+            click.echo(f'{model.__name__} {id}: upcoming {upcoming} != {true_upcoming}, past {past} != {true_past}')
+            if fix:
+                set_counters(model, id, true_upcoming, true_past)
+    pending = Show.query.filter(Show.counted_past.is_(False), Show.start_time <= datetime.datetime.now()).count()
+
+    if fix:
+        db.session.commit()
+    click.echo(f'{drifted} drifted counter row(s){" fixed" if fix and drifted else ""}; {pending} show(s) waiting to be rolled.')
+    if drifted and not fix:
+        raise SystemExit(1)
@@ -0,0 +1,125 @@
+import csv
+import datetime
+import hmac
+import io
+import sys
+import zlib
+import click
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+from flask.cli import AppGroup
+from models import db, Venue, Artist, Show
+
+cli = AppGroup('export', help='Export the catalog as gzipped CSV for analytics.')
+exports = Blueprint('exports', __name__, url_prefix='/export')
+
+EXPORTED = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+}
+
+
+def export_query(model, since=None):
+    """Rows of ``model``, or only those changed after ``since`` (naive UTC).
+
+    ``updated_at`` is stamped when a row is flushed, before its transaction
+    commits, so incremental runs should overlap the previous one a little;
+    consumers de-duplicate on ``id``. Deleted rows are not reported.
+    """
+    table = model.__table__
+    query = db.session.query(*table.columns)
+    if since is None:
+        return query.order_by(table.c.id)
+    return query.filter(table.c.updated_at > since).order_by(table.c.updated_at, table.c.id)
+
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def csv_chunks(model, since=None, batch_size=10000):
+    """Yield ``model`` as CSV text, one chunk per batch read from a server-side cursor."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in model.__table__.columns])
+    for count, row in enumerate(export_query(model, since).yield_per(batch_size), 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_command(kind):
+    @cli.command(kind)
+    @click.option('--output', '-o', help=f'File to write; defaults to {kind}.csv.gz. Use - for stdout.')
+    @click.option('--since', type=click.DateTime(['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S']),
+                  help='Only rows changed after this UTC time.')
+    @click.option('--batch-size', type=int, default=10000, show_default=True, help='Rows fetched per round trip.')
+    @click.option('--no-gzip', is_flag=True, help='Write plain CSV.')
+    def command(output, since, batch_size, no_gzip):
+        output = output or (f'{kind}.csv' if no_gzip else f'{kind}.csv.gz')
+        chunks = csv_chunks(EXPORTED[kind], since, batch_size)
+        chunks = (chunk.encode() for chunk in chunks) if no_gzip else gzipped(chunks)
+        f = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+        finally:
+            if f is not sys.stdout.buffer:
+                f.close()
+        if output != '-':
+            click.echo(f'Exported {kind} to {output}.', err=True)
+
+    command.__doc__ = f'Write {kind} as CSV, gzipped unless --no-gzip.'
+    return command
+
+
+for kind in EXPORTED:
+    export_command(kind)
+
+
+def authorized():
+    token = current_app.config.get('EXPORT_TOKEN')
+    if not token:
+        abort(404)
+    scheme, _, given = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(given.encode(), token.encode())
+
+
+@exports.route('/<kind>.csv.gz')
+def export(kind):
+    model = EXPORTED.get(kind)
+    if model is None:
+        abort(404)
+    if not authorized():
+        return Response('Export token required.\n', 401, {'WWW-Authenticate': 'Bearer'}, mimetype='text/plain')
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.datetime.fromisoformat(since)
+        except ValueError:
+            abort(400)
+        if since.tzinfo is not None:
+            since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    chunks = gzipped(csv_chunks(model, since or None, current_app.config['EXPORT_BATCH_SIZE']))
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return Response(stream_with_context(chunks), mimetype='application/gzip', headers={
+        'Content-Disposition': f'attachment; filename="{kind}-{stamp}.csv.gz"',
+        'Cache-Control': 'no-store',
+    })
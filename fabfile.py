@@ -1,15 +1,27 @@
+import os
 from fabric.api import local, settings, abort
 from fabric.contrib.console import confirm
 
+# Route benchmarks of this machine; the first `fab test` records it. Delete
+# it to re-record, e.g. after moving to other hardware.
+BENCH_BASELINE = "bench_baseline.json"
+
 # prepare for deployment
 
 
 def test():
+    with settings(warn_only=True):
+        result = local("python -m pytest -q", capture=True)
+    if result.failed and not confirm("Tests failed. Continue?"):
+        abort("Aborted at user request.")
+    if not os.path.exists(BENCH_BASELINE):
+        local("python bench.py routes --save-baseline {}".format(BENCH_BASELINE))
+        return
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python bench.py routes --baseline {}".format(BENCH_BASELINE), capture=True
         )
-    if result.failed and not confirm("Tests failed. Continue?"):
+    if result.failed and not confirm("Benchmarks regressed. Continue?"):
         abort("Aborted at user request.")
 
 
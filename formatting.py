@@ -0,0 +1,71 @@
+import datetime
+from functools import lru_cache
+import dateutil.parser
+from babel import Locale
+from babel.dates import UTC, parse_pattern
+
+NAMED_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+class DateTimeFormatter:
+    """Babel datetime formatting with compiled patterns and memoized output.
+
+    Patterns and locales are parsed once; formatted strings are kept in a
+    bounded LRU keyed by (timestamp, format, locale), and strings given
+    instead of datetimes are parsed once per distinct value.
+    """
+
+    def __init__(self, locale='en', maxsize=65536):
+        self.default_locale = locale
+        self.patterns = {}
+        self.locales = {}
+        self._format = lru_cache(maxsize=maxsize)(self._format_uncached)
+        self._parse = lru_cache(maxsize=maxsize)(self._parse_uncached)
+
+    def pattern(self, format):
+        pattern = self.patterns.get(format)
+        if pattern is None:
+            pattern = self.patterns[format] = parse_pattern(NAMED_FORMATS.get(format, format))
+        return pattern
+
+    def locale(self, identifier):
+        locale = self.locales.get(identifier)
+        if locale is None:
+            locale = self.locales[identifier] = Locale.parse(identifier)
+        return locale
+
+    def _parse_uncached(self, value):
+        try:
+            return dateutil.parser.parse(value)
+        except (ValueError, TypeError, OverflowError):
+            return None
+
+    def _format_uncached(self, value, format, locale):
+        try:
+            aware = value if value.tzinfo is not None else value.replace(tzinfo=UTC)
+            return self.pattern(format).apply(aware, self.locale(locale))
+        except Exception:
+            return str(value)
+
+    def format(self, value, format='medium', locale=None):
+        if isinstance(value, str):
+            value = self._parse(value)
+        if not isinstance(value, datetime.datetime):
+            return ''
+        return self._format(value, format, locale or self.default_locale)
+
+    def format_many(self, values, format='medium', locale=None):
+        locale = locale or self.default_locale
+        format_one, parse = self._format, self._parse
+        formatted = []
+        for value in values:
+            if isinstance(value, str):
+                value = parse(value)
+            formatted.append(format_one(value, format, locale) if isinstance(value, datetime.datetime) else '')
+        return formatted
+
+    def cache_info(self):
+        return {"formatted": self._format.cache_info()._asdict(), "parsed": self._parse.cache_info()._asdict()}
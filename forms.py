@@ -1,7 +1,10 @@
 from datetime import datetime
 from flask_wtf import FlaskForm as Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, TextAreaField
-from wtforms.validators import DataRequired, AnyOf, URL, Regexp, Optional, Length
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, TextAreaField, IntegerField
+from wtforms.validators import DataRequired, AnyOf, URL, Regexp, Optional, Length, NumberRange
+
+# Longest show; bookings.py relies on it to bound its overlap queries.
+MAX_DURATION_MINUTES = 24 * 60
 
 genre_choices = [
         ('Alternative', 'Alternative'),
@@ -96,6 +99,11 @@ class ShowForm(Form):
         validators=[DataRequired(message='Start time is required')],
         default= datetime.today()
     )
+    duration = IntegerField(
+        'duration',
+        validators=[NumberRange(min=1, max=MAX_DURATION_MINUTES, message='Duration must be between 1 minute and 24 hours')],
+        default=120
+    )
 
 class VenueForm(Form):
     name = StringField(
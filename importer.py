@@ -0,0 +1,417 @@
+import contextlib
+import csv
+import datetime
+import io
+import json
+import os
+import time
+from collections import Counter, defaultdict
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, insert, update
+from werkzeug.datastructures import MultiDict
+from areas import refresh_areas, venue_areas_of
+from autocomplete import get_autocomplete
+from bookings import IntervalIndex, booked_rows, booking_lock
+from cache import invalidate
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show
+from search import get_search_backend
+
+cli = AppGroup('import', help='Bulk-load venues, artists and shows from CSV or NDJSON files.')
+
+FALSE_VALUES = {'', '0', 'false', 'no', 'n', 'off'}
+
+
+def read_records(path):
+    """Yield one dict per record, or ``None`` for an NDJSON line that does not parse."""
+    if path.endswith(('.ndjson', '.jsonl')):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield record if isinstance(record, dict) else None
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+
+
+class Loader:
+    """Validates records with a form and turns them into insertable rows."""
+
+    model = None
+    form_class = None
+    booleans = ()
+
+    def __init__(self):
+        self.form = None
+
+    def prepare(self):
+        pass
+
+    def formdata(self, record):
+        data = MultiDict()
+        for key, value in record.items():
+            if value is None:
+                continue
+            if key in self.booleans:
+                if str(value).strip().lower() not in FALSE_VALUES:
+                    data[key] = 'y'
+            elif key == 'genres':
+                genres = value if isinstance(value, list) else str(value).split(',')
+                data.setlist(key, [genre.strip() for genre in genres if genre.strip()])
+            else:
+                data[key] = str(value)
+        return data
+
+    def validate(self, record):
+        # Binding a form's fields costs more than validating them, so one form
+        # is reused and re-processed for every record.
+        if self.form is None:
+            self.form = self.form_class(meta={'csrf': False})
+        form = self.form
+        form.process(self.formdata(record))
+        if not form.validate():
+            return None, form.errors
+        row = self.row(form)
+        return row, self.check(row)
+
+    def check(self, row):
+        return None
+
+    def batch_lock(self, rows):
+        """Held from ``check_batch`` to the batch's commit."""
+        return contextlib.nullcontext()
+
+    def check_batch(self, rows):
+        """Checks that need the database, a query per batch: errors by position in ``rows``."""
+        return {}
+
+    def after_batch(self, rows):
+        """Runs in the batch's transaction; returns the cache entries it affects."""
+        return {}
+
+    def finish(self):
+        pass
+
+
+class EntityLoader(Loader):
+    def prepare(self):
+        self.names = {name for (name,) in db.session.query(self.model.name)}
+
+    def check(self, row):
+        if row['name'] in self.names:
+            return {'name': [f'A {self.model.__name__.lower()} with this name already exists.']}
+        self.names.add(row['name'])
+        return None
+
+    def finish(self):
+        backend = get_search_backend()
+        if hasattr(backend, 'reset'):
+            backend.reset()
+        get_autocomplete().reset()
+
+
+class VenueLoader(EntityLoader):
+    model = Venue
+    form_class = VenueForm
+    booleans = ('seeking_talent',)
+
+    def row(self, form):
+        return {
+            "name": form.name.data.strip(),
+            "city": form.city.data.strip(),
+            "state": form.state.data,
+            "address": form.address.data.strip(),
+            "phone": form.phone.data,
+            "genres": ','.join(form.genres.data),
+            "image_link": form.image_link.data,
+            "facebook_link": form.facebook_link.data,
+            "website_link": form.website_link.data,
+            "seeking_talent": form.seeking_talent.data,
+            "seeking_description": form.seeking_description.data,
+        }
+
+    def after_batch(self, rows):
+        refresh_areas({(row['state'], row['city']) for row in rows})
+        return {}
+
+
+class ArtistLoader(EntityLoader):
+    model = Artist
+    form_class = ArtistForm
+    booleans = ('seeking_venue',)
+
+    def row(self, form):
+        return {
+            "name": form.name.data.strip(),
+            "city": form.city.data.strip(),
+            "state": form.state.data,
+            "phone": form.phone.data,
+            "genres": ','.join(form.genres.data),
+            "image_link": form.image_link.data,
+            "facebook_link": form.facebook_link.data,
+            "website_link": form.website_link.data,
+            "seeking_venue": form.seeking_venue.data,
+            "seeking_description": form.seeking_description.data,
+        }
+
+
+class ShowLoader(Loader):
+    model = Show
+    form_class = ShowForm
+
+    def prepare(self):
+        self.venue_ids = {id for (id,) in db.session.query(Venue.id)}
+        self.artist_ids = {id for (id,) in db.session.query(Artist.id)}
+        self.current_time = datetime.datetime.now()
+
+    def formdata(self, record):
+        data = super().formdata(record)
+        # Accept ISO 8601 (as the JSON API writes it) besides the form's format.
+        try:
+            start_time = datetime.datetime.fromisoformat(data.get('start_time', ''))
+            data['start_time'] = start_time.strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+        return data
+
+    def row(self, form):
+        try:
+            venue_id, artist_id = int(form.venue_id.data), int(form.artist_id.data)
+        except ValueError:
+            venue_id = artist_id = None
+        return {
+            "venue_id": venue_id,
+            "artist_id": artist_id,
+            "start_time": form.start_time.data,
+            "end_time": form.start_time.data + datetime.timedelta(minutes=form.duration.data),
+            "counted_past": form.start_time.data <= self.current_time,
+        }
+
+    def check(self, row):
+        errors = {}
+        if row['venue_id'] not in self.venue_ids:
+            errors['venue_id'] = ['No venue with this ID.']
+        if row['artist_id'] not in self.artist_ids:
+            errors['artist_id'] = ['No artist with this ID.']
+        return errors or None
+
+    def batch_lock(self, rows):
+        return booking_lock({row['venue_id'] for row in rows}, {row['artist_id'] for row in rows})
+
+    def check_batch(self, rows):
+        """Reject shows overlapping a committed one or an earlier one of the batch."""
+        booked = booked_rows(rows)
+        batch = defaultdict(IntervalIndex)
+        errors = {}
+        for i, row in enumerate(rows):
+            keys = (('venue', row['venue_id']), ('artist', row['artist_id']))
+            if i in booked:
+                errors[i] = {'start_time': ['Overlaps another show at this venue or by this artist.']}
+            elif any(batch[key].overlapping(row['start_time'], row['end_time']) for key in keys):
+                errors[i] = {'start_time': ['Overlaps an earlier show in this file at this venue or by this artist.']}
+            else:
+                for key in keys:
+                    batch[key].add(i, row['start_time'], row['end_time'])
+        return errors
+
+    def after_batch(self, rows):
+        """Add the batch to its venues' and artists' show counters, as count_new_show does, and to their areas."""
+        for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+            deltas = defaultdict(lambda: [0, 0])
+            for row in rows:
+                deltas[row[key]][row['counted_past']] += 1
+            db.session.execute(
+                update(model.__table__)
+                .where(model.__table__.c.id == bindparam('_id'))
+                .values(
+                    upcoming_shows_count=model.__table__.c.upcoming_shows_count + bindparam('_upcoming'),
+                    past_shows_count=model.__table__.c.past_shows_count + bindparam('_past'),
+                ),
+                [{"_id": id, "_upcoming": upcoming, "_past": past} for id, (upcoming, past) in deltas.items()],
+            )
+        refresh_areas(venue_areas_of({row['venue_id'] for row in rows}))
+        return {
+            'venue': sorted({row['venue_id'] for row in rows}),
+            'artist': sorted({row['artist_id'] for row in rows}),
+        }
+
+
+LOADERS = {
+    'venues': VenueLoader,
+    'artists': ArtistLoader,
+    'shows': ShowLoader,
+}
+
+
+def copy_rows(model, rows):
+    """Insert ``rows`` with PostgreSQL COPY on the session's connection."""
+    table = model.__table__
+    preparer = db.engine.dialect.identifier_preparer
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+    buffer.seek(0)
+    sql = (
+        f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(column) for column in columns)}) "
+        "FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    )
+    with db.session.connection().connection.driver_connection.cursor() as cursor:
+        cursor.copy_expert(sql, buffer)
+
+
+def bulk_insert(model, rows):
+    """Insert ``rows`` in the session's transaction: COPY on PostgreSQL, executemany elsewhere."""
+    if db.engine.dialect.name == 'postgresql':
+        copy_rows(model, rows)
+    else:
+        db.session.execute(insert(model.__table__), rows)
+
+
+def insert_batch(loader, rows):
+    """Insert the rows that pass ``loader.check_batch`` and return the others' errors by position."""
+    with loader.batch_lock(rows):
+        errors = loader.check_batch(rows)
+        rows = [row for i, row in enumerate(rows) if i not in errors]
+        dependents = {}
+        if rows:
+            bulk_insert(loader.model, rows)
+            dependents = loader.after_batch(rows)
+        db.session.commit()
+    invalidate(dependents)
+    return errors
+
+
+def read_checkpoint(path, source):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('source') != os.path.abspath(source) or state.get('size') != os.path.getsize(source):
+        raise click.ClickException(f'{path} belongs to a different input file; pass --restart to ignore it.')
+    return state
+
+
+def write_checkpoint(path, state):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def run_import(kind, path, batch_size, checkpoint_path, rejects_path, restart):
+    """Load ``path`` in committed batches, checkpointing after each one.
+
+    The checkpoint records how many input records are settled (inserted or
+    rejected) and how long the rejects file was at that point, so a resumed
+    run skips exactly what was committed and rewrites any rejects past it.
+    """
+    loader = LOADERS[kind]()
+    state = None if restart else read_checkpoint(checkpoint_path, path)
+    state = state or {
+        "source": os.path.abspath(path),
+        "size": os.path.getsize(path),
+        "records": 0,
+        "inserted": 0,
+        "rejected": 0,
+        "rejects_offset": 0,
+        "complete": False,
+    }
+    if state['complete']:
+        click.echo(f'{path} was already imported ({state["inserted"]} inserted); pass --restart to load it again.')
+        return state
+
+    loader.prepare()
+    reasons = Counter()
+    batch = []
+    started = time.perf_counter()
+    resumed_from = state['records']
+
+    with open(rejects_path, 'a+', newline='', encoding='utf-8') as rejects_file:
+        rejects_file.truncate(state['rejects_offset'])
+        rejects_file.seek(state['rejects_offset'])
+        rejects = csv.writer(rejects_file)
+        if not state['rejects_offset']:
+            rejects.writerow(['record', 'errors', 'data'])
+
+        # The batch's records and the rejects since the last settle, which are
+        # written in record order once the batch's own checks have run.
+        numbered = []
+        rejected = []
+
+        def settle(records):
+            if batch:
+                errors = insert_batch(loader, batch)
+                state['inserted'] += len(batch) - len(errors)
+                rejected.extend((*numbered[i], row_errors) for i, row_errors in errors.items())
+                batch.clear()
+                numbered.clear()
+            for number, record, errors in sorted(rejected, key=lambda reject: reject[0]):
+                state['rejected'] += 1
+                reasons.update(f'{field}: {message}' for field, messages in errors.items() for message in messages)
+                rejects.writerow([number, json.dumps(errors), json.dumps(record)])
+            rejected.clear()
+            rejects_file.flush()
+            state['records'] = records
+            state['rejects_offset'] = rejects_file.tell()
+            write_checkpoint(checkpoint_path, state)
+
+        with current_app.test_request_context():
+            number = resumed_from
+            for number, record in enumerate(read_records(path), 1):
+                if number <= resumed_from:
+                    continue
+                if record is None:
+                    row, errors = None, {'record': ['Not a JSON object.']}
+                else:
+                    row, errors = loader.validate(record)
+                if errors:
+                    rejected.append((number, record, errors))
+                    continue
+                batch.append(row)
+                numbered.append((number, record))
+                if len(batch) >= batch_size:
+                    settle(number)
+                    click.echo(f'{number} records read, {state["inserted"]} inserted, {state["rejected"]} rejected')
+            state['complete'] = True
+            settle(number)
+
+    loader.finish()
+    elapsed = time.perf_counter() - started
+    processed = state['records'] - resumed_from
+    click.echo(
+        f'Imported {kind} from {path}: {state["inserted"]} inserted, {state["rejected"]} rejected '
+        f'({processed} records in {elapsed:.1f}s, {processed / elapsed if elapsed else 0:.0f}/s).'
+    )
+    if state['rejected']:
+        click.echo(f'Rejected rows are in {rejects_path}. Most common reasons this run:')
+        for reason, count in reasons.most_common(10):
+            click.echo(f'  {count:>8}  {reason}')
+    return state
+
+
+def import_command(kind):
+    @cli.command(kind)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', type=int, default=10000, show_default=True, help='Rows per COPY/executemany and commit.')
+    @click.option('--checkpoint', 'checkpoint_path', help='Progress file; defaults to PATH.checkpoint.')
+    @click.option('--rejects', 'rejects_path', help='CSV of rejected records; defaults to PATH.rejects.csv.')
+    @click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the first record.')
+    def command(path, batch_size, checkpoint_path, rejects_path, restart):
+        run_import(kind, path, batch_size, checkpoint_path or f'{path}.checkpoint', rejects_path or f'{path}.rejects.csv', restart)
+
+    command.__doc__ = f'Load {kind} from a CSV or NDJSON file, validated like the {kind[:-1]} form.'
+    return command
+
+
+for kind in LOADERS:
+    import_command(kind)
@@ -0,0 +1,111 @@
+import contextlib
+import contextvars
+import time
+from collections import Counter
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+_collectors = contextvars.ContextVar('sql_collectors', default=())
+
+
+class QueryStats:
+    """Statements executed while this collector was active."""
+
+    def __init__(self, keep_statements=False):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+        self.statements = [] if keep_statements else None
+
+    def record(self, statement, parameters, duration):
+        self.count += 1
+        self.total_time += duration
+        # Statements reach the cursor with placeholders, so the text is the shape.
+        self.shapes[statement] += 1
+        if self.statements is not None:
+            self.statements.append((statement, parameters, duration))
+
+    def repeated(self, threshold):
+        return [(statement, count) for statement, count in self.shapes.most_common() if count >= threshold]
+
+
+@contextlib.contextmanager
+def collect_queries(keep_statements=False):
+    stats = QueryStats(keep_statements)
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+@contextlib.contextmanager
+def assert_max_queries(limit):
+    """Fail if the block runs more than ``limit`` SQL statements.
+
+    Works in tests around a test-client request or a direct call::
+
+        with assert_max_queries(6):
+            client.get('/venues/1')
+    """
+    with collect_queries(keep_statements=True) as stats:
+        yield stats
+    if stats.count > limit:
+        listing = '\n'.join(f'  {statement} {parameters!r}' for statement, parameters, duration in stats.statements)
+        raise AssertionError(f'{stats.count} SQL statements executed, expected at most {limit}:\n{listing}')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_started
+    for stats in _collectors.get():
+        stats.record(statement, parameters, duration)
+    if not has_app_context():
+        return
+    slow_ms = current_app.config['SQL_SLOW_QUERY_MS']
+    if slow_ms is not None and duration * 1000 >= slow_ms:
+        route = request.endpoint if has_request_context() else 'no request'
+        current_app.logger.warning('Slow query (%.1f ms) in %s: %s %r', duration * 1000, route, statement, parameters)
+
+
+def _start_request():
+    g.sql_stats = QueryStats()
+    _collectors.set(_collectors.get() + (g.sql_stats,))
+
+
+def _finish_request(response):
+    stats = g.get('sql_stats')
+    if stats is None:
+        return response
+    repeated = stats.repeated(current_app.config['SQL_REPEATED_QUERY_THRESHOLD'])
+    for statement, count in repeated:
+        current_app.logger.warning('Possible N+1 in %s: %d executions of %s', request.endpoint, count, statement)
+    if current_app.config['SQL_DEBUG_HEADERS']:
+        response.headers['X-SQL-Queries'] = str(stats.count)
+        response.headers['X-SQL-Repeated'] = str(len(repeated))
+        response.headers['Server-Timing'] = f'db;dur={stats.total_time * 1000:.2f};desc="{stats.count} queries"'
+    return response
+
+
+def _stop_collecting(exc):
+    stats = g.pop('sql_stats', None)
+    if stats is not None:
+        _collectors.set(tuple(collector for collector in _collectors.get() if collector is not stats))
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+
+def init_instrumentation(app):
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_stop_collecting)
@@ -0,0 +1,240 @@
+import atexit
+import glob
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from flask import Response, before_render_template, current_app, g, request, template_rendered
+from werkzeug.wsgi import ClosingIterator
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+METRICS = {
+    'fyyur_http_request_duration_seconds': ('histogram', 'Time from receiving a request to sending the last byte of its response.'),
+    'fyyur_http_requests_total': ('counter', 'Responses by endpoint, method and status code.'),
+    'fyyur_http_requests_in_progress': ('gauge', 'Requests currently being handled.'),
+    'fyyur_db_time_seconds': ('histogram', 'Time spent executing SQL per request.'),
+    'fyyur_db_queries_total': ('counter', 'SQL statements executed by requests.'),
+    'fyyur_template_render_seconds': ('histogram', 'Time spent rendering each template.'),
+}
+
+
+class MetricsStore:
+    """Counters, gauges and histograms of one process.
+
+    With a ``directory`` every process snapshots its values to
+    ``metrics-<pid>.pkl`` there at most every ``flush_interval`` seconds,
+    and ``collect`` merges the snapshots: counters and histograms of exited
+    workers still count, gauges only for live ones. Clear the directory
+    before starting the server, as pids are reused across restarts.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+        # Workers forked from a preloaded app start from zero.
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self.values = defaultdict(float)
+        self.histograms = {}
+        self.flushed_at = 0.0
+
+    def inc(self, name, labels, amount=1):
+        with self.lock:
+            self.values[name, labels] += amount
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[name, labels] = [0] * len(BUCKETS) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-1] += value
+
+    def request_started(self):
+        self.inc('fyyur_http_requests_in_progress', ())
+        return time.perf_counter()
+
+    def request_finished(self, environ, started, status):
+        """Record a request labelled by the ``fyyur.*`` keys Flask left in its environ."""
+        endpoint = environ.get('fyyur.endpoint') or 'unmatched'
+        labels = (('endpoint', endpoint), ('method', environ['REQUEST_METHOD']))
+        self.observe('fyyur_http_request_duration_seconds', labels, time.perf_counter() - started)
+        self.inc('fyyur_http_requests_total', (*labels, ('status', status)))
+        sql_stats = environ.get('fyyur.sql_stats')
+        if sql_stats is not None:
+            self.observe('fyyur_db_time_seconds', labels, sql_stats.total_time)
+            self.inc('fyyur_db_queries_total', labels, sql_stats.count)
+        self.inc('fyyur_http_requests_in_progress', (), -1)
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values), {key: list(histogram) for key, histogram in self.histograms.items()}
+
+    def path(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.pkl')
+
+    def flush(self):
+        if not self.directory:
+            return
+        self.flushed_at = time.monotonic()
+        fd, tmp = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(self.snapshot(), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path(os.getpid()))
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def snapshots(self):
+        """(pid, alive, values, histograms) for this process and every other that flushed."""
+        pid = os.getpid()
+        yield (pid, True, *self.snapshot())
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.pkl')):
+            other = int(os.path.basename(path)[len('metrics-'):-len('.pkl')])
+            if other == pid:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    values, histograms = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                continue
+            yield other, _alive(other), values, histograms
+
+    def collect(self):
+        values = defaultdict(float)
+        histograms = {}
+        for pid, alive, process_values, process_histograms in self.snapshots():
+            for (name, labels), value in process_values.items():
+                if alive or METRICS[name][0] != 'gauge':
+                    values[name, labels] += value
+            for key, histogram in process_histograms.items():
+                total = histograms.setdefault(key, [0] * len(BUCKETS) + [0.0])
+                for i, count in enumerate(histogram):
+                    total[i] += count
+        return values, histograms
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _series(name, labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return name
+    return name + '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(values, histograms):
+    """The Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, (kind, help) in METRICS.items():
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram):
+                    cumulative += count
+                    lines.append(f"{_series(name + '_bucket', labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{_series(name + '_sum', labels)} {_number(histogram[-1])}")
+                lines.append(f"{_series(name + '_count', labels)} {cumulative}")
+        else:
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{_series(name, labels)} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Times each request until its response body is fully sent.
+
+    Flask hooks leave the endpoint and the request's SQL stats in the
+    WSGI environ, so streamed responses are measured to the last chunk.
+    """
+
+    def __init__(self, wsgi_app, store):
+        self.wsgi_app = wsgi_app
+        self.store = store
+
+    def __call__(self, environ, start_response):
+        status = []
+
+        def capture_status(status_line, headers, exc_info=None):
+            status[:] = [status_line.split(' ', 1)[0]]
+            return start_response(status_line, headers, exc_info)
+
+        store = self.store
+        started = store.request_started()
+        try:
+            body = self.wsgi_app(environ, capture_status)
+        except Exception:
+            store.request_finished(environ, started, '500')
+            raise
+        return ClosingIterator(body, lambda: store.request_finished(environ, started, status[0] if status else '500'))
+
+
+def _label_request():
+    request.environ['fyyur.endpoint'] = request.endpoint
+    request.environ['fyyur.sql_stats'] = g.get('sql_stats')
+
+
+def _start_template(app, template, context, **extra):
+    g.setdefault('template_started', []).append(time.perf_counter())
+
+
+def _finish_template(app, template, context, **extra):
+    started = g.template_started.pop()
+    app.extensions['metrics'].observe(
+        'fyyur_template_render_seconds', (('template', template.name or 'string'),), time.perf_counter() - started)
+
+
+def metrics_view():
+    values, histograms = current_app.extensions['metrics'].collect()
+    return Response(render(values, histograms), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_metrics(app):
+    """Wrap ``app.wsgi_app`` and add ``/metrics``; call after ``init_instrumentation``."""
+    store = app.extensions['metrics'] = MetricsStore(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_SECONDS'])
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, store)
+    app.before_request(_label_request)
+    before_render_template.connect(_start_template, app)
+    template_rendered.connect(_finish_template, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
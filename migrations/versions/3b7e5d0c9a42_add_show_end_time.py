@@ -0,0 +1,44 @@
+"""add show end_time and booking exclusion constraints
+
+Revision ID: 3b7e5d0c9a42
+Revises: f2c6a9d4b815
+Create Date: 2026-10-17 23:05:13.402215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e5d0c9a42'
+down_revision = 'f2c6a9d4b815'
+branch_labels = None
+depends_on = None
+
+CONSTRAINTS = {
+    'ex_Show_venue_booking': 'venue_id',
+    'ex_Show_artist_booking': 'artist_id',
+}
+
+
+def upgrade():
+    # Existing shows keep a null end_time, which the constraints ignore.
+    op.add_column('Show', sa.Column('end_time', sa.DateTime(), nullable=True))
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # GiST support for the integer equality half of the constraints.
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    for name, column in CONSTRAINTS.items():
+        op.execute(
+            f'ALTER TABLE "Show" ADD CONSTRAINT "{name}" EXCLUDE USING gist '
+            f'({column} WITH =, tsrange(start_time, end_time) WITH &&) WHERE (end_time IS NOT NULL)'
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        for name in CONSTRAINTS:
+            op.drop_constraint(name, 'Show')
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_column('end_time')
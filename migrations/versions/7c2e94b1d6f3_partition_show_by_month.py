@@ -0,0 +1,143 @@
+"""partition Show by month and add Show_archive
+
+Revision ID: 7c2e94b1d6f3
+Revises: 3b7e5d0c9a42
+Create Date: 2026-10-17 23:41:52.118094
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e94b1d6f3'
+down_revision = '3b7e5d0c9a42'
+branch_labels = None
+depends_on = None
+
+# Keep in step with partitions.py.
+MONTHS_AHEAD = 12
+COLUMNS = 'id, start_time, end_time, artist_id, venue_id, counted_past, updated_at'
+INDEXES = {
+    'ix_Show_venue_id_start_time': '(venue_id, start_time)',
+    'ix_Show_artist_id_start_time': '(artist_id, start_time)',
+    'ix_Show_pending_roll': '(start_time) WHERE NOT counted_past',
+    'ix_Show_updated_at_id': '(updated_at, id)',
+}
+BOOKINGS = {'venue_booking': 'venue_id', 'artist_booking': 'artist_id'}
+
+
+def show_table(name, primary_key, suffix=''):
+    return f'''
+        CREATE TABLE "{name}" (
+            id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+            start_time timestamp without time zone NOT NULL,
+            end_time timestamp without time zone,
+            artist_id integer NOT NULL REFERENCES "Artist" (id),
+            venue_id integer NOT NULL REFERENCES "Venue" (id),
+            counted_past boolean NOT NULL DEFAULT false,
+            updated_at timestamp without time zone NOT NULL DEFAULT now(),
+            CONSTRAINT "Show_pkey" PRIMARY KEY ({primary_key})
+        ){suffix}
+    '''
+
+
+def booking_exclusion(column):
+    return f'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&) WHERE (end_time IS NOT NULL)'
+
+
+def upgrade():
+    op.create_table('Show_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=True),
+        sa.Column('artist_id', sa.Integer(), nullable=False),
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_Show_archive_venue_id_start_time', 'Show_archive', ['venue_id', 'start_time'], unique=False)
+    op.create_index('ix_Show_archive_artist_id_start_time', 'Show_archive', ['artist_id', 'start_time'], unique=False)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # Rebuild Show as a table partitioned by month of start_time. Keys of a
+    # partitioned table must include start_time, and the booking exclusion
+    # constraints move to the partitions. Writes to Show block meanwhile.
+    op.execute('LOCK TABLE "Show" IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"')
+    op.execute('ALTER TABLE "Show_unpartitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_unpartitioned_pkey"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+    op.execute(show_table('Show', 'id, start_time', ' PARTITION BY RANGE (start_time)'))
+
+    # Monthly partitions from the first show to MONTHS_AHEAD months from now;
+    # anything outside them lands in the default partition.
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+    op.execute(f'''
+        DO $$
+        DECLARE month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', least(min(start_time), localtimestamp)),
+                    date_trunc('month', greatest(max(start_time), localtimestamp + interval '{MONTHS_AHEAD} months')),
+                    interval '1 month')
+                FROM "Show_unpartitioned"
+            LOOP
+                EXECUTE 'CREATE TABLE ' || quote_ident('Show_p' || to_char(month, 'YYYY_MM'))
+                    || ' PARTITION OF "Show" FOR VALUES FROM (' || quote_literal(month)
+                    || ') TO (' || quote_literal(month + interval '1 month') || ')';
+            END LOOP;
+        END $$
+    ''')
+
+    op.execute(f'INSERT INTO "Show" ({COLUMNS}) SELECT {COLUMNS} FROM "Show_unpartitioned"')
+    op.execute('DROP TABLE "Show_unpartitioned"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    for name, definition in INDEXES.items():
+        op.execute(f'CREATE INDEX "{name}" ON "Show" {definition}')
+    for suffix, column in BOOKINGS.items():
+        op.execute(f'''
+            DO $$
+            DECLARE part name;
+            BEGIN
+                FOR part IN
+                    SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                    WHERE i.inhparent = '"Show"'::regclass
+                LOOP
+                    EXECUTE 'ALTER TABLE ' || quote_ident(part) || ' ADD CONSTRAINT '
+                        || quote_ident(part || '_{suffix}') || ' {booking_exclusion(column)}';
+                END LOOP;
+            END $$
+        ''')
+    op.execute('ANALYZE "Show"')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('LOCK TABLE "Show" IN ACCESS EXCLUSIVE MODE')
+        op.execute('ALTER TABLE "Show" RENAME TO "Show_partitioned"')
+        op.execute('ALTER TABLE "Show_partitioned" RENAME CONSTRAINT "Show_pkey" TO "Show_partitioned_pkey"')
+        for name in INDEXES:
+            op.execute(f'DROP INDEX "{name}"')
+        op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+        op.execute(show_table('Show', 'id'))
+        op.execute(f'INSERT INTO "Show" ({COLUMNS}) SELECT {COLUMNS} FROM "Show_partitioned"')
+        op.execute('DROP TABLE "Show_partitioned"')
+        op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+        for name, definition in INDEXES.items():
+            op.execute(f'CREATE INDEX "{name}" ON "Show" {definition}')
+        for suffix, column in BOOKINGS.items():
+            op.execute(f'ALTER TABLE "Show" ADD CONSTRAINT "ex_Show_{suffix}" {booking_exclusion(column)}')
+
+    # Archived shows go back to Show, counted as past.
+    op.execute(
+        'INSERT INTO "Show" (id, start_time, end_time, artist_id, venue_id, counted_past, updated_at) '
+        'SELECT id, start_time, end_time, artist_id, venue_id, true, archived_at FROM "Show_archive"'
+    )
+    op.drop_index('ix_Show_archive_artist_id_start_time', table_name='Show_archive')
+    op.drop_index('ix_Show_archive_venue_id_start_time', table_name='Show_archive')
+    op.drop_table('Show_archive')
@@ -0,0 +1,37 @@
+"""add the VenueArea summary behind /venues
+
+Revision ID: 9d4f1a6e2c58
+Revises: 7c2e94b1d6f3
+Create Date: 2026-10-18 01:12:37.540219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4f1a6e2c58'
+down_revision = '7c2e94b1d6f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled by `flask areas refresh`, or by the first venue write; until
+    # then /venues groups Venue directly.
+    op.create_table('VenueArea',
+        sa.Column('state', sa.String(length=120), nullable=False),
+        sa.Column('city', sa.String(length=120), nullable=False),
+        sa.Column('venues', sa.JSON(), nullable=False),
+        sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('refreshed_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('state', 'city')
+    )
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.create_index('ix_Venue_state_city', ['state', 'city'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.drop_index('ix_Venue_state_city')
+    op.drop_table('VenueArea')
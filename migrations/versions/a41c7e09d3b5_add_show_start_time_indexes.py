@@ -0,0 +1,42 @@
+"""add show start_time indexes
+
+Revision ID: a41c7e09d3b5
+Revises: 2872ad382fe1
+Create Date: 2026-10-17 20:31:07.552910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7e09d3b5'
+down_revision = '2872ad382fe1'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_Show_venue_id_start_time': ['venue_id', 'start_time'],
+    'ix_Show_artist_id_start_time': ['artist_id', 'start_time'],
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY cannot run inside a transaction block.
+        with op.get_context().autocommit_block():
+            for name, columns in INDEXES.items():
+                op.create_index(name, 'Show', columns, unique=False, postgresql_concurrently=True)
+    else:
+        for name, columns in INDEXES.items():
+            op.create_index(name, 'Show', columns, unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name in INDEXES:
+                op.drop_index(name, table_name='Show', postgresql_concurrently=True)
+    else:
+        for name in INDEXES:
+            op.drop_index(name, table_name='Show')
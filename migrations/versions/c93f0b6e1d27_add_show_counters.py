@@ -0,0 +1,58 @@
+"""add show counters
+
+Revision ID: c93f0b6e1d27
+Revises: a41c7e09d3b5
+Create Date: 2026-10-17 20:44:52.109377
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c93f0b6e1d27'
+down_revision = 'a41c7e09d3b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('Artist', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('counted_past', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+    op.create_index('ix_Show_pending_roll', 'Show', ['start_time'], unique=False,
+                    postgresql_where=sa.text('NOT counted_past'), sqlite_where=sa.text('NOT counted_past'))
+
+    # Backfill against the current time; `flask counters roll` takes over from here.
+    op.get_bind().execute(sa.text('UPDATE "Show" SET counted_past = (start_time <= :now)'), {'now': datetime.datetime.now()})
+    for table, key in (('Venue', 'venue_id'), ('Artist', 'artist_id')):
+        op.execute(f'''
+            UPDATE "{table}" SET
+                upcoming_shows_count = (SELECT COUNT(*) FROM "Show" WHERE "Show".{key} = "{table}".id AND NOT "Show".counted_past),
+                past_shows_count = (SELECT COUNT(*) FROM "Show" WHERE "Show".{key} = "{table}".id AND "Show".counted_past)
+        ''')
+
+
+def downgrade():
+    op.drop_index('ix_Show_pending_roll', table_name='Show')
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_column('counted_past')
+
+    with op.batch_alter_table('Artist', schema=None) as batch_op:
+        batch_op.drop_column('past_shows_count')
+        batch_op.drop_column('upcoming_shows_count')
+
+    with op.batch_alter_table('Venue', schema=None) as batch_op:
+        batch_op.drop_column('past_shows_count')
+        batch_op.drop_column('upcoming_shows_count')
@@ -0,0 +1,37 @@
+"""add updated_at
+
+Revision ID: d1e84a5c7f60
+Revises: c93f0b6e1d27
+Create Date: 2026-10-17 21:02:15.840213
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1e84a5c7f60'
+down_revision = 'c93f0b6e1d27'
+branch_labels = None
+depends_on = None
+
+TABLES = ('Venue', 'Artist', 'Show')
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False))
+
+    # Stamps are naive UTC; do not rely on the server's clock or time zone.
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    for table in TABLES:
+        op.get_bind().execute(sa.text(f'UPDATE "{table}" SET updated_at = :now'), {'now': now})
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('updated_at')
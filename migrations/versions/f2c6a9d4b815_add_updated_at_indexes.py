@@ -0,0 +1,43 @@
+"""add updated_at indexes
+
+Revision ID: f2c6a9d4b815
+Revises: d1e84a5c7f60
+Create Date: 2026-10-17 21:40:52.118604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a9d4b815'
+down_revision = 'd1e84a5c7f60'
+branch_labels = None
+depends_on = None
+
+INDEXES = {
+    'ix_Venue_updated_at_id': 'Venue',
+    'ix_Artist_updated_at_id': 'Artist',
+    'ix_Show_updated_at_id': 'Show',
+}
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # CONCURRENTLY cannot run inside a transaction block.
+        with op.get_context().autocommit_block():
+            for name, table in INDEXES.items():
+                op.create_index(name, table, ['updated_at', 'id'], unique=False, postgresql_concurrently=True)
+    else:
+        for name, table in INDEXES.items():
+            op.create_index(name, table, ['updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, table in INDEXES.items():
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+    else:
+        for name, table in INDEXES.items():
+            op.drop_index(name, table_name=table)
@@ -1,7 +1,14 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 import datetime
+from routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
 
-db = SQLAlchemy()
 
 class Venue(db.Model):
     __tablename__ = 'Venue'
@@ -18,9 +25,18 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean, default=False, nullable=False)
     seeking_description = db.Column(db.String(500))
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, server_default=db.func.now(), nullable=False)
 
     shows = db.relationship('Show', backref='venue', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_Venue_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_Venue_state_city', 'state', 'city'),
+    )
+
     def __repr__(self):
         return f'<Venue {self.id} {self.name}>'
 
@@ -38,9 +54,17 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean, default=False, nullable=False)
     seeking_description = db.Column(db.String(500))
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    past_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, server_default=db.func.now(), nullable=False)
 
     shows = db.relationship('Show', backref='artist', lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}).ddl_if(dialect='postgresql'),
+        db.Index('ix_Artist_updated_at_id', 'updated_at', 'id'),
+    )
+
     def __repr__(self):
         return f'<Artist {self.id} {self.name}>'
 
@@ -50,12 +74,73 @@ class Artist(db.Model):
         return f'<Artist {self.id} {self.name}>'
 
 class Show(db.Model):
+    # On PostgreSQL the migrations range-partition this table by month of
+    # start_time (see partitions.py), with primary key (id, start_time) and
+    # the booking constraints on each partition.
     __tablename__ = 'Show'
 
     id = db.Column(db.Integer, primary_key=True)
     start_time = db.Column(db.DateTime, nullable=False)
+    # Null for shows listed before durations were recorded; they never
+    # conflict with other bookings (see bookings.py).
+    end_time = db.Column(db.DateTime)
     artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    # Whether the show is counted in past_shows_count rather than
+    # upcoming_shows_count of its venue and artist.
+    counted_past = db.Column(db.Boolean, default=False, server_default=db.false(), nullable=False)
+    updated_at = db.Column(db.DateTime, default=utcnow, onupdate=utcnow, server_default=db.func.now(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_pending_roll', 'start_time',
+                 postgresql_where=db.text('NOT counted_past'), sqlite_where=db.text('NOT counted_past')),
+        db.Index('ix_Show_updated_at_id', 'updated_at', 'id'),
+        ExcludeConstraint(
+            (venue_id, '='), (db.func.tsrange(start_time, end_time), '&&'),
+            name='ex_Show_venue_booking', using='gist', where=db.text('end_time IS NOT NULL'),
+        ).ddl_if(dialect='postgresql'),
+        ExcludeConstraint(
+            (artist_id, '='), (db.func.tsrange(start_time, end_time), '&&'),
+            name='ex_Show_artist_booking', using='gist', where=db.text('end_time IS NOT NULL'),
+        ).ddl_if(dialect='postgresql'),
+    )
+
+    def __repr__(self):
+        return f'<Show {self.id} Artist: {self.artist_id} Venue: {self.venue_id} Time: {self.start_time}>'
+
+
+class ShowArchive(db.Model):
+    """Shows older than the archive horizon, moved out of Show by ``flask shows archive``."""
+    __tablename__ = 'Show_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    archived_at = db.Column(db.DateTime, default=utcnow, server_default=db.func.now(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_Show_archive_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_archive_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    def __repr__(self):
+        return f'<ShowArchive {self.id} Artist: {self.artist_id} Venue: {self.venue_id} Time: {self.start_time}>'
+
+
+class VenueArea(db.Model):
+    """One row per city for the /venues page, kept current by areas.py."""
+    __tablename__ = 'VenueArea'
+
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    # [{"id", "name", "num_upcoming_shows"}] ordered by name, as /venues lists them.
+    venues = db.Column(db.JSON, nullable=False)
+    upcoming_shows_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    refreshed_at = db.Column(db.DateTime, default=utcnow, server_default=db.func.now(), nullable=False)
 
     def __repr__(self):
-        return f'<Show {self.id} Artist: {self.artist_id} Venue: {self.venue_id} Time: {self.start_time}>'
\ No newline at end of file
+        return f'<VenueArea {self.city}, {self.state}>'
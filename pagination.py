@@ -0,0 +1,94 @@
+import base64
+import binascii
+import datetime
+import json
+from sqlalchemy import DateTime, tuple_
+
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, datetime.datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, columns):
+    if not token:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            return None
+        return [
+            datetime.datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+class Page:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def keyset_paginate(query, keys, after=None, before=None, per_page=20, descending=False):
+    """Return one page of ``query`` ordered by ``keys``.
+
+    ``keys`` is a list of ``(column, attribute)`` pairs that together form a
+    unique sort key, e.g. ``[(Show.start_time, 'start_time'), (Show.id, 'id')]``.
+    ``after``/``before`` are cursors from a previous page's ``next_cursor`` and
+    ``prev_cursor``; the page costs the same index range scan wherever it is.
+    """
+    query, window = keyset_window(query, keys, after, before, per_page, descending)
+    return keyset_page(query.all(), keys, per_page, window)
+
+
+def keyset_window(query, keys, after=None, before=None, per_page=20, descending=False):
+    """The query behind ``keyset_paginate``; pass its rows to ``keyset_page``.
+
+    Lets callers run the query themselves, e.g. on an async connection.
+    """
+    columns = [column for column, attribute in keys]
+    position = tuple_(*columns)
+
+    after_values = decode_cursor(after, columns)
+    before_values = None if after_values else decode_cursor(before, columns)
+    backwards = before_values is not None
+
+    if after_values:
+        query = query.filter(position < tuple_(*after_values) if descending else position > tuple_(*after_values))
+    elif backwards:
+        query = query.filter(position > tuple_(*before_values) if descending else position < tuple_(*before_values))
+
+    reverse_order = descending != backwards
+    query = query.order_by(*(column.desc() if reverse_order else column.asc() for column in columns))
+    return query.limit(per_page + 1), (after_values is not None, backwards)
+
+
+def keyset_page(rows, keys, per_page, window):
+    key_of = lambda row: [getattr(row, attribute) for column, attribute in keys]
+    after, backwards = window
+    rows = list(rows)
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return Page(rows)
+
+    if backwards:
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after
+
+    return Page(
+        rows,
+        next_cursor=encode_cursor(key_of(rows[-1])) if has_next else None,
+        prev_cursor=encode_cursor(key_of(rows[0])) if has_prev else None,
+    )
@@ -0,0 +1,165 @@
+import datetime
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import column, delete, insert, literal, select, table, text, update
+from counters import roll_shows
+from models import db, utcnow, Venue, Artist, Show, ShowArchive
+
+cli = AppGroup('shows', help='Maintain the Show partitions and archive.')
+
+# On PostgreSQL Show is partitioned by month of start_time into
+# Show_pYYYY_MM tables (see the 7c2e94b1d6f3 migration); rows outside them
+# go to the default partition until their month's partition is created.
+DEFAULT_PARTITION = 'Show_default'
+BOOKING_EXCLUSIONS = {'venue_booking': 'venue_id', 'artist_booking': 'artist_id'}
+ARCHIVED_COLUMNS = ('id', 'start_time', 'end_time', 'artist_id', 'venue_id')
+
+
+def month_start(moment):
+    return datetime.datetime(moment.year, moment.month, 1)
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def partition_name(month):
+    return f'Show_p{month:%Y_%m}'
+
+
+def is_partitioned():
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    return db.session.execute(text("""SELECT relkind FROM pg_class WHERE oid = '"Show"'::regclass""")).scalar() == 'p'
+
+
+def monthly_partitions():
+    """Month -> name of each monthly partition of Show."""
+    names = db.session.execute(text(
+        """SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+           WHERE i.inhparent = '"Show"'::regclass"""
+    )).scalars()
+    months = {}
+    for name in names:
+        try:
+            months[datetime.datetime.strptime(name, 'Show_p%Y_%m')] = name
+        except ValueError:
+            pass
+    return months
+
+
+def create_partition(month):
+    """Add the partition for ``month``, moving its rows out of the default partition."""
+    name = partition_name(month)
+    # Nothing may reach the default partition between the move and the attach.
+    db.session.execute(text(f'LOCK TABLE "{DEFAULT_PARTITION}" IN ACCESS EXCLUSIVE MODE'))
+    db.session.execute(text(f'CREATE TABLE "{name}" (LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    db.session.execute(text(
+        f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" WHERE start_time >= :start AND start_time < :end RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved'
+    ), {"start": month, "end": next_month(month)})
+    for suffix, column in BOOKING_EXCLUSIONS.items():
+        db.session.execute(text(
+            f'ALTER TABLE "{name}" ADD CONSTRAINT "{name}_{suffix}" EXCLUDE USING gist '
+            f'({column} WITH =, tsrange(start_time, end_time) WITH &&) WHERE (end_time IS NOT NULL)'
+        ))
+    db.session.execute(text(
+        f"""ALTER TABLE "Show" ATTACH PARTITION "{name}" FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"""
+    ))
+    db.session.commit()
+    return name
+
+
+def ensure_partitions(current_time, months_ahead):
+    """Create any missing partition from this month to ``months_ahead`` months on."""
+    existing = monthly_partitions()
+    created = []
+    month = month_start(current_time)
+    for _ in range(months_ahead + 1):
+        if month not in existing:
+            created.append(create_partition(month))
+        month = next_month(month)
+    return created
+
+
+def archive_cutoff(current_time, after_days):
+    """Shows starting before this are archived: ``after_days`` ago, rounded down to a month."""
+    return month_start(current_time - datetime.timedelta(days=after_days))
+
+
+def touch_owners(shows, stamp):
+    """Stamp the venues and artists of ``shows``, so every process's caches of their pages go stale."""
+    for model, owner_id in ((Venue, shows.c.venue_id), (Artist, shows.c.artist_id)):
+        db.session.execute(
+            update(model).where(model.id.in_(select(owner_id))).values(updated_at=stamp),
+            execution_options={'synchronize_session': False},
+        )
+
+
+def archive_shows(cutoff, current_time, batch_size=10000):
+    """Move shows that started before ``cutoff`` from Show to Show_archive."""
+    # Archived shows stay in their venue's and artist's past counters.
+    roll_shows(current_time)
+    columns = ', '.join(ARCHIVED_COLUMNS)
+    stamp = utcnow()
+    archived = 0
+    if is_partitioned():
+        # Whole months: copy each partition and drop it instead of deleting rows.
+        for month, name in sorted(monthly_partitions().items()):
+            if next_month(month) > cutoff:
+                break
+            archived += db.session.execute(text(
+                f'INSERT INTO "Show_archive" ({columns}, archived_at) SELECT {columns}, :stamp FROM "{name}"'
+            ), {"stamp": stamp}).rowcount
+            touch_owners(table(name, column('venue_id'), column('artist_id')), stamp)
+            db.session.execute(text(f'DROP TABLE "{name}"'))
+            db.session.commit()
+
+    # Everything else, e.g. old rows in the default partition or on SQLite.
+    show_columns = [getattr(Show, column) for column in ARCHIVED_COLUMNS]
+    while True:
+        ids = db.session.scalars(select(Show.id).where(Show.start_time < cutoff).limit(batch_size)).all()
+        if not ids:
+            break
+        db.session.execute(insert(ShowArchive).from_select(
+            [*ARCHIVED_COLUMNS, 'archived_at'],
+            select(*show_columns, literal(stamp)).where(Show.id.in_(ids)),
+        ))
+        touch_owners(select(Show.venue_id, Show.artist_id).where(Show.id.in_(ids)).subquery(), stamp)
+        db.session.execute(
+            delete(Show).where(Show.id.in_(ids), Show.start_time < cutoff),
+            execution_options={'synchronize_session': False},
+        )
+        db.session.commit()
+        archived += len(ids)
+    return archived
+
+
+@cli.command('partitions')
+@click.option('--months-ahead', type=int, default=None, help='Defaults to SHOW_PARTITION_MONTHS_AHEAD.')
+@click.option('--every', type=int, default=None, help='Keep running, checking every N seconds.')
+def partitions_command(months_ahead, every):
+    """Create the monthly Show partitions for the coming months (PostgreSQL)."""
+    if not is_partitioned():
+        raise click.ClickException('Show is not partitioned; that needs PostgreSQL and `flask db upgrade`.')
+    months_ahead = current_app.config['SHOW_PARTITION_MONTHS_AHEAD'] if months_ahead is None else months_ahead
+    while True:
+        created = ensure_partitions(datetime.datetime.now(), months_ahead)
+        click.echo(f"Created {len(created)} partition(s){': ' + ', '.join(created) if created else ''}.")
+        if not every:
+            break
+        time.sleep(every)
+
+
+@cli.command('archive')
+@click.option('--after-days', type=int, default=None, help='Defaults to SHOW_ARCHIVE_AFTER_DAYS.')
+@click.option('--batch-size', type=int, default=10000, show_default=True)
+def archive_command(after_days, batch_size):
+    """Move old shows to Show_archive; detail pages list them only with ?archived=1."""
+    after_days = current_app.config['SHOW_ARCHIVE_AFTER_DAYS'] if after_days is None else after_days
+    now = datetime.datetime.now()
+    cutoff = archive_cutoff(now, after_days)
+    archived = archive_shows(cutoff, now, batch_size)
+    click.echo(f'Archived {archived} show(s) that started before {cutoff:%Y-%m-%d}.')
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class PoolStats:
+    """Checkout counters for one process's pool."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def record(self, wait, overflowed=False, timed_out=False):
+        with self.lock:
+            self.checkouts += not timed_out
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.overflow_events += overflowed
+            self.timeouts += timed_out
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times checkouts and counts overflow connections and timeouts."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        overflow = self.overflow()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.stats.record(time.perf_counter() - start, overflowed=self.overflow() > max(overflow, 0))
+        return record
+
+
+def engine_options(config, url=None):
+    """SQLALCHEMY_ENGINE_OPTIONS built from the DB_POOL_* settings."""
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    url = make_url(url or config['SQLALCHEMY_DATABASE_URI'])
+    if config['DB_POOL'] == 'null':
+        options['poolclass'] = NullPool
+    elif url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # Flask-SQLAlchemy gives in-memory SQLite a single static connection.
+        pass
+    else:
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_POOL_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+            pool_recycle=config['DB_POOL_RECYCLE'],
+        )
+    return options
+
+
+def init_pool(app):
+    """Must run before ``db.init_app``, which creates the engine."""
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {"pid": os.getpid(), "pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            timeout=pool.timeout(),
+        )
+    counters = getattr(pool, 'stats', None)
+    if counters is not None:
+        with counters.lock:
+            attempts = counters.checkouts + counters.timeouts
+            stats.update(
+                checkouts=counters.checkouts,
+                wait_ms_total=round(counters.wait_total * 1000, 3),
+                wait_ms_mean=round(counters.wait_total * 1000 / attempts, 3) if attempts else None,
+                wait_ms_max=round(counters.wait_max * 1000, 3),
+                overflow_events=counters.overflow_events,
+                timeouts=counters.timeouts,
+            )
+    return stats
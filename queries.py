@@ -0,0 +1,361 @@
+import datetime
+from itertools import groupby
+from sqlalchemy import case, func, select, union_all
+from sqlalchemy.orm import aliased
+from models import db, utcnow, Venue, Artist, Show, ShowArchive, VenueArea
+from pagination import keyset_paginate, keyset_page, keyset_window
+from search import get_search_backend
+
+SHOW_KEYS = [(Show.start_time, 'start_time'), (Show.id, 'id')]
+ARTIST_KEYS = [(Artist.name, 'name'), (Artist.id, 'id')]
+# Response header with the age, in seconds, of the /venues summary.
+AREA_AGE_HEADER = 'X-Data-Age'
+
+
+def venue_areas_query():
+    return (
+        db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.upcoming_shows_count, Venue.updated_at)
+        .order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+    )
+
+
+def area_summary_query():
+    # The primary key's order, so one index scan reads the whole page.
+    return (
+        db.session.query(VenueArea.state, VenueArea.city, VenueArea.venues, VenueArea.refreshed_at)
+        .order_by(VenueArea.state, VenueArea.city)
+    )
+
+
+def summarized_areas(rows):
+    """Areas of ``area_summary_query`` rows, and when the least recently refreshed one was refreshed."""
+    areas = [{"city": row.city, "state": row.state, "venues": row.venues} for row in rows]
+    return areas, min((row.refreshed_at for row in rows), default=None)
+
+
+def summary_age(refreshed_at):
+    """Seconds since ``refreshed_at``; 0 for areas grouped from Venue just now."""
+    if refreshed_at is None:
+        return 0
+    return max(int((utcnow() - refreshed_at).total_seconds()), 0)
+
+
+def venue_areas():
+    """The /venues areas from the VenueArea summary (see areas.py), and its age in seconds."""
+    areas, refreshed_at = summarized_areas(area_summary_query().all())
+    if refreshed_at is None:
+        # Nothing summarized yet.
+        areas = list(group_areas(venue_areas_query()))
+    return areas, summary_age(refreshed_at)
+
+
+def group_areas(rows):
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        yield {
+            "city": city,
+            "state": state,
+            "venues": [
+                {
+                    "id": venue.id,
+                    "name": venue.name,
+                    "num_upcoming_shows": venue.upcoming_shows_count,
+                    "updated_at": venue.updated_at,
+                }
+                for venue in venues
+            ],
+        }
+
+
+def search_by_name(model, search_term, page=1, per_page=20):
+    results = get_search_backend().search(model, search_term)
+    count = results.count
+    page, pages = search_page_number(count, page, per_page)
+    matches = results.slice((page - 1) * per_page, per_page)
+    ids = [id for id, name in matches]
+    upcoming = dict(search_upcoming_query(model, ids)) if ids else {}
+    return search_response(count, page, pages, matches, upcoming)
+
+
+def search_page_number(count, page, per_page):
+    pages = max(1, -(-count // per_page))
+    return min(page, pages), pages
+
+
+def search_upcoming_query(model, ids):
+    return db.session.query(model.id, model.upcoming_shows_count).filter(model.id.in_(ids))
+
+
+def search_response(count, page, pages, matches, upcoming):
+    return {
+        "count": count,
+        "page": page,
+        "pages": pages,
+        "data": [
+            {
+                "id": id,
+                "name": name,
+                "num_upcoming_shows": upcoming.get(id, 0),
+            }
+            for id, name in matches
+        ],
+    }
+
+
+def shows_query():
+    return (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            Venue.id.label('venue_id'),
+            Venue.name.label('venue_name'),
+            Artist.id.label('artist_id'),
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+            Show.updated_at,
+            Venue.updated_at.label('venue_updated_at'),
+            Artist.updated_at.label('artist_updated_at'),
+        )
+        .select_from(Show)
+        .join(Venue, Show.venue_id == Venue.id)
+        .join(Artist, Show.artist_id == Artist.id)
+    )
+
+
+def show_row(show):
+    return {
+        "id": show.id,
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time,
+        # The card shows the venue's and artist's names too.
+        "updated_at": max(show.updated_at, show.venue_updated_at, show.artist_updated_at),
+    }
+
+
+def shows_page(after=None, before=None, per_page=50):
+    page = keyset_paginate(shows_query(), SHOW_KEYS, after, before, per_page, descending=True)
+    page.items = [show_row(show) for show in page.items]
+    return page
+
+
+def artists_query():
+    return db.session.query(Artist.id, Artist.name, Artist.updated_at)
+
+
+def artist_row(artist):
+    return {"id": artist.id, "name": artist.name, "updated_at": artist.updated_at}
+
+
+def artists_page(after=None, before=None, per_page=50):
+    page = keyset_paginate(artists_query(), ARTIST_KEYS, after, before, per_page)
+    page.items = [artist_row(artist) for artist in page.items]
+    return page
+
+
+def past_shows(cursors):
+    """``Show``, or with ``?archived=1`` an alias over Show and Show_archive.
+
+    The alias has the columns the show lists use; archived shows stand in
+    ``archived_at`` for ``updated_at``.
+    """
+    if cursors.get('archived') != '1':
+        return Show
+    live = select(Show.id, Show.start_time, Show.venue_id, Show.artist_id, Show.updated_at)
+    archived = select(
+        ShowArchive.id, ShowArchive.start_time, ShowArchive.venue_id, ShowArchive.artist_id,
+        ShowArchive.archived_at.label('updated_at'),
+    )
+    return aliased(Show, union_all(live, archived).subquery('all_shows'), adapt_on_names=True)
+
+
+def show_list_windows(query_for, current_time, cursors, per_page):
+    """``keyset_window``s of the upcoming and the past shows in ``query_for(Show)``.
+
+    Only past shows can be archived, so upcoming ones are always read from
+    Show, and on PostgreSQL only from its partitions after ``current_time``.
+    """
+    upcoming = keyset_window(
+        query_for(Show).filter(Show.start_time > current_time), SHOW_KEYS,
+        cursors.get('upcoming_after'), cursors.get('upcoming_before'), per_page,
+    )
+    shows = past_shows(cursors)
+    past = keyset_window(
+        query_for(shows).filter(shows.start_time <= current_time), [(shows.start_time, 'start_time'), (shows.id, 'id')],
+        cursors.get('past_after'), cursors.get('past_before'), per_page, descending=True,
+    )
+    return upcoming, past
+
+
+def show_list_pages(query_for, current_time, cursors, per_page):
+    return tuple(
+        keyset_page(window_query.all(), SHOW_KEYS, per_page, window)
+        for window_query, window in show_list_windows(query_for, current_time, cursors, per_page)
+    )
+
+
+def venue_shows_query(venue_id, shows=Show):
+    return (
+        db.session.query(
+            shows.id,
+            shows.start_time,
+            Artist.id.label('artist_id'),
+            Artist.name.label('artist_name'),
+            Artist.image_link.label('artist_image_link'),
+        )
+        .join(Artist, shows.artist_id == Artist.id)
+        .filter(shows.venue_id == venue_id)
+    )
+
+
+def artist_shows_query(artist_id, shows=Show):
+    return (
+        db.session.query(
+            shows.id,
+            shows.start_time,
+            Venue.id.label('venue_id'),
+            Venue.name.label('venue_name'),
+            Venue.image_link.label('venue_image_link'),
+        )
+        .join(Venue, shows.venue_id == Venue.id)
+        .filter(shows.artist_id == artist_id)
+    )
+
+
+def venue_details(venue, current_time, cursors, per_page=12):
+    upcoming, past = show_list_pages(lambda shows: venue_shows_query(venue.id, shows), current_time, cursors, per_page)
+    return venue_data(venue, upcoming, past)
+
+
+def venue_data(venue, upcoming, past):
+    show_details = lambda show: {
+        "artist_id": show.artist_id,
+        "artist_name": show.artist_name,
+        "artist_image_link": show.artist_image_link,
+        "start_time": show.start_time,
+    }
+
+    return {
+        "id": venue.id,
+        "name": venue.name,
+        "genres": venue.genres.split(',') if venue.genres else [],
+        "address": venue.address,
+        "city": venue.city,
+        "state": venue.state,
+        "phone": venue.phone,
+        "website": venue.website_link,
+        "facebook_link": venue.facebook_link,
+        "seeking_talent": venue.seeking_talent,
+        "seeking_description": venue.seeking_description,
+        "image_link": venue.image_link,
+        "past_shows": [show_details(show) for show in past],
+        "upcoming_shows": [show_details(show) for show in upcoming],
+        "past_shows_count": venue.past_shows_count,
+        "upcoming_shows_count": venue.upcoming_shows_count,
+        "past_shows_next": past.next_cursor,
+        "past_shows_prev": past.prev_cursor,
+        "upcoming_shows_next": upcoming.next_cursor,
+        "upcoming_shows_prev": upcoming.prev_cursor,
+    }
+
+
+def artist_details(artist, current_time, cursors, per_page=12):
+    upcoming, past = show_list_pages(lambda shows: artist_shows_query(artist.id, shows), current_time, cursors, per_page)
+    return artist_data(artist, upcoming, past)
+
+
+def artist_data(artist, upcoming, past):
+    show_details = lambda show: {
+        "venue_id": show.venue_id,
+        "venue_name": show.venue_name,
+        "venue_image_link": show.venue_image_link,
+        "start_time": show.start_time,
+    }
+
+    return {
+        "id": artist.id,
+        "name": artist.name,
+        "genres": artist.genres.split(','),
+        "city": artist.city,
+        "state": artist.state,
+        "phone": artist.phone,
+        "website": artist.website_link,
+        "facebook_link": artist.facebook_link,
+        "seeking_venue": artist.seeking_venue,
+        "seeking_description": artist.seeking_description,
+        "image_link": artist.image_link,
+        "past_shows": [show_details(show) for show in past],
+        "upcoming_shows": [show_details(show) for show in upcoming],
+        "past_shows_count": artist.past_shows_count,
+        "upcoming_shows_count": artist.upcoming_shows_count,
+        "past_shows_next": past.next_cursor,
+        "past_shows_prev": past.prev_cursor,
+        "upcoming_shows_next": upcoming.next_cursor,
+        "upcoming_shows_prev": upcoming.prev_cursor,
+    }
+
+
+def _last_modified(updated, latest_start=None):
+    """Latest naive-UTC change among ``updated``; ``latest_start`` is local time."""
+    if latest_start is not None:
+        updated = list(updated) + [latest_start.astimezone(datetime.timezone.utc).replace(tzinfo=None)]
+    return max(updated, default=None)
+
+
+def _detail_page_stamps(model, id, shows_column, related, current_time):
+    """One aggregate over the entity, its shows and their related rows.
+
+    Its values change with anything the detail page renders: a write stamps
+    the rows it touches, deleting or archiving a show changes the count, and
+    the latest show to have started moves as time splits upcoming from past.
+    """
+    related_column = Show.artist_id if related is Artist else Show.venue_id
+    row = (
+        db.session.query(
+            model.updated_at,
+            func.max(Show.updated_at),
+            func.max(related.updated_at),
+            func.count(Show.id),
+            func.max(case((Show.start_time <= current_time, Show.start_time))),
+        )
+        .select_from(model)
+        .outerjoin(Show, shows_column == model.id)
+        .outerjoin(related, related_column == related.id)
+        .filter(model.id == id)
+        .group_by(model.id, model.updated_at)
+        .one_or_none()
+    )
+    if row is None:
+        return None
+    updated_at, shows_updated_at, related_updated_at, count, latest_start = row
+    updated = [stamp for stamp in (updated_at, shows_updated_at, related_updated_at) if stamp is not None]
+    return tuple(row), _last_modified(updated, latest_start)
+
+
+def venue_page_stamps(venue_id, current_time):
+    """Values that change whenever anything show_venue() renders does."""
+    return _detail_page_stamps(Venue, venue_id, Show.venue_id, Artist, current_time)
+
+
+def artist_page_stamps(artist_id, current_time):
+    return _detail_page_stamps(Artist, artist_id, Show.artist_id, Venue, current_time)
+
+
+def shows_page_stamps(after=None, before=None, per_page=50):
+    query = (
+        db.session.query(
+            Show.id,
+            Show.start_time,
+            Show.updated_at,
+            Venue.updated_at.label('venue_updated_at'),
+            Artist.updated_at.label('artist_updated_at'),
+        )
+        .select_from(Show)
+        .join(Venue, Show.venue_id == Venue.id)
+        .join(Artist, Show.artist_id == Artist.id)
+    )
+    page = keyset_paginate(query, SHOW_KEYS, after, before, per_page, descending=True)
+    updated = [stamp for row in page.items for stamp in (row.updated_at, row.venue_updated_at, row.artist_updated_at)]
+    return [tuple(row) for row in page.items], _last_modified(updated)
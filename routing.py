@@ -0,0 +1,61 @@
+import random
+import time
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from pool import engine_options
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+PIN_COOKIE = 'fyyur_primary_until'
+
+
+class RoutingSession(Session):
+    """Session that sends a read-only request's queries to a replica.
+
+    ``init_replicas`` picks the replica for a request in ``g.replica``;
+    anything else (writes, flushes, CLI commands) uses the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('replica')
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    if has_request_context():
+        g.wrote = True
+
+
+def pinned_to_primary():
+    """Users who just wrote read from the primary until replicas catch up."""
+    return request.cookies.get(PIN_COOKIE, 0, type=float) > time.time()
+
+
+def choose_replica():
+    if request.method not in READ_METHODS or pinned_to_primary():
+        return
+    g.replica = random.choice(current_app.extensions['replicas'])
+
+
+def pin_to_primary(response):
+    if g.get('wrote'):
+        lag = current_app.config['REPLICA_LAG_SECONDS']
+        response.set_cookie(PIN_COOKIE, str(time.time() + lag), max_age=lag, httponly=True, samesite='Lax')
+    return response
+
+
+def init_replicas(app):
+    """Add a bind per REPLICA_DATABASE_URLS entry; must run before ``db.init_app``."""
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    replicas = app.extensions['replicas'] = []
+    for number, url in enumerate(app.config.get('REPLICA_DATABASE_URLS') or []):
+        name = f'replica{number}'
+        binds[name] = {'url': url, **engine_options(app.config, url)}
+        replicas.append(name)
+    if replicas:
+        app.before_request(choose_replica)
+        app.after_request(pin_to_primary)
@@ -0,0 +1,186 @@
+import heapq
+import threading
+from collections import defaultdict
+from flask import current_app
+from sqlalchemy import func
+from models import db, Venue, Artist
+from sync import ModelIndexes, refresh_in_background, track_commits
+
+SEARCHABLE_MODELS = (Venue, Artist)
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class QueryResults:
+    def __init__(self, query, model):
+        self.query = query
+        self.model = model
+        self._count = None
+
+    @property
+    def count(self):
+        if self._count is None:
+            self._count = self.query.order_by(None).count()
+        return self._count
+
+    def slice_query(self, offset, limit):
+        return self.query.with_entities(self.model.id, self.model.name).limit(limit).offset(offset)
+
+    def slice(self, offset, limit):
+        return [(row.id, row.name) for row in self.slice_query(offset, limit)]
+
+
+class IlikeSearch:
+    name = 'ilike'
+
+    def search(self, model, term):
+        query = (
+            model.query
+            .filter(model.name.ilike(f'%{escape_like(term)}%', escape='\\'))
+            .order_by(model.name, model.id)
+        )
+        return QueryResults(query, model)
+
+
+class TrigramSearch:
+    """PostgreSQL search served by the pg_trgm GIN indexes on ``name``."""
+
+    name = 'trigram'
+
+    def search(self, model, term):
+        escaped = escape_like(term)
+        query = model.query.filter(model.name.ilike(f'%{escaped}%', escape='\\'))
+        if term:
+            query = query.order_by(
+                model.name.ilike(f'{escaped}%', escape='\\').desc(),
+                func.similarity(model.name, term).desc(),
+            )
+        return QueryResults(query.order_by(model.name, model.id), model)
+
+
+class NgramIndex:
+    """Inverted index from lower-cased character n-grams to row ids."""
+
+    def __init__(self, n=3):
+        self.n = n
+        self.names = {}
+        self.postings = defaultdict(set)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self, rows):
+        names, postings = {}, defaultdict(set)
+        for id, name in rows:
+            lowered = name.lower()
+            names[id] = (lowered, name)
+            for gram in self.grams(lowered):
+                postings[gram].add(id)
+        with self.lock:
+            self.names, self.postings = names, postings
+
+    def grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, id, name):
+        with self.lock:
+            self.remove(id)
+            lowered = name.lower()
+            self.names[id] = (lowered, name)
+            for gram in self.grams(lowered):
+                self.postings[gram].add(id)
+
+    def remove(self, id):
+        with self.lock:
+            entry = self.names.pop(id, None)
+            if entry is None:
+                return
+            for gram in self.grams(entry[0]):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(id)
+                    if not ids:
+                        del self.postings[gram]
+
+    def candidates(self, term):
+        if len(term) < self.n:
+            return list(self.names)
+        posting_lists = sorted((self.postings.get(gram, ()) for gram in self.grams(term)), key=len)
+        if not posting_lists[0]:
+            return []
+        return set(posting_lists[0]).intersection(*posting_lists[1:])
+
+    def search(self, term):
+        term = term.lower()
+        with self.lock:
+            names = self.names
+            matches = []
+            for id in self.candidates(term):
+                lowered, name = names[id]
+                position = lowered.find(term)
+                if position >= 0:
+                    matches.append((position != 0, position, len(lowered), lowered, id, name))
+        return NgramResults(matches)
+
+
+class NgramResults:
+    def __init__(self, matches):
+        self.matches = matches
+        self.count = len(matches)
+
+    def slice(self, offset, limit):
+        ranked = heapq.nsmallest(offset + limit, self.matches)[offset:]
+        return [(match[4], match[5]) for match in ranked]
+
+
+class NgramSearch(ModelIndexes):
+    """In-process search for SQLite, kept in sync with committed writes."""
+
+    name = 'ngram'
+    index_class = NgramIndex
+
+    def search(self, model, term):
+        return self.index_for(model).search(term)
+
+
+BACKENDS = {
+    'ilike': IlikeSearch,
+    'trigram': TrigramSearch,
+    'ngram': NgramSearch,
+}
+
+
+def get_search_backend(app=None):
+    app = app or current_app
+    backend = app.extensions.get('search_backend')
+    if backend is None:
+        name = app.config.get('SEARCH_BACKEND', 'auto')
+        if name == 'auto':
+            name = 'trigram' if db.engine.dialect.name == 'postgresql' else 'ngram'
+        backend_class = BACKENDS[name]
+        if issubclass(backend_class, ModelIndexes):
+            backend = backend_class(app.config['INDEX_CHECK_SECONDS'], app.config['INDEX_SETTLE_SECONDS'])
+        else:
+            backend = backend_class()
+        app.extensions['search_backend'] = backend
+    return backend
+
+
+def init_search(app):
+    refresh_in_background(app, get_search_backend, SEARCHABLE_MODELS)
+
+
+def _describe(obj, deleted):
+    return type(obj), obj.id, None if deleted else obj.name
+
+
+def _apply_changes(changes):
+    backend = current_app.extensions.get('search_backend')
+    if isinstance(backend, NgramSearch):
+        backend.apply(changes)
+
+
+track_commits('search_index_changes', SEARCHABLE_MODELS, _describe, _apply_changes)
@@ -0,0 +1,256 @@
+import datetime
+import itertools
+import random
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import bindparam, text, update
+from areas import rebuild_areas
+from autocomplete import get_autocomplete
+from counters import roll_shows
+from forms import genre_choices, state_choices
+from importer import bulk_insert
+from models import db, Venue, Artist, Show, ShowArchive, VenueArea
+from search import get_search_backend
+
+cli = AppGroup('seed', help='Generate synthetic data for performance work.')
+
+SYLLABLES = ['ka', 'ro', 'mi', 'len', 'tor', 'sa', 'vi', 'dun', 'el', 'bra', 'zo', 'quin', 'har', 'ly', 'ne', 'os', 'tu', 'ver']
+VENUE_KINDS = ['Hall', 'Room', 'Club', 'Lounge', 'Theatre', 'Ballroom', 'Bar', 'Arena', 'Tavern', 'Stage']
+STREETS = ['Main St', 'Market St', 'Broadway', 'Mission St', 'Oak Ave', 'Pine St', '1st Ave', 'Elm St', 'Sunset Blvd']
+
+# Rough share of venues and artists per state; every other state gets 1.
+STATE_WEIGHTS = {'CA': 12, 'TX': 9, 'NY': 8, 'FL': 7, 'IL': 4, 'PA': 4, 'OH': 3, 'GA': 3, 'NC': 3, 'MI': 3, 'WA': 3, 'TN': 3}
+CITIES = {
+    'CA': ['Los Angeles', 'San Francisco', 'San Diego', 'Oakland', 'Sacramento'],
+    'TX': ['Austin', 'Houston', 'Dallas', 'San Antonio'],
+    'NY': ['New York', 'Brooklyn', 'Buffalo', 'Rochester'],
+    'FL': ['Miami', 'Orlando', 'Tampa'],
+    'IL': ['Chicago', 'Springfield'],
+    'TN': ['Nashville', 'Memphis'],
+    'WA': ['Seattle', 'Spokane'],
+    'GA': ['Atlanta', 'Athens'],
+}
+GENRE_WEIGHTS = {'Rock n Roll': 10, 'Pop': 9, 'Hip-Hop': 8, 'Electronic': 6, 'Jazz': 5, 'R&B': 5, 'Country': 5, 'Alternative': 5, 'Punk': 3}
+EVENING_HOURS = [17, 18, 19, 20, 20, 21, 21, 22, 23]
+# A fixed default, so a seed gives the same dataset on any day.
+DEFAULT_ANCHOR = datetime.datetime(2026, 10, 1)
+
+
+class Generator:
+    """Deterministic catalog generator.
+
+    Every table draws from its own random stream derived from ``seed``, so
+    the venues and artists for a seed are identical whatever the show count.
+    Rows are stamped with ``anchor`` rather than the time they are written.
+    Show venues and artists follow a Zipf-Mandelbrot distribution (weight
+    ``(rank + 5) ** -skew``) over a seeded ranking: with the defaults the
+    busiest venue gets tens of thousands of shows and most get a handful.
+    """
+
+    def __init__(self, seed, anchor, skew=1.1):
+        self.seed = seed
+        self.anchor = anchor
+        self.skew = skew
+        states = [state for state, label in state_choices]
+        self.states = states
+        self.state_weights = list(itertools.accumulate(STATE_WEIGHTS.get(state, 1) for state in states))
+        self.genres = [genre for genre, label in genre_choices]
+        self.genre_weights = [GENRE_WEIGHTS.get(genre, 1) for genre in self.genres]
+
+    def rng(self, stream):
+        return random.Random(f'{self.seed}:{stream}')
+
+    def name(self, rng, number, suffix=''):
+        words = (''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title() for _ in range(rng.randint(1, 2)))
+        return f"{' '.join(words)}{suffix} {number}"
+
+    def place(self, rng):
+        state = rng.choices(self.states, cum_weights=self.state_weights)[0]
+        cities = CITIES.get(state) or [f'{state} City {n}' for n in range(1, 4)]
+        return rng.choice(cities), state
+
+    def genre_list(self, rng):
+        picked = set(rng.choices(self.genres, weights=self.genre_weights, k=rng.choices([1, 2, 3], [5, 3, 1])[0]))
+        return ','.join(genre for genre in self.genres if genre in picked)
+
+    def phone(self, rng):
+        return f'{rng.randint(200, 999)}-{rng.randint(200, 999)}-{rng.randint(0, 9999):04d}'
+
+    def venues(self, count):
+        rng = self.rng('venues')
+        for id in range(1, count + 1):
+            city, state = self.place(rng)
+            seeking = rng.random() < 0.2
+            yield {
+                "id": id,
+                "name": self.name(rng, id, ' ' + rng.choice(VENUE_KINDS)),
+                "city": city,
+                "state": state,
+                "address": f'{rng.randint(1, 9999)} {rng.choice(STREETS)}',
+                "phone": self.phone(rng),
+                "genres": self.genre_list(rng),
+                "image_link": f'https://picsum.photos/seed/venue{id}/600/400',
+                "facebook_link": None,
+                "website_link": None,
+                "seeking_talent": seeking,
+                "seeking_description": 'Looking for local acts.' if seeking else None,
+                "updated_at": self.anchor,
+            }
+
+    def artists(self, count):
+        rng = self.rng('artists')
+        for id in range(1, count + 1):
+            city, state = self.place(rng)
+            seeking = rng.random() < 0.3
+            yield {
+                "id": id,
+                "name": self.name(rng, id),
+                "city": city,
+                "state": state,
+                "phone": self.phone(rng),
+                "genres": self.genre_list(rng),
+                "image_link": f'https://picsum.photos/seed/artist{id}/600/400',
+                "facebook_link": None,
+                "website_link": None,
+                "seeking_venue": seeking,
+                "seeking_description": 'Booking a tour.' if seeking else None,
+                "updated_at": self.anchor,
+            }
+
+    def ranking(self, stream, count):
+        """Ids ordered by popularity and the matching cumulative Zipf weights."""
+        ids = list(range(1, count + 1))
+        self.rng(stream).shuffle(ids)
+        return ids, list(itertools.accumulate((rank + 5) ** -self.skew for rank in range(1, count + 1)))
+
+    def shows(self, count, venues, artists, batch_size):
+        """Yield batches of show rows; start times span three years back and one ahead."""
+        rng = self.rng('shows')
+        venue_ids, venue_weights = self.ranking('venue-popularity', venues)
+        artist_ids, artist_weights = self.ranking('artist-popularity', artists)
+        first_day = self.anchor - datetime.timedelta(days=3 * 365)
+        days = 4 * 365
+        id = 0
+        while id < count:
+            size = min(batch_size, count - id)
+            venue_batch = rng.choices(venue_ids, cum_weights=venue_weights, k=size)
+            artist_batch = rng.choices(artist_ids, cum_weights=artist_weights, k=size)
+            batch = []
+            for venue_id, artist_id in zip(venue_batch, artist_batch):
+                id += 1
+                start_time = first_day + datetime.timedelta(
+                    days=rng.randrange(days), hours=rng.choice(EVENING_HOURS), minutes=rng.choice((0, 30)))
+                batch.append({
+                    "id": id, "venue_id": venue_id, "artist_id": artist_id, "start_time": start_time,
+                    "counted_past": start_time <= self.anchor, "updated_at": self.anchor,
+                })
+            yield batch
+
+
+def clear_tables():
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('TRUNCATE "Show", "Show_archive", "VenueArea", "Venue", "Artist" RESTART IDENTITY'))
+    else:
+        for model in (Show, ShowArchive, VenueArea, Venue, Artist):
+            db.session.execute(model.__table__.delete())
+    db.session.commit()
+
+
+def reset_sequences():
+    if db.engine.dialect.name == 'postgresql':
+        for model in (Venue, Artist, Show):
+            table = model.__table__.name
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT coalesce(max(id), 0) + 1 FROM \"{table}\"), false)"
+            ))
+
+
+def insert_in_batches(model, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            bulk_insert(model, batch)
+            batch = []
+    if batch:
+        bulk_insert(model, batch)
+    db.session.commit()
+
+
+def store_counters(model, counts, stamp):
+    """Write the (upcoming, past) show counts gathered while generating shows."""
+    table = model.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == bindparam('_id'))
+        # An explicit updated_at, or its onupdate would stamp the current time.
+        .values(upcoming_shows_count=bindparam('_upcoming'), past_shows_count=bindparam('_past'), updated_at=stamp),
+        [{"_id": id, "_upcoming": upcoming, "_past": past} for id, (upcoming, past) in enumerate(counts) if upcoming or past],
+    )
+    db.session.commit()
+
+
+@cli.command('generate')
+@click.option('--seed', type=int, default=0, show_default=True, help='Same seed, counts and anchor give the same rows, before --roll.')
+@click.option('--venues', type=int, default=10000, show_default=True)
+@click.option('--artists', type=int, default=10000, show_default=True)
+@click.option('--shows', type=int, default=1000000, show_default=True)
+@click.option('--skew', type=float, default=1.1, show_default=True, help='Zipf exponent of show counts per venue and artist.')
+@click.option('--anchor', type=click.DateTime(['%Y-%m-%d']), default=DEFAULT_ANCHOR.strftime('%Y-%m-%d'), show_default=True,
+              help='Date shows are spread around (three years back, one ahead); counters are as of this date.')
+@click.option('--roll/--no-roll', default=True, show_default=True,
+              help='Afterwards count shows that started between the anchor and now as past, as `flask counters roll` does.')
+@click.option('--batch-size', type=int, default=50000, show_default=True)
+@click.option('--reset', is_flag=True, help='Delete existing venues, artists and shows first.')
+def generate_command(seed, venues, artists, shows, skew, anchor, roll, batch_size, reset):
+    """Bulk-insert a synthetic catalog with skewed show distributions."""
+    if roll and anchor > datetime.datetime.now():
+        # Shows counted as past at the anchor would be upcoming now, and rolling only moves the other way.
+        raise click.ClickException('The anchor is in the future; pass --no-roll to keep its counters.')
+    if reset:
+        clear_tables()
+    elif any(db.session.query(model.id).first() for model in (Venue, Artist, Show)):
+        raise click.ClickException('The catalog is not empty; pass --reset to replace it.')
+
+    generator = Generator(seed, anchor, skew)
+    click.echo(f'Generating seed {seed} around {anchor:%Y-%m-%d}: {venues} venues, {artists} artists, {shows} shows.')
+    started = time.perf_counter()
+    insert_in_batches(Venue, generator.venues(venues), batch_size)
+    insert_in_batches(Artist, generator.artists(artists), batch_size)
+    click.echo(f'  venues and artists in {time.perf_counter() - started:.1f}s')
+
+    venue_counts = [[0, 0] for _ in range(venues + 1)]
+    artist_counts = [[0, 0] for _ in range(artists + 1)]
+    inserted = 0
+    for batch in generator.shows(shows, venues, artists, batch_size):
+        for row in batch:
+            venue_counts[row['venue_id']][row['counted_past']] += 1
+            artist_counts[row['artist_id']][row['counted_past']] += 1
+        bulk_insert(Show, batch)
+        db.session.commit()
+        inserted += len(batch)
+        if inserted % (batch_size * 20) == 0 or inserted == shows:
+            elapsed = time.perf_counter() - started
+            click.echo(f'  {inserted} shows, {elapsed:.1f}s')
+
+    store_counters(Venue, venue_counts, anchor)
+    store_counters(Artist, artist_counts, anchor)
+    reset_sequences()
+    db.session.commit()
+    if roll:
+        click.echo(f'  rolled {roll_shows(datetime.datetime.now())} shows since {anchor:%Y-%m-%d} into the past counters')
+    rebuild_areas()
+    db.session.commit()
+
+    backend = get_search_backend()
+    if hasattr(backend, 'reset'):
+        backend.reset()
+    get_autocomplete().reset()
+    current_app.extensions['entity_cache'].backend.clear()
+    current_app.jinja_env.fragment_cache.clear()
+
+    busiest = max(venue_counts[1:], key=sum, default=[0, 0])
+    median = sorted(sum(counts) for counts in venue_counts[1:])[venues // 2] if venues else 0
+    click.echo(f'Done in {time.perf_counter() - started:.1f}s; busiest venue has {sum(busiest)} shows, median venue {median}.')
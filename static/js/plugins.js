@@ -18,3 +18,86 @@ window.log = function(){
 
 // place any jQuery/helper plugins in here, instead of separate, slower script files.
 
+
+// Name picker for an id field: <input data-autocomplete="/api/v1/artists/autocomplete">.
+// The field becomes hidden and a text box next to it suggests names; typing
+// a number still enters the id directly.
+(function($){
+  $.fn.autocomplete = function(){
+    return this.each(function(){
+      var $id = $(this),
+          url = $id.data('autocomplete'),
+          $input = $('<input type="text" autocomplete="off">')
+            .attr({'class': $id.attr('class'), placeholder: $id.attr('placeholder'), autofocus: $id.attr('autofocus')})
+            .val($id.val()),
+          $menu = $('<ul class="dropdown-menu"></ul>'),
+          $dropdown = $('<div class="dropdown"></div>').append($input, $menu),
+          timer = null,
+          sequence = 0;
+
+      $id.attr('type', 'hidden').removeAttr('autofocus').after($dropdown);
+
+      function close(){ $dropdown.removeClass('open'); }
+
+      function choose($item){
+        $id.val($item.data('id'));
+        $input.val($item.text());
+        close();
+      }
+
+      function show(matches){
+        $menu.empty();
+        $.each(matches, function(i, match){
+          $('<li></li>').append($('<a href="#"></a>').text(match.name).data('id', match.id)).appendTo($menu);
+        });
+        $menu.children().first().addClass('active');
+        $dropdown.toggleClass('open', matches.length > 0);
+      }
+
+      function lookup(){
+        var term = $.trim($input.val()),
+            current = ++sequence;
+        if (!term) { return close(); }
+        $.getJSON(url, {q: term}, function(response){
+          // Drop answers to keystrokes that have since been superseded.
+          if (current === sequence) { show(response.data); }
+        });
+      }
+
+      $input.on('input', function(){
+        var value = $.trim($input.val());
+        $id.val(/^\d+$/.test(value) ? value : '');
+        clearTimeout(timer);
+        timer = setTimeout(lookup, 80);
+      });
+
+      $input.on('keydown', function(event){
+        var $items = $menu.children(),
+            $active = $items.filter('.active'),
+            index = $items.index($active);
+        if (!$dropdown.hasClass('open')) { return; }
+        if (event.which === 40 || event.which === 38) {
+          index = (index + (event.which === 40 ? 1 : -1) + $items.length) % $items.length;
+          $active.removeClass('active');
+          $items.eq(index).addClass('active');
+          event.preventDefault();
+        } else if (event.which === 13 && $active.length) {
+          choose($active.children('a'));
+          event.preventDefault();
+        } else if (event.which === 27) {
+          close();
+        }
+      });
+
+      $menu.on('mousedown', 'a', function(event){
+        // mousedown fires before the text box's blur closes the menu.
+        choose($(this));
+        event.preventDefault();
+      });
+
+      $input.on('blur', close);
+    });
+  };
+
+  $(function(){ $('[data-autocomplete]').autocomplete(); });
+})(jQuery);
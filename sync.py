@@ -0,0 +1,197 @@
+"""Keeping in-process indexes in step with committed writes.
+
+The n-gram search index and the autocomplete index each register the
+models they cover. Changes to those models are collected at every flush,
+handed to the index once the session commits and dropped on rollback, so
+an index never sees a write that did not happen. Writes made elsewhere
+are caught up with by ``ModelIndexes.refresh`` in the background.
+"""
+import datetime
+import threading
+from collections import namedtuple
+from flask import has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from models import db
+
+Tracker = namedtuple('Tracker', 'key models describe apply')
+
+_trackers = []
+
+
+def track_commits(key, models, describe, apply):
+    """After each commit, call ``apply(changes)`` in the app context.
+
+    ``changes`` has ``describe(obj, deleted)`` for every flushed instance
+    of ``models``, in flush order; they wait in ``session.info[key]``.
+    """
+    _trackers.append(Tracker(key, models, describe, apply))
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    for tracker in _trackers:
+        changes = session.info.setdefault(tracker.key, [])
+        for obj in session.new | session.dirty:
+            if isinstance(obj, tracker.models):
+                changes.append(tracker.describe(obj, False))
+        for obj in session.deleted:
+            if isinstance(obj, tracker.models):
+                changes.append(tracker.describe(obj, True))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    for tracker in _trackers:
+        changes = session.info.pop(tracker.key, None)
+        if changes and has_app_context():
+            tracker.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    for tracker in _trackers:
+        session.info.pop(tracker.key, None)
+
+
+class ModelIndexes:
+    """An in-memory index of names per model, kept in sync with the table.
+
+    Writes committed by this process are applied as they happen, including
+    those committed while the index is still being built. Those of other
+    workers and of imports are caught up with by ``refresh``, which a
+    background thread runs every ``check_seconds`` so that lookups never
+    query the table once the index is built.
+
+    Subclasses set ``index_class``, whose instances support ``len()``,
+    ``load(rows)``, ``add(id, name)`` and ``remove(id)``. Changes are
+    ``(model, id, name)`` tuples, with ``name`` None for a deleted row.
+    """
+
+    index_class = None
+
+    def __init__(self, check_seconds=5, settle_seconds=2):
+        self.check_seconds = check_seconds
+        self.settle_seconds = settle_seconds
+        self.indexes = {}
+        # Model -> latest updated_at in its table when last compared.
+        self.versions = {}
+        # Model -> changes committed while its index is being built.
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.refresher = None
+        self.stopped = None
+
+    def index_for(self, model):
+        index = self.indexes.get(model)
+        if index is None:
+            with self.lock:
+                index = self.indexes.get(model)
+                if index is None:
+                    index = self.build(model)
+        return index
+
+    def build(self, model):
+        with self.pending_lock:
+            self.pending[model] = []
+        index = self.index_class()
+        latest = table_version(model)[1]
+        index.load(db.session.query(model.id, model.name))
+        # The load may have read the table before some of them committed.
+        with self.pending_lock:
+            for change in self.pending.pop(model, []):
+                _apply_change(index, change)
+            self.versions[model] = latest
+            self.indexes[model] = index
+        return index
+
+    def refresh(self, model):
+        """Re-read the rows updated since the last check; reload if rows were deleted."""
+        index = self.indexes.get(model)
+        if index is None:
+            return
+        count, latest = table_version(model)
+        since = self.versions[model]
+        rows = db.session.query(model.id, model.name)
+        if since is not None:
+            # A row is stamped when it is flushed but visible only once
+            # committed, so it can appear behind rows stamped after it.
+            settled = since - datetime.timedelta(seconds=self.settle_seconds)
+            for id, name in rows.filter(model.updated_at >= settled):
+                index.add(id, name)
+        if len(index) != count:
+            index.load(rows)
+        self.versions[model] = latest
+
+    def apply(self, changes):
+        with self.pending_lock:
+            for change in changes:
+                index = self.indexes.get(change[0])
+                if index is not None:
+                    _apply_change(index, change)
+                elif change[0] in self.pending:
+                    self.pending[change[0]].append(change)
+
+    def start_refreshing(self, app, models):
+        """Build the indexes of ``models`` in a background thread, then keep refreshing them."""
+        with self.lock:
+            if self.refresher is None:
+                self.stopped = threading.Event()
+                self.refresher = threading.Thread(target=self._refresh_in_background, args=(app, models, self.stopped),
+                                                  daemon=True)
+                self.refresher.start()
+
+    def _refresh_in_background(self, app, models, stopped):
+        with app.app_context():
+            try:
+                for model in models:
+                    self.index_for(model)
+            except Exception:
+                # Lookups build the indexes themselves.
+                app.logger.exception('Could not build the %s indexes', type(self).__name__)
+            finally:
+                db.session.remove()
+            while not stopped.wait(self.check_seconds):
+                try:
+                    for model in models:
+                        self.refresh(model)
+                except Exception:
+                    app.logger.exception('Could not refresh the %s indexes', type(self).__name__)
+                finally:
+                    db.session.remove()
+
+    def reset(self):
+        """Drop the indexes and stop refreshing them."""
+        with self.lock, self.pending_lock:
+            self.indexes.clear()
+            self.versions.clear()
+            if self.refresher is not None:
+                self.stopped.set()
+                self.refresher = None
+
+
+def refresh_in_background(app, get_indexes, models):
+    """Start each worker's refresher for ``get_indexes(app)`` once it takes its first request.
+
+    WSGI servers have no startup hook, and `flask` commands should not pay
+    for indexes they never use.
+    """
+    @app.before_request
+    def start_refreshing():
+        indexes = get_indexes(app)
+        if isinstance(indexes, ModelIndexes) and indexes.refresher is None and app.config['INDEX_REFRESH']:
+            indexes.start_refreshing(app, models)
+
+
+def _apply_change(index, change):
+    model, id, name = change
+    if name is None:
+        index.remove(id)
+    else:
+        index.add(id, name)
+
+
+def table_version(model):
+    """``(row count, latest updated_at)`` of ``model``'s table."""
+    return db.session.query(func.count(model.id), func.max(model.updated_at)).one()
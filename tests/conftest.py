@@ -0,0 +1,104 @@
+"""Shared fixtures.
+
+Tests run against a throwaway SQLite file. Point TEST_DATABASE_URL at a
+scratch PostgreSQL database to run them there, including the ones marked
+``postgresql``; every test drops and recreates the tables.
+"""
+import datetime
+import os
+import tempfile
+import flask_migrate
+import pytest
+from sqlalchemy import text
+
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+
+from app import app as flask_app
+from autocomplete import get_autocomplete
+from models import db, Venue, Artist, Show
+from search import get_search_backend
+
+
+def pytest_collection_modifyitems(config, items):
+    with flask_app.app_context():
+        if db.engine.dialect.name == 'postgresql':
+            return
+    skip = pytest.mark.skip(reason='needs TEST_DATABASE_URL to point at PostgreSQL')
+    for item in items:
+        if 'postgresql' in item.keywords:
+            item.add_marker(skip)
+
+
+def reset_indexes(app):
+    """Drop what the app keeps in memory about the previous test's rows."""
+    backend = get_search_backend(app)
+    if hasattr(backend, 'reset'):
+        backend.reset()
+    get_autocomplete(app).reset()
+    app.extensions['entity_cache'].backend.clear()
+    app.jinja_env.fragment_cache.clear()
+
+
+@pytest.fixture
+def app():
+    flask_app.config.update(WTF_CSRF_ENABLED=False, INDEX_REFRESH=False)
+    with flask_app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        reset_indexes(flask_app)
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_venue(app):
+    count = iter(range(1, 1000000))
+
+    def make_venue(**values):
+        n = next(count)
+        venue = Venue(**{'name': f'Venue {n}', 'city': 'San Francisco', 'state': 'CA', 'address': f'{n} Main St',
+                         'genres': 'Jazz', **values})
+        db.session.add(venue)
+        db.session.commit()
+        return venue
+    return make_venue
+
+
+@pytest.fixture
+def make_artist(app):
+    count = iter(range(1, 1000000))
+
+    def make_artist(**values):
+        n = next(count)
+        artist = Artist(**{'name': f'Artist {n}', 'city': 'San Francisco', 'state': 'CA', 'genres': 'Jazz', **values})
+        db.session.add(artist)
+        db.session.commit()
+        return artist
+    return make_artist
+
+
+@pytest.fixture
+def make_show(app):
+    def make_show(venue, artist, start_time, minutes=None):
+        end_time = start_time + datetime.timedelta(minutes=minutes) if minutes else None
+        show = Show(venue_id=venue.id, artist_id=artist.id, start_time=start_time, end_time=end_time)
+        db.session.add(show)
+        db.session.commit()
+        return show
+    return make_show
+
+
+@pytest.fixture
+def migrated(app):
+    """The schema as `flask db upgrade` leaves it, with Show partitioned."""
+    db.drop_all()
+    db.session.execute(text('DROP TABLE IF EXISTS alembic_version'))
+    db.session.commit()
+    flask_migrate.upgrade()
+    return app
@@ -0,0 +1,61 @@
+import datetime
+from sqlalchemy import update
+from areas import rebuild_areas
+from models import db, utcnow, Venue, VenueArea
+from queries import AREA_AGE_HEADER
+
+
+def areas(client):
+    """``{(city, state): [(name, upcoming shows), ...]}`` as /api/v1/venues lists them."""
+    return {
+        (area['city'], area['state']): [(venue['name'], venue['num_upcoming_shows']) for venue in area['venues']]
+        for area in client.get('/api/v1/venues').get_json()['data']
+    }
+
+
+def venue_form(name, city, state):
+    return {'name': name, 'city': city, 'state': state, 'address': '1 Main St', 'genres': ['Jazz']}
+
+
+def test_venues_follow_creates_edits_deletes_and_new_shows(client, make_artist):
+    artist_id = make_artist().id
+    assert client.post('/venues/create', data=venue_form('Fillmore', 'Austin', 'TX')).status_code == 302
+    assert client.post('/venues/create', data=venue_form('Bowery Ballroom', 'Dallas', 'TX')).status_code == 302
+    assert areas(client) == {('Austin', 'TX'): [('Fillmore', 0)], ('Dallas', 'TX'): [('Bowery Ballroom', 0)]}
+    fillmore_id = db.session.query(Venue.id).filter(Venue.name == 'Fillmore').scalar()
+
+    # Moving the venue recomputes the area it left as well as the one it joined.
+    assert client.post(f'/venues/{fillmore_id}/edit', data=venue_form('The Fillmore', 'Dallas', 'TX')).status_code == 302
+    assert areas(client) == {('Dallas', 'TX'): [('Bowery Ballroom', 0), ('The Fillmore', 0)]}
+
+    start = datetime.datetime.now() + datetime.timedelta(days=1)
+    assert client.post('/shows/create', data={
+        'venue_id': str(fillmore_id), 'artist_id': str(artist_id), 'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration': '60',
+    }).status_code == 302
+    assert areas(client) == {('Dallas', 'TX'): [('Bowery Ballroom', 0), ('The Fillmore', 1)]}
+    assert f'href="/venues/{fillmore_id}"'.encode() in client.get('/venues').data
+
+    assert client.post(f'/venues/{fillmore_id}/delete').status_code == 302
+    assert areas(client) == {('Dallas', 'TX'): [('Bowery Ballroom', 0)]}
+    assert f'href="/venues/{fillmore_id}"'.encode() not in client.get('/venues').data
+
+
+def test_venues_report_the_age_of_the_oldest_area(client, make_venue):
+    make_venue(city='Austin')
+    make_venue(city='Dallas')
+    rebuild_areas()
+    db.session.commit()
+    assert client.get('/venues').headers[AREA_AGE_HEADER] == '0'
+
+    # One area left behind, as rows written around the app leave them until `flask areas refresh`.
+    db.session.execute(update(VenueArea).where(VenueArea.city == 'Austin')
+                       .values(refreshed_at=utcnow() - datetime.timedelta(minutes=10)))
+    db.session.commit()
+    for response in (client.get('/venues'), client.get('/api/v1/venues')):
+        assert 600 <= int(response.headers[AREA_AGE_HEADER]) < 660
+    assert client.get('/api/v1/venues').get_json()['age'] >= 600
+
+    result = client.application.test_cli_runner().invoke(args=['areas', 'refresh'])
+    assert 'Refreshed 2 area(s).' in result.output
+    assert client.get('/venues').headers[AREA_AGE_HEADER] == '0'
@@ -0,0 +1,69 @@
+import gzip
+import os
+import re
+import shutil
+import pytest
+import assets
+from app import app as flask_app
+from assets import BUILD_DIR, IMMUTABLE_MAX_AGE
+
+
+@pytest.fixture(scope='module')
+def build(tmp_path_factory):
+    """A copy of the static folder, built once for the module (brotli at quality 11 is slow)."""
+    static_folder = str(tmp_path_factory.mktemp('assets') / 'static')
+    shutil.copytree(flask_app.static_folder, static_folder)
+    return static_folder, assets.build_assets(static_folder)
+
+
+@pytest.fixture
+def built(app, build, monkeypatch):
+    """The manifest of the build, which the app serves."""
+    static_folder, manifest = build
+    monkeypatch.setattr(app, 'static_folder', static_folder)
+    monkeypatch.setitem(app.extensions, 'asset_manifest', manifest)
+    return manifest
+
+
+def test_pages_link_the_fingerprinted_builds(client, built):
+    stylesheet = built['css/fyyur.css']
+    assert re.fullmatch(rf'{BUILD_DIR}/css/fyyur\.[0-9a-f]{{12}}\.css', stylesheet)
+    page = client.get('/').get_data(as_text=True)
+    assert f'/static/{stylesheet}' in page
+    assert f'/static/{built["js/libs/jquery-1.11.1.min.js"]}' in page
+    # Bundled parts are not linked on their own.
+    assert '/static/css/main.css' not in page
+
+    with client.application.test_request_context():
+        assert assets.asset_url('css/main.css') == f'/static/{built["css/main.css"]}'
+        assert assets.asset_url('not/built.txt') == '/static/not/built.txt'
+
+
+@pytest.mark.parametrize('accept, encoding, suffix', [
+    ('br, gzip', 'br', '.br'),
+    ('gzip', 'gzip', '.gz'),
+    ('identity', None, ''),
+])
+def test_built_files_are_served_precompressed_and_immutable(client, built, accept, encoding, suffix):
+    if encoding == 'br' and assets.brotli is None:
+        pytest.skip('brotli is not installed')
+    stylesheet = built['css/fyyur.css']
+    response = client.get(f'/static/{stylesheet}', headers={'Accept-Encoding': accept})
+    assert response.status_code == 200
+    assert response.content_encoding == encoding
+    assert response.mimetype == 'text/css'
+    assert response.cache_control.immutable and response.cache_control.public
+    assert response.cache_control.max_age == IMMUTABLE_MAX_AGE
+    assert 'Accept-Encoding' in response.vary
+    with open(os.path.join(client.application.static_folder, stylesheet + suffix), 'rb') as f:
+        assert response.data == f.read()
+    if encoding == 'gzip':
+        with open(os.path.join(client.application.static_folder, stylesheet), 'rb') as f:
+            assert gzip.decompress(response.data) == f.read()
+
+
+def test_unbuilt_static_files_are_not_marked_immutable(client, built):
+    response = client.get('/static/css/main.css', headers={'Accept-Encoding': 'br, gzip'})
+    assert response.status_code == 200
+    assert response.content_encoding is None
+    assert not response.cache_control.immutable
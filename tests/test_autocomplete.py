@@ -0,0 +1,102 @@
+import datetime
+import time
+from sqlalchemy import delete, insert, update
+from autocomplete import get_autocomplete
+from instrumentation import assert_max_queries
+from models import db, Venue, Artist
+
+
+def names(client, q):
+    return [match['name'] for match in client.get(f'/api/v1/venues/autocomplete?q={q}').get_json()['data']]
+
+
+def test_committed_writes_reach_the_index_and_rolled_back_ones_do_not(client, make_venue):
+    venue = make_venue(name='Park Square Live Music')
+    venue_id = venue.id
+    assert names(client, 'squ') == ['Park Square Live Music']
+
+    db.session.add(Venue(name='Square Dance Hall', city='Austin', state='TX', address='1 Main St', genres='Folk'))
+    db.session.flush()
+    db.session.rollback()
+    assert names(client, 'squ') == ['Park Square Live Music']
+
+    db.session.get(Venue, venue_id).name = 'Park Circle Live Music'
+    db.session.commit()
+    assert names(client, 'squ') == []
+    assert names(client, 'circ') == ['Park Circle Live Music']
+
+    db.session.delete(db.session.get(Venue, venue_id))
+    db.session.commit()
+    assert names(client, 'park') == []
+
+
+def test_writes_from_other_processes_are_picked_up_by_the_refresh(client, make_venue):
+    venue_id = make_venue(name='Park Square Live Music').id
+    completer = get_autocomplete()
+    assert names(client, 'park') == ['Park Square Live Music']
+
+    # Core statements skip the session events, as another worker's writes would.
+    venues = Venue.__table__
+    db.session.execute(update(venues).where(venues.c.id == venue_id).values(name='Park Circle Live Music'))
+    db.session.execute(insert(venues).values(name='Parkside Lounge', city='Austin', state='TX', address='1 Main St',
+                                             genres='Folk'))
+    db.session.commit()
+    # Lookups only read the index.
+    with assert_max_queries(0):
+        assert [name for id, name in completer.complete(Venue, 'park')] == ['Park Square Live Music']
+
+    completer.refresh(Venue)
+    assert names(client, 'park') == ['Park Circle Live Music', 'Parkside Lounge']
+
+    db.session.execute(delete(venues).where(venues.c.id == venue_id))
+    db.session.commit()
+    completer.refresh(Venue)
+    assert names(client, 'park') == ['Parkside Lounge']
+    assert len(completer.index_for(Venue)) == 1
+
+
+def test_the_refresh_rereads_rows_committed_behind_the_latest_stamp(app, make_venue):
+    venue_id = make_venue(name='Park Square Live Music').id
+    latest = make_venue(name='Fillmore').updated_at
+    completer = get_autocomplete()
+    completer.index_for(Venue)
+
+    # Stamped before the latest row seen, as a transaction flushed earlier but committed later would be.
+    venues = Venue.__table__
+    db.session.execute(update(venues).where(venues.c.id == venue_id)
+                       .values(name='Park Circle Live Music', updated_at=latest - datetime.timedelta(seconds=1)))
+    db.session.commit()
+    completer.refresh(Venue)
+    assert [name for id, name in completer.complete(Venue, 'park')] == ['Park Circle Live Music']
+
+
+def test_the_first_request_starts_refreshing_the_indexes_in_the_background(app, client, make_venue, monkeypatch):
+    venue_id = make_venue(name='Park Square Live Music').id
+    completer = get_autocomplete()
+    monkeypatch.setitem(app.config, 'INDEX_REFRESH', True)
+    monkeypatch.setattr(completer, 'check_seconds', 0.05)
+
+    client.get('/')
+    refresher = completer.refresher
+    assert wait_for(lambda: set(completer.indexes) == {Venue, Artist})
+    assert completer.indexes[Venue].complete('park', 10)[0][1] == 'Park Square Live Music'
+    client.get('/')
+    assert completer.refresher is refresher
+
+    venues = Venue.__table__
+    db.session.execute(update(venues).where(venues.c.id == venue_id).values(name='Park Circle Live Music'))
+    db.session.commit()
+    assert wait_for(lambda: completer.indexes[Venue].complete('park', 10) == [(venue_id, 'Park Circle Live Music')])
+
+    completer.reset()
+    refresher.join(timeout=5)
+    assert not refresher.is_alive()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
@@ -0,0 +1,142 @@
+import csv
+import datetime
+import json
+import sqlite3
+import threading
+import pytest
+import app as app_module
+import bookings
+from sqlalchemy import insert
+from models import db, Show
+from partitions import month_start, next_month
+
+START = datetime.datetime(2035, 4, 1, 20, 0)
+
+
+@pytest.mark.parametrize('batch_size, overlap', [
+    (2, 'Overlaps another show at this venue or by this artist.'),
+    (10, 'Overlaps an earlier show in this file at this venue or by this artist.'),
+], ids=['across-batches', 'within-a-batch'])
+def test_import_sets_end_times_and_rejects_overlapping_shows(app, make_venue, make_artist, make_show, tmp_path,
+                                                             batch_size, overlap):
+    venue, other_venue, artist, other_artist = make_venue(), make_venue(), make_artist(), make_artist()
+    booked = make_show(venue, artist, START, minutes=60).id
+    ids = venue.id, other_venue.id, artist.id, other_artist.id
+    records = [
+        # Overlaps the show already booked at the venue.
+        (ids[0], ids[3], START + datetime.timedelta(minutes=30), 60),
+        (ids[1], ids[3], START, 90),
+        # Overlaps the previous record's artist: committed already with batches of two.
+        (ids[1], ids[3], START + datetime.timedelta(minutes=60), 60),
+        (ids[1], ids[3], START + datetime.timedelta(minutes=90), None),
+    ]
+    path = tmp_path / 'shows.ndjson'
+    path.write_text(''.join(
+        json.dumps({'venue_id': venue_id, 'artist_id': artist_id, 'start_time': start.isoformat(), 'duration': minutes})
+        + '\n' for venue_id, artist_id, start, minutes in records
+    ))
+
+    result = app.test_cli_runner().invoke(args=['import', 'shows', str(path), '--batch-size', str(batch_size)])
+    assert result.exit_code == 0, result.output
+
+    db.session.remove()
+    shows = Show.query.filter(Show.venue_id == ids[1]).order_by(Show.start_time).all()
+    assert [(show.start_time, show.end_time) for show in shows] == [
+        (START, START + datetime.timedelta(minutes=90)),
+        # No duration column: the form's default of two hours.
+        (START + datetime.timedelta(minutes=90), START + datetime.timedelta(minutes=210)),
+    ]
+    with open(f'{path}.rejects.csv', newline='') as f:
+        rejected = [(int(row['record']), json.loads(row['errors'])) for row in csv.DictReader(f)]
+    assert rejected == [
+        (1, {'start_time': ['Overlaps another show at this venue or by this artist.']}),
+        (3, {'start_time': [overlap]}),
+    ]
+    # The imported shows are seen by the next booking.
+    assert [show.id for show in bookings.find_conflicts(ids[1], ids[2], START, START + datetime.timedelta(hours=1))] \
+        == [booked, shows[0].id]
+
+
+def race(app, monkeypatch, submissions):
+    """POST ``submissions`` to /shows/create at once; the status of each and whether it was refused as a conflict."""
+    checked = threading.Barrier(len(submissions), timeout=2)
+
+    def find_conflicts(*args):
+        conflicts = bookings.find_conflicts(*args)
+        # Every request has checked before any commits, unless bookings are serialised.
+        try:
+            checked.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return conflicts
+    monkeypatch.setattr(app_module, 'find_conflicts', find_conflicts)
+
+    statuses = []
+
+    def submit(data):
+        response = app.test_client().post('/shows/create', data=data)
+        # Listed shows redirect; a conflict renders the form again with the reason.
+        statuses.append((response.status_code, b'already booked' in response.data))
+    threads = [threading.Thread(target=submit, args=(data,)) for data in submissions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    db.session.remove()
+    return sorted(statuses)
+
+
+def submission(venue_id, artist_id, start, minutes):
+    return {'venue_id': str(venue_id), 'artist_id': str(artist_id), 'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': str(minutes)}
+
+
+def test_only_one_of_two_racing_overlapping_bookings_is_listed(app, make_venue, make_artist, monkeypatch):
+    venue, artist = make_venue(), make_artist()
+    data = submission(venue.id, artist.id, START, 60)
+    assert race(app, monkeypatch, [data, data]) == [(200, True), (302, False)]
+    assert Show.query.count() == 1
+
+
+def test_the_booking_lock_holds_off_other_processes_on_sqlite(app):
+    if db.engine.dialect.name != 'sqlite':
+        pytest.skip('advisory locks are covered by the partition race below')
+    path = db.engine.url.database
+    with bookings.booking_lock([1], [1]):
+        # Another process's connection.
+        other = sqlite3.connect(path, timeout=0.1)
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            other.execute('UPDATE "Venue" SET name = name')
+        db.session.commit()
+    other.execute('UPDATE "Venue" SET name = name')
+    other.close()
+
+
+@pytest.mark.postgresql
+def test_overlapping_bookings_in_different_partitions_race_safely(migrated, make_venue, make_artist, monkeypatch):
+    venue, artist = make_venue(), make_artist()
+    # Across the end of this month, so each lands in its own partition.
+    boundary = next_month(month_start(datetime.datetime.now()))
+    assert race(migrated, monkeypatch, [
+        submission(venue.id, artist.id, boundary - datetime.timedelta(minutes=30), 120),
+        submission(venue.id, artist.id, boundary, 60),
+    ]) == [(200, True), (302, False)]
+    assert Show.query.count() == 1
+
+
+def test_shows_written_outside_the_session_still_conflict(app, client, make_venue, make_artist):
+    venue, artist = make_venue(), make_artist()
+    venue_id, artist_id = venue.id, artist.id
+    # As another worker or `flask import shows` would write it.
+    db.session.execute(insert(Show.__table__).values(
+        venue_id=venue_id, artist_id=artist_id, start_time=START, end_time=START + datetime.timedelta(hours=2)))
+    db.session.commit()
+
+    response = client.post('/shows/create', data={
+        'venue_id': str(venue_id), 'artist_id': str(artist_id),
+        'start_time': (START + datetime.timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M:%S'), 'duration': '60',
+    })
+    assert response.status_code == 200
+    assert b'already booked' in response.data
+    db.session.remove()
+    assert Show.query.count() == 1
@@ -0,0 +1,64 @@
+import datetime
+from sqlalchemy import update
+from areas import rebuild_areas
+from instrumentation import assert_max_queries
+from models import db, Venue, Artist
+
+
+def fragment_keys(app, kind):
+    return [key for key in app.jinja_env.fragment_cache.entries if key.startswith(f"fragment:'{kind}'")]
+
+
+def test_show_cards_are_reused_until_the_show_venue_or_artist_changes(app, client, make_venue, make_artist, make_show):
+    venue, artist = make_venue(name='Fillmore'), make_artist(name='Guns N Petals')
+    make_show(venue, artist, datetime.datetime.now() + datetime.timedelta(days=1))
+    venue_id, artist_id = venue.id, artist.id
+
+    client.get('/shows')
+    client.get('/shows')
+    assert len(fragment_keys(app, 'show-card')) == 1
+
+    db.session.get(Artist, artist_id).name = 'Guns N Roses'
+    db.session.commit()
+    assert b'Guns N Roses' in client.get('/shows').data
+
+    db.session.get(Venue, venue_id).name = 'The Fillmore'
+    db.session.commit()
+    assert b'The Fillmore' in client.get('/shows').data
+    assert len(fragment_keys(app, 'show-card')) == 3
+
+
+def test_venue_items_are_keyed_by_id_and_updated_at(app, client, make_venue):
+    venue = make_venue(name='Fillmore')
+    venue_id, updated_at = venue.id, venue.updated_at
+    rebuild_areas()
+    db.session.commit()
+
+    client.get('/venues')
+    (key,) = fragment_keys(app, 'venue-item')
+    assert key == f"fragment:'venue-item':{venue_id}:{updated_at.isoformat()!r}"
+
+    response = client.post(f'/venues/{venue_id}/edit', data={
+        'name': 'The Fillmore', 'city': 'San Francisco', 'state': 'CA', 'address': '1 Main St', 'genres': ['Jazz'],
+    })
+    assert response.status_code == 302
+    assert b'The Fillmore' in client.get('/venues').data
+
+
+def test_detail_pages_revalidate_with_one_query_and_follow_other_processes(client, make_venue, make_artist, make_show):
+    venue, artist = make_venue(name='Fillmore'), make_artist(name='Guns N Petals')
+    make_show(venue, artist, datetime.datetime.now() + datetime.timedelta(days=1))
+    venue_id, artist_id = venue.id, artist.id
+
+    response = client.get(f'/venues/{venue_id}')
+    etag = response.headers['ETag']
+    with assert_max_queries(1):
+        assert client.get(f'/venues/{venue_id}', headers={'If-None-Match': etag}).status_code == 304
+
+    # A Core statement skips the session events, as another worker's write would.
+    artists = Artist.__table__
+    db.session.execute(update(artists).where(artists.c.id == artist_id).values(name='Guns N Roses'))
+    db.session.commit()
+    response = client.get(f'/venues/{venue_id}', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Guns N Roses' in response.data
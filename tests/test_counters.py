@@ -0,0 +1,76 @@
+import datetime
+from sqlalchemy import update
+from counters import recount, roll_shows
+from models import db, Venue, Artist
+
+
+def counters(model, id):
+    row = db.session.get(model, id)
+    db.session.refresh(row)
+    return row.upcoming_shows_count, row.past_shows_count
+
+
+def create_show(client, venue_id, artist_id, start):
+    return client.post('/shows/create', data={
+        'venue_id': str(venue_id), 'artist_id': str(artist_id), 'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'duration': '60',
+    })
+
+
+def test_counters_follow_created_shows_and_deleted_venues(client, make_venue, make_artist):
+    now = datetime.datetime.now()
+    venue, other_venue, artist = make_venue(), make_venue(), make_artist()
+    venue_id, other_venue_id, artist_id = venue.id, other_venue.id, artist.id
+
+    assert create_show(client, venue_id, artist_id, now + datetime.timedelta(days=1)).status_code == 302
+    assert create_show(client, venue_id, artist_id, now - datetime.timedelta(days=1)).status_code == 302
+    assert create_show(client, other_venue_id, artist_id, now + datetime.timedelta(days=2)).status_code == 302
+    assert counters(Venue, venue_id) == (1, 1)
+    assert counters(Venue, other_venue_id) == (1, 0)
+    assert counters(Artist, artist_id) == (2, 1)
+
+    assert client.post(f'/venues/{venue_id}/delete').status_code == 302
+    assert db.session.get(Venue, venue_id) is None
+    assert counters(Artist, artist_id) == (1, 0)
+
+
+def test_roll_moves_started_shows_from_upcoming_to_past(app, make_venue, make_artist, make_show):
+    now = datetime.datetime.now()
+    venue, artist = make_venue(), make_artist()
+    venue_id, artist_id = venue.id, artist.id
+    make_show(venue, artist, now + datetime.timedelta(hours=1), minutes=60)
+    make_show(venue, artist, now + datetime.timedelta(days=3), minutes=60)
+    recount()
+    assert counters(Venue, venue_id) == (2, 0)
+
+    assert roll_shows(now) == 0
+    assert roll_shows(now + datetime.timedelta(days=1)) == 1
+    assert counters(Venue, venue_id) == counters(Artist, artist_id) == (1, 1)
+    # Each show is rolled once.
+    assert roll_shows(now + datetime.timedelta(days=1)) == 0
+    assert counters(Venue, venue_id) == (1, 1)
+
+
+def test_check_reports_drift_and_fix_rewrites_it(app, make_venue, make_artist, make_show):
+    venue, artist = make_venue(), make_artist()
+    venue_id = venue.id
+    make_show(venue, artist, datetime.datetime.now() + datetime.timedelta(days=1), minutes=60)
+    recount()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['counters', 'check'])
+    assert result.exit_code == 0, result.output
+    assert '0 drifted counter row(s)' in result.output
+
+    db.session.execute(update(Venue).where(Venue.id == venue_id).values(upcoming_shows_count=5))
+    db.session.commit()
+    result = runner.invoke(args=['counters', 'check'])
+    assert result.exit_code == 1
+    assert f'Venue {venue_id}: upcoming 5 != 1, past 0 != 0' in result.output
+    assert '1 drifted counter row(s);' in result.output
+
+    result = runner.invoke(args=['counters', 'check', '--fix'])
+    assert result.exit_code == 0, result.output
+    assert '1 drifted counter row(s) fixed' in result.output
+    assert counters(Venue, venue_id) == (1, 0)
+    assert runner.invoke(args=['counters', 'check']).exit_code == 0
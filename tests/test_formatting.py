@@ -0,0 +1,45 @@
+import datetime
+import babel.dates
+import dateutil.parser
+import pytest
+from formatting import NAMED_FORMATS, DateTimeFormatter
+
+VALUES = [
+    datetime.datetime(2019, 5, 21, 21, 30),
+    datetime.datetime(2020, 2, 29, 0, 0),
+    datetime.datetime(2021, 12, 31, 12, 0, 59, 999999),
+    datetime.datetime(2035, 4, 1, 9, 5),
+    datetime.datetime(2024, 7, 4, 20, 0, tzinfo=datetime.timezone(datetime.timedelta(hours=-7))),
+]
+FORMATS = ['full', 'medium', "yyyy-MM-dd HH:mm", "EEE d MMM y, h:mm a"]
+
+
+def babel_format(value, format, locale):
+    if isinstance(value, str):
+        value = dateutil.parser.parse(value)
+    return babel.dates.format_datetime(value, NAMED_FORMATS.get(format, format), locale=locale)
+
+
+@pytest.mark.parametrize('locale', ['en', 'fr'])
+@pytest.mark.parametrize('format', FORMATS)
+def test_format_matches_babel(format, locale):
+    formatter = DateTimeFormatter()
+    for value in VALUES:
+        assert formatter.format(value, format, locale) == babel_format(value, format, locale)
+        # Memoized output is the same.
+        assert formatter.format(value, format, locale) == babel_format(value, format, locale)
+
+
+@pytest.mark.parametrize('format', FORMATS)
+def test_format_many_matches_babel(format):
+    formatter = DateTimeFormatter()
+    values = VALUES + [value.isoformat() for value in VALUES] + VALUES
+    assert formatter.format_many(values, format) == [babel_format(value, format, 'en') for value in values]
+    assert formatter.cache_info()['formatted']['hits'] >= len(VALUES)
+
+
+def test_values_that_are_not_datetimes_format_as_empty():
+    formatter = DateTimeFormatter()
+    assert formatter.format(None) == ''
+    assert formatter.format('not a date') == ''
+    assert formatter.format_many([None, 'not a date', VALUES[0]]) == ['', '', babel_format(VALUES[0], 'medium', 'en')]
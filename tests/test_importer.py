@@ -0,0 +1,100 @@
+import csv
+import json
+import pytest
+import importer
+from models import db, Venue, Artist
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(dict.fromkeys(key for row in rows for key in row)))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def read_rejects(path):
+    with open(path, newline='') as f:
+        return [(int(row['record']), sorted(json.loads(row['errors']))) for row in csv.DictReader(f)]
+
+
+def venue(name, **values):
+    return {'name': name, 'city': 'Austin', 'state': 'TX', 'address': '1 Main St', 'genres': 'Jazz', **values}
+
+
+def artist(name, **values):
+    return {'name': name, 'city': 'Austin', 'state': 'TX', 'genres': 'Jazz', **values}
+
+
+def test_an_interrupted_import_resumes_after_the_last_committed_batch(app, tmp_path, monkeypatch):
+    path = tmp_path / 'venues.csv'
+    write_csv(path, [
+        venue('Fillmore'),
+        venue('No City', city=''),
+        venue('Bowery Ballroom'),
+        venue('Troubadour'),
+        venue('Roxy'),
+        venue('Fillmore'),
+    ])
+    runner = app.test_cli_runner()
+    insert_batch = importer.insert_batch
+    calls = []
+
+    def fail_second_batch(loader, rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise RuntimeError('connection lost')
+        return insert_batch(loader, rows)
+    monkeypatch.setattr(importer, 'insert_batch', fail_second_batch)
+
+    result = runner.invoke(args=['import', 'venues', str(path), '--batch-size', '2'])
+    assert isinstance(result.exception, RuntimeError)
+    with open(f'{path}.checkpoint') as f:
+        checkpoint = json.load(f)
+    assert (checkpoint['records'], checkpoint['inserted'], checkpoint['rejected'], checkpoint['complete']) == \
+        (3, 2, 1, False)
+    db.session.remove()
+    assert sorted(name for (name,) in db.session.query(Venue.name)) == ['Bowery Ballroom', 'Fillmore']
+
+    monkeypatch.setattr(importer, 'insert_batch', insert_batch)
+    result = runner.invoke(args=['import', 'venues', str(path), '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert 'Imported venues' in result.output and '4 inserted, 2 rejected' in result.output
+    db.session.remove()
+    assert sorted(name for (name,) in db.session.query(Venue.name)) == ['Bowery Ballroom', 'Fillmore', 'Roxy',
+                                                                       'Troubadour']
+    # Each reject once, though the first run got past record 2 before failing.
+    assert read_rejects(f'{path}.rejects.csv') == [(2, ['city']), (6, ['name'])]
+
+    result = runner.invoke(args=['import', 'venues', str(path)])
+    assert 'was already imported (4 inserted)' in result.output
+
+
+@pytest.mark.parametrize('kind, model, make', [('venues', Venue, venue), ('artists', Artist, artist)])
+def test_rejected_records_are_written_with_their_errors(app, make_venue, make_artist, tmp_path, kind, model, make):
+    (make_venue if model is Venue else make_artist)(name='Already Listed')
+    path = tmp_path / f'{kind}.csv'
+    missing_name = make('')
+    write_csv(path, [
+        make('Fillmore'),
+        missing_name,
+        make('Bad State', state='ZZ'),
+        make('Already Listed'),
+        make('Fillmore'),
+        make('Bad Link', facebook_link='not a url'),
+    ])
+
+    result = app.test_cli_runner().invoke(args=['import', kind, str(path)])
+    assert result.exit_code == 0, result.output
+    assert '1 inserted, 5 rejected' in result.output
+    assert read_rejects(f'{path}.rejects.csv') == [
+        (2, ['name']),
+        (3, ['state']),
+        (4, ['name']),
+        (5, ['name']),
+        (6, ['facebook_link']),
+    ]
+    with open(f'{path}.rejects.csv', newline='') as f:
+        # The record as read, so it can be fixed and imported again.
+        assert json.loads(next(csv.DictReader(f))['data']) == {**missing_name, 'facebook_link': ''}
+    db.session.remove()
+    assert sorted(name for (name,) in db.session.query(model.name)) == ['Already Listed', 'Fillmore']
@@ -0,0 +1,61 @@
+import logging
+import pytest
+from flask import Response
+from instrumentation import assert_max_queries, collect_queries
+from models import db, Venue
+
+
+def load_venues_one_by_one(ids):
+    # The N+1 shape: one statement per row, differing only in parameters.
+    for id in ids:
+        db.session.execute(db.select(Venue.name).where(Venue.id == id)).all()
+
+
+def test_assert_max_queries_passes_within_the_budget(app, make_venue):
+    venue_id = make_venue().id
+    with assert_max_queries(1) as stats:
+        db.session.execute(db.select(Venue).where(Venue.id == venue_id)).all()
+    assert stats.count == 1
+
+
+def test_assert_max_queries_fails_over_the_budget_and_lists_the_statements(app, make_venue):
+    ids = [make_venue().id for _ in range(3)]
+    with pytest.raises(AssertionError) as failure:
+        with assert_max_queries(2):
+            load_venues_one_by_one(ids)
+    message = str(failure.value)
+    assert message.startswith('3 SQL statements executed, expected at most 2:')
+    assert message.count('SELECT "Venue".name') == 3
+
+
+def test_assert_max_queries_counts_the_statements_of_a_test_client_request(client, make_venue):
+    make_venue()
+    with pytest.raises(AssertionError, match='expected at most 0'):
+        with assert_max_queries(0):
+            client.get('/venues')
+
+
+def test_repeated_statement_shapes_are_reported(app, make_venue):
+    ids = [make_venue().id for _ in range(6)]
+    with collect_queries() as stats:
+        load_venues_one_by_one(ids)
+        db.session.execute(db.select(Venue.id)).all()
+    ((statement, count),) = stats.repeated(5)
+    assert 'WHERE "Venue".id = ?' in statement or 'WHERE "Venue".id = %(id_1)s' in statement
+    assert count == 6
+
+
+def test_requests_flag_likely_n_plus_one_in_the_log_and_headers(app, make_venue, caplog):
+    ids = [make_venue().id for _ in range(app.config['SQL_REPEATED_QUERY_THRESHOLD'])]
+    app.config['SQL_DEBUG_HEADERS'] = True
+    try:
+        with app.test_request_context('/venues'), caplog.at_level(logging.WARNING, logger=app.logger.name):
+            app.preprocess_request()
+            load_venues_one_by_one(ids)
+            response = app.process_response(Response())
+    finally:
+        app.config['SQL_DEBUG_HEADERS'] = False
+    assert response.headers['X-SQL-Queries'] == str(len(ids))
+    assert response.headers['X-SQL-Repeated'] == '1'
+    assert any(record.getMessage().startswith(f'Possible N+1 in venues: {len(ids)} executions of')
+               for record in caplog.records)
@@ -0,0 +1,75 @@
+import os
+import subprocess
+import sys
+import pytest
+from metrics import BUCKETS, MetricsStore, render
+
+LABELS = (('endpoint', 'venues'), ('method', 'GET'))
+
+
+def flush_as(monkeypatch, store, pid):
+    """Flush ``store`` as if it belonged to worker ``pid``."""
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'getpid', lambda: pid)
+        store.flush()
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def record_request(store, seconds):
+    store.inc('fyyur_http_requests_in_progress', ())
+    store.inc('fyyur_http_requests_total', (*LABELS, ('status', '200')))
+    store.observe('fyyur_http_request_duration_seconds', LABELS, seconds)
+
+
+@pytest.mark.parametrize('other_alive', [True, False], ids=['live-worker', 'exited-worker'])
+def test_stores_sharing_a_directory_merge_and_drop_the_gauges_of_exited_workers(tmp_path, monkeypatch, other_alive):
+    other, this = MetricsStore(str(tmp_path)), MetricsStore(str(tmp_path))
+    record_request(other, 0.02)
+    record_request(other, 0.3)
+    flush_as(monkeypatch, other, os.getppid() if other_alive else exited_pid())
+    record_request(this, 0.02)
+
+    values, histograms = this.collect()
+    assert values['fyyur_http_requests_total', (*LABELS, ('status', '200'))] == 3
+    assert values['fyyur_http_requests_in_progress', ()] == (3 if other_alive else 1)
+    histogram = histograms['fyyur_http_request_duration_seconds', LABELS]
+    assert histogram[BUCKETS.index(0.025)] == 2 and histogram[BUCKETS.index(0.5)] == 1
+    assert histogram[-1] == pytest.approx(0.34)
+
+
+def test_the_exposition_format():
+    store = MetricsStore()
+    store.inc('fyyur_http_requests_total', (('endpoint', 'show "venue"'), ('method', 'GET'), ('status', '200')), 2)
+    store.observe('fyyur_db_time_seconds', LABELS, 0.5)
+    store.observe('fyyur_db_time_seconds', LABELS, 20)
+
+    lines = render(*store.collect()).splitlines()
+    assert lines[:2] == [
+        '# HELP fyyur_http_request_duration_seconds Time from receiving a request to sending the last byte of its response.',
+        '# TYPE fyyur_http_request_duration_seconds histogram',
+    ]
+    assert 'fyyur_http_requests_total{endpoint="show \\"venue\\"",method="GET",status="200"} 2' in lines
+    db_time = [line for line in lines if line.startswith('fyyur_db_time_seconds')]
+    assert db_time[BUCKETS.index(0.25)] == 'fyyur_db_time_seconds_bucket{endpoint="venues",method="GET",le="0.25"} 0'
+    assert db_time[BUCKETS.index(0.5)] == 'fyyur_db_time_seconds_bucket{endpoint="venues",method="GET",le="0.5"} 1'
+    assert db_time[len(BUCKETS) - 1:] == [
+        'fyyur_db_time_seconds_bucket{endpoint="venues",method="GET",le="+Inf"} 2',
+        'fyyur_db_time_seconds_sum{endpoint="venues",method="GET"} 20.5',
+        'fyyur_db_time_seconds_count{endpoint="venues",method="GET"} 2',
+    ]
+
+
+def test_metrics_endpoint_counts_requests(client):
+    # Counted once the response is closed, i.e. its body fully sent.
+    client.get('/').close()
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    assert '# TYPE fyyur_http_requests_total counter' in body
+    assert 'fyyur_http_requests_total{endpoint="index",method="GET",status="200"}' in body
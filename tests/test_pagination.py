@@ -0,0 +1,48 @@
+import base64
+import datetime
+import pytest
+
+
+def page(client, **args):
+    body = client.get('/api/v1/shows', query_string={'per_page': 2, **args}).get_json()
+    return [show['id'] for show in body['data']], body['next'], body['prev']
+
+
+@pytest.fixture
+def show_ids(make_venue, make_artist, make_show):
+    """Seven shows, newest first as /shows lists them, five of them sharing one start time."""
+    tied = datetime.datetime(2035, 4, 1, 20, 0)
+    starts = [tied + datetime.timedelta(days=1)] + [tied] * 5 + [tied - datetime.timedelta(days=1)]
+    # Separate venues and artists, so that the tied shows are not double bookings.
+    ids = [make_show(make_venue(), make_artist(), start).id for start in starts]
+    # Ties are ordered by id, descending like the start times.
+    return [ids[0], *reversed(ids[1:6]), ids[6]]
+
+
+def test_next_and_prev_cursors_walk_across_tied_start_times(client, show_ids):
+    pages = []
+    ids, next_cursor, prev_cursor = page(client)
+    assert prev_cursor is None
+    pages.append(ids)
+    while next_cursor:
+        ids, next_cursor, prev_cursor = page(client, after=next_cursor)
+        pages.append(ids)
+    assert pages == [show_ids[0:2], show_ids[2:4], show_ids[4:6], show_ids[6:7]]
+
+    back = []
+    while prev_cursor:
+        ids, next_cursor, prev_cursor = page(client, before=prev_cursor)
+        back.append(ids)
+    assert back == pages[-2::-1]
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    base64.urlsafe_b64encode(b'{"start_time": 1}').decode(),
+    base64.urlsafe_b64encode(b'["yesterday", 1]').decode(),
+    base64.urlsafe_b64encode(b'[1, 2, 3]').decode(),
+], ids=['not-base64', 'not-a-list', 'bad-date', 'wrong-length'])
+def test_a_malformed_cursor_gives_the_first_page(client, show_ids, cursor):
+    first = page(client)
+    assert page(client, after=cursor) == first
+    assert page(client, before=cursor) == first
@@ -0,0 +1,93 @@
+import datetime
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from counters import recount, roll_shows
+from models import db, Venue, Artist, Show, ShowArchive
+from partitions import create_partition, month_start, partition_name
+
+
+def test_archive_moves_old_shows_and_keeps_them_counted(app, client, make_venue, make_artist, make_show):
+    now = datetime.datetime.now()
+    venue = make_venue(name='The Fillmore')
+    old, recent = make_artist(name='Old Timers'), make_artist(name='Recent Arrivals')
+    old_show = make_show(venue, old, now - datetime.timedelta(days=400), minutes=60).id
+    make_show(venue, recent, now - datetime.timedelta(days=10), minutes=60)
+    make_show(venue, recent, now + datetime.timedelta(days=10), minutes=60)
+    venue_id, old_id = venue.id, old.id
+    recount()
+    roll_shows(now)
+    # Cached, as in the web processes the archive command does not run in.
+    assert b'Old Timers' in client.get(f'/venues/{venue_id}').data
+    assert b'The Fillmore' in client.get(f'/artists/{old_id}').data
+
+    result = app.test_cli_runner().invoke(args=['shows', 'archive', '--after-days', '365'])
+    assert result.exit_code == 0, result.output
+    assert 'Archived 1 show(s)' in result.output
+
+    db.session.remove()
+    (archived,) = ShowArchive.query.all()
+    assert archived.id == old_show
+    assert db.session.get(Show, old_show) is None
+    venue = db.session.get(Venue, venue_id)
+    assert (venue.upcoming_shows_count, venue.past_shows_count) == (1, 2)
+    # Stamped with the archive, so the pages of both go stale in every process.
+    assert venue.updated_at == db.session.get(Artist, old_id).updated_at == archived.archived_at
+
+    page = client.get(f'/venues/{venue_id}').data
+    assert b'Recent Arrivals' in page and b'Old Timers' not in page
+    assert b'The Fillmore' not in client.get(f'/artists/{old_id}').data
+    assert b'Old Timers' in client.get(f'/venues/{venue_id}?archived=1').data
+
+    # Nothing is left to archive.
+    result = app.test_cli_runner().invoke(args=['shows', 'archive', '--after-days', '365'])
+    assert 'Archived 0 show(s)' in result.output
+
+
+def test_partitions_needs_a_partitioned_show_table(app):
+    result = app.test_cli_runner().invoke(args=['shows', 'partitions'])
+    assert result.exit_code != 0
+    assert 'Show is not partitioned' in result.output
+
+
+def partition_of(show_id):
+    return db.session.execute(text('SELECT tableoid::regclass::text FROM "Show" WHERE id = :id'), {"id": show_id}).scalar()
+
+
+@pytest.mark.postgresql
+def test_shows_are_routed_to_their_months_partition(migrated, make_venue, make_artist, make_show):
+    now = datetime.datetime.now()
+    venue, artist = make_venue(), make_artist()
+    venue_id, artist_id = venue.id, artist.id
+    this_month = make_show(venue, artist, now, minutes=60).id
+    far_off = make_show(venue, artist, now + datetime.timedelta(days=3 * 365), minutes=60).id
+    assert partition_of(this_month) == f'"{partition_name(month_start(now))}"'
+    assert partition_of(far_off) == '"Show_default"'
+
+    result = migrated.test_cli_runner().invoke(args=['shows', 'partitions', '--months-ahead', '40'])
+    assert result.exit_code == 0, result.output
+    db.session.remove()
+    far_off_month = month_start(now + datetime.timedelta(days=3 * 365))
+    assert partition_of(far_off) == f'"{partition_name(far_off_month)}"'
+
+    # Each partition keeps the venues and artists from being double-booked.
+    venue, artist = db.session.get(Venue, venue_id), db.session.get(Artist, artist_id)
+    with pytest.raises(IntegrityError, match='booking'):
+        make_show(venue, artist, now + datetime.timedelta(days=3 * 365, minutes=30), minutes=60)
+
+
+@pytest.mark.postgresql
+def test_archive_drops_whole_old_partitions(migrated, make_venue, make_artist, make_show):
+    now = datetime.datetime.now()
+    venue, artist = make_venue(), make_artist()
+    old_month = month_start(now - datetime.timedelta(days=400))
+    create_partition(old_month)
+    old_show = make_show(venue, artist, old_month + datetime.timedelta(days=1), minutes=60).id
+    assert partition_of(old_show) == f'"{partition_name(old_month)}"'
+
+    result = migrated.test_cli_runner().invoke(args=['shows', 'archive', '--after-days', '365'])
+    assert result.exit_code == 0, result.output
+    db.session.remove()
+    assert [archived.id for archived in ShowArchive.query] == [old_show]
+    assert db.session.execute(text('SELECT to_regclass(:name)'), {"name": f'"{partition_name(old_month)}"'}).scalar() \
+        is None
@@ -0,0 +1,61 @@
+import datetime
+import pytest
+from areas import rebuild_areas
+from counters import recount, roll_shows
+from instrumentation import assert_max_queries, collect_queries
+from models import db
+from queries import venue_areas
+
+
+def add_venues(make_venue, make_artist, make_show, count):
+    """``count`` venues over a few cities, each with an upcoming and a past show."""
+    artist = make_artist()
+    now = datetime.datetime.now()
+    for i in range(count):
+        venue = make_venue(city=f'City {i % 3}', state=['CA', 'NY'][i % 2])
+        make_show(venue, artist, now + datetime.timedelta(days=i + 1))
+        make_show(venue, artist, now - datetime.timedelta(days=i + 1))
+    recount()
+    roll_shows(now)
+
+
+@pytest.mark.parametrize('summarized', [False, True], ids=['grouped', 'summarized'])
+def test_venues_page_statement_count_does_not_grow_with_venues(client, make_venue, make_artist, make_show, summarized):
+    def load(count):
+        add_venues(make_venue, make_artist, make_show, count)
+        if summarized:
+            rebuild_areas()
+            db.session.commit()
+
+    load(5)
+    with collect_queries() as few:
+        assert client.get('/venues').status_code == 200
+
+    load(45)
+    with assert_max_queries(few.count) as many:
+        response = client.get('/venues')
+    assert response.status_code == 200
+    assert response.data.count(b'href="/venues/') == 50
+    assert many.count == few.count
+
+
+def test_venue_areas_group_venues_by_state_and_city(app, make_venue, make_artist, make_show):
+    now = datetime.datetime.now()
+    artist = make_artist()
+    oakland = make_venue(name='The Oakland Room', city='Oakland')
+    fillmore = make_venue(name='Fillmore')
+    make_venue(name='Apollo', city='New York', state='NY')
+    make_show(oakland, artist, now + datetime.timedelta(days=1))
+    make_show(oakland, artist, now + datetime.timedelta(days=2))
+    make_show(fillmore, artist, now - datetime.timedelta(days=1))
+    recount()
+    roll_shows(now)
+
+    areas, age = venue_areas()
+    assert [(area['state'], area['city'], [(venue['name'], venue['num_upcoming_shows']) for venue in area['venues']])
+            for area in areas] == [
+        ('CA', 'Oakland', [('The Oakland Room', 2)]),
+        ('CA', 'San Francisco', [('Fillmore', 0)]),
+        ('NY', 'New York', [('Apollo', 0)]),
+    ]
+    assert age == 0
@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import insert, select
+import routing
+from models import db, Venue
+from pool import init_pool
+from routing import PIN_COOKIE, init_replicas
+
+
+@pytest.fixture
+def routed_app(tmp_path, monkeypatch):
+    """An app whose primary and one replica are separate SQLite files, each holding a venue of its own."""
+    # init_app adds the replica's bind key to db.metadatas, which the other tests' create_all would then need.
+    monkeypatch.setattr(db, 'metadatas', dict(db.metadatas))
+    app = Flask(__name__)
+    app.config.from_object('config')
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+        REPLICA_DATABASE_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"],
+        REPLICA_LAG_SECONDS=5,
+    )
+    init_pool(app)
+    init_replicas(app)
+    db.init_app(app)
+
+    @app.get('/names')
+    def names():
+        return jsonify([venue.name for venue in Venue.query.order_by(Venue.name)])
+
+    @app.post('/names')
+    def add_name():
+        db.session.add(Venue(name='New Hall', city='Austin', state='TX', address='1 Main St', genres='Folk'))
+        db.session.commit()
+        return '', 201
+
+    with app.app_context():
+        for engine, name in ((db.engine, 'Primary Hall'), (db.engines['replica0'], 'Replica Hall')):
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(insert(Venue.__table__).values(name=name, city='Austin', state='TX',
+                                                                  address='1 Main St', genres='Folk'))
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(routed_app):
+    client = routed_app.test_client()
+    assert client.get('/names').get_json() == ['Replica Hall']
+
+    assert client.post('/names').status_code == 201
+    with routed_app.app_context():
+        for engine, names in ((db.engine, ['New Hall', 'Primary Hall']), (db.engines['replica0'], ['Replica Hall'])):
+            with engine.connect() as connection:
+                assert sorted(connection.execute(select(Venue.name)).scalars()) == names
+
+
+def test_a_writer_reads_from_the_primary_until_the_replica_lag_has_passed(routed_app, monkeypatch):
+    client = routed_app.test_client()
+    response = client.post('/names')
+    cookie = response.headers['Set-Cookie']
+    assert cookie.startswith(f'{PIN_COOKIE}=') and 'Max-Age=5' in cookie
+    assert client.get('/names').get_json() == ['New Hall', 'Primary Hall']
+
+    # Others are not pinned.
+    assert routed_app.test_client().get('/names').get_json() == ['Replica Hall']
+
+    now = time.time()
+    monkeypatch.setattr(routing, 'time', SimpleNamespace(time=lambda: now + 6))
+    assert client.get('/names').get_json() == ['Replica Hall']
@@ -0,0 +1,46 @@
+from sqlalchemy import delete, insert, update
+from models import db, Venue
+from search import NgramIndex, NgramSearch, get_search_backend
+
+
+def names(model, term):
+    results = get_search_backend().search(model, term)
+    return sorted(name for id, name in results.slice(0, results.count))
+
+
+def test_writes_from_other_processes_are_picked_up_by_the_refresh(app, make_venue):
+    venue_id = make_venue(name='Park Square Live Music').id
+    backend = get_search_backend()
+    assert isinstance(backend, NgramSearch)
+    assert names(Venue, 'park') == ['Park Square Live Music']
+
+    # Core statements skip the session events, as another worker's writes would.
+    venues = Venue.__table__
+    db.session.execute(update(venues).where(venues.c.id == venue_id).values(name='Park Circle Live Music'))
+    db.session.execute(insert(venues).values(name='Parkside Lounge', city='Austin', state='TX', address='1 Main St',
+                                             genres='Folk'))
+    db.session.commit()
+    assert names(Venue, 'park') == ['Park Square Live Music']
+
+    backend.refresh(Venue)
+    assert names(Venue, 'park') == ['Park Circle Live Music', 'Parkside Lounge']
+
+    db.session.execute(delete(venues).where(venues.c.id == venue_id))
+    db.session.commit()
+    backend.refresh(Venue)
+    assert names(Venue, 'park') == ['Parkside Lounge']
+
+
+def test_writes_committed_while_the_index_is_built_reach_it(app, make_venue, monkeypatch):
+    make_venue(name='Park Square Live Music')
+    load = NgramIndex.load
+
+    def load_then_commit(index, rows):
+        rows = list(rows)
+        # Committed after the index read the table, but before it is in use.
+        db.session.add(Venue(name='Parkside Lounge', city='Austin', state='TX', address='1 Main St', genres='Folk'))
+        db.session.commit()
+        load(index, rows)
+    monkeypatch.setattr(NgramIndex, 'load', load_then_commit)
+
+    assert names(Venue, 'park') == ['Park Square Live Music', 'Parkside Lounge']